@@ -0,0 +1,70 @@
+"""Autenticação por token assinado (JWT) sem consulta ao banco.
+
+O token de acesso é curto e carrega as claims `username`, `is_active`,
+`nivel`, `equipe_id` e `ativo`, então usuário e perfil de acesso são montados a
+partir dele, sem ler `authtoken_token`, `auth_user` ou `api_perfilacesso`.
+O token de renovação (`renovar_token`) relê o perfil do banco, de modo que
+mudanças de nível/equipe valem no máximo após a vida de um token de acesso;
+as views que trocam a equipe do próprio perfil devolvem um par novo.
+
+Enviado como `Authorization: Bearer <access>`. O `Token <chave>` do DRF
+continua aceito para clientes antigos.
+"""
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import PerfilAcesso
+
+
+def gerar_tokens(user, perfil):
+    """Par de tokens (access/refresh) com as claims do perfil de acesso"""
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.username
+    refresh['is_active'] = user.is_active
+    refresh['perfil_id'] = perfil.pk
+    refresh['nivel'] = perfil.nivel
+    refresh['equipe_id'] = perfil.equipe_id
+    refresh['ativo'] = perfil.ativo
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+    }
+
+
+class JWTPerfilAuthentication(JWTAuthentication):
+    """JWT do simplejwt montando usuário e perfil apenas a partir das claims"""
+
+    def authenticate(self, request):
+        resultado = super().authenticate(request)
+        if resultado is None:
+            return None
+
+        user, validated_token = resultado
+        # Mesmo cache usado por middleware.carregar_perfil: nenhuma query de perfil
+        http_request = getattr(request, '_request', request)
+        http_request._perfil_carregado = (user.pk, user.perfil_acesso)
+        return resultado
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token['user_id']
+            nivel = validated_token['nivel']
+        except KeyError:
+            raise InvalidToken('Token sem as claims de perfil de acesso')
+        ativo = validated_token.get('is_active', False)
+        if not ativo:
+            raise AuthenticationFailed('Usuário inativo', code='user_inactive')
+
+        # Demais campos ficam adiados e só são lidos do banco se alguma view usar
+        user = User.from_db(None, ['id', 'username', 'is_active'], [user_id, validated_token.get('username', ''), ativo])
+        perfil = PerfilAcesso.from_db(
+            None,
+            ['id', 'usuario_id', 'nivel', 'equipe_id', 'ativo'],
+            [validated_token.get('perfil_id'), user_id, nivel, validated_token.get('equipe_id'), validated_token.get('ativo', True)],
+        )
+        perfil.usuario = user
+        User.perfil_acesso.related.set_cached_value(user, perfil)
+        return user
@@ -0,0 +1,195 @@
+"""Tabela materializada de estatísticas por equipe (`EstatisticaEquipe`).
+
+O dashboard da banca lê totais por equipe em todo refresh do telão; em vez
+de agregar as propostas de cada equipe a cada leitura, os totais ficam
+gravados em uma linha por equipe. Toda gravação de proposta (signal em
+`api/signals.py`, disparado dentro da transação de `Proposta.save`)
+recalcula apenas a linha da equipe afetada, travada antes da agregação. Gravações em massa (bulk_update dos recálculos de pontos) passam
+por `atualizar_ranking`, que reconstrói a tabela inteira; as operações em
+lote de `api/lotes.py` reconstroem só as linhas das equipes afetadas.
+
+`dados_dashboard_banca` monta os números do dashboard da banca a partir da
+tabela ou, com `ao_vivo=True`, direto das propostas com agregação
+condicional. Nos dois casos são duas consultas (geral + por equipe), e as
+colunas que dependem da fase são escolhidas no banco com CASE.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact
+from django.utils import timezone
+
+from .models import Equipe, EstatisticaEquipe, Proposta
+
+
+CAMPOS_ESTATISTICAS = [
+    'propostas_enviadas', 'propostas_validadas', 'propostas_rejeitadas',
+    'vendas_pendentes', 'vendas_concretizadas', 'produtos_validados',
+    'produtos_propostas_vendidas', 'produtos_vendidos', 'faturamento_previsto',
+    'faturamento_realizado', 'pontos',
+]
+
+
+def _agregados_estatisticas(prefixo=''):
+    """Expressões de agregação de `EstatisticaEquipe` (mesmo esquema de `ranking._agregados_ranking`)"""
+    def soma(campo, filtro, decimal=False):
+        saida = DecimalField(max_digits=15, decimal_places=2) if decimal else IntegerField()
+        return Coalesce(Sum(f'{prefixo}{campo}', filter=filtro), Value(0), output_field=saida)
+
+    def status(*valores):
+        return Q(**{f'{prefixo}status__in': valores})
+
+    validada = status('validada')
+    venda_validada = Q(**{f'{prefixo}status': 'vendida', f'{prefixo}venda_validada': True})
+    venda_pendente = Q(**{f'{prefixo}status': 'vendida', f'{prefixo}venda_validada': False})
+    return {
+        'propostas_enviadas': Count(f'{prefixo}id', filter=status('enviada')),
+        'propostas_validadas': Count(f'{prefixo}id', filter=validada),
+        'propostas_rejeitadas': Count(f'{prefixo}id', filter=status('rejeitada')),
+        'vendas_pendentes': Count(f'{prefixo}id', filter=venda_pendente),
+        'vendas_concretizadas': Count(f'{prefixo}id', filter=venda_validada),
+        'produtos_validados': soma('quantidade_produtos', validada),
+        'produtos_propostas_vendidas': soma('quantidade_produtos', venda_validada),
+        'produtos_vendidos': soma('quantidade_produtos_venda', venda_validada),
+        # Previsto: validadas + vendidas aguardando validação do gestor
+        'faturamento_previsto': soma('valor_proposta', validada | venda_pendente, decimal=True),
+        'faturamento_realizado': soma('valor_venda', venda_validada, decimal=True),
+        'pontos': soma('pontos', status('validada', 'vendida')),
+    }
+
+
+def _travar_linha(equipe_id, criar):
+    """Travar (SELECT ... FOR UPDATE) a linha da equipe, criando-a zerada se preciso
+
+    Retorna False se a linha não existe e `criar` é falso.
+    """
+    linhas = EstatisticaEquipe.objects.select_for_update().filter(equipe_id=equipe_id)
+    if linhas.exists():
+        return True
+    if not criar:
+        return False
+    try:
+        with transaction.atomic():
+            EstatisticaEquipe.objects.create(equipe_id=equipe_id)
+    except IntegrityError:
+        # Criada por outra transação ao mesmo tempo: esperar por ela
+        linhas.exists()
+    return True
+
+
+def atualizar_estatisticas_equipe(equipe_id, criar=True):
+    """Recalcular a linha de estatísticas de uma equipe (trava + agregação + UPDATE)
+
+    Deve rodar na transação que alterou as propostas (os signals rodam dentro
+    de `Proposta.save` e do `delete()`, ambos atômicos). A linha é travada
+    antes da agregação: duas gravações simultâneas da mesma equipe se
+    alternam, e a segunda agrega já enxergando o commit da primeira.
+
+    Com `criar=False` apenas linhas existentes são atualizadas (usado na
+    exclusão de propostas, quando a própria equipe pode estar sendo removida).
+    """
+    if not equipe_id:
+        return
+    with transaction.atomic():
+        if not _travar_linha(equipe_id, criar):
+            return
+        valores = Proposta.objects.filter(equipe_id=equipe_id).aggregate(**_agregados_estatisticas())
+        EstatisticaEquipe.objects.filter(equipe_id=equipe_id).update(data_atualizacao=timezone.now(), **valores)
+
+
+def reconstruir_estatisticas(equipe_ids=None):
+    """Recalcular a tabela com uma consulta agrupada por equipe
+
+    Com `equipe_ids`, apenas as linhas dessas equipes (operações em lote de
+    `api/lotes.py`). Retorna a quantidade de equipes processadas.
+    """
+    with transaction.atomic():
+        equipes = Equipe.objects.order_by('id')
+        existentes = EstatisticaEquipe.objects.select_for_update()
+        if equipe_ids is not None:
+            equipes = equipes.filter(id__in=equipe_ids)
+            existentes = existentes.filter(equipe_id__in=equipe_ids)
+        # Linhas travadas antes da agregação, como em `atualizar_estatisticas_equipe`
+        existentes = {e.equipe_id: e for e in existentes}
+        equipes = equipes.annotate(**_agregados_estatisticas('propostas__')).values('id', *CAMPOS_ESTATISTICAS)
+        agora = timezone.now()
+        para_atualizar = []
+        para_criar = []
+
+        for item in equipes:
+            equipe_id = item.pop('id')
+            estatistica = existentes.get(equipe_id)
+            if estatistica is None:
+                para_criar.append(EstatisticaEquipe(equipe_id=equipe_id, **item))
+                continue
+            for campo, valor in item.items():
+                setattr(estatistica, campo, valor)
+            estatistica.data_atualizacao = agora
+            para_atualizar.append(estatistica)
+
+        if para_atualizar:
+            EstatisticaEquipe.objects.bulk_update(para_atualizar, CAMPOS_ESTATISTICAS + ['data_atualizacao'], batch_size=500)
+        if para_criar:
+            EstatisticaEquipe.objects.bulk_create(para_criar, batch_size=500)
+
+    return len(para_atualizar) + len(para_criar)
+
+
+def _na_fase(status_atual, pos_workshop, demais):
+    """Escolhe, no banco, a expressão do Pós-Workshop ou a das demais fases"""
+    return Case(When(Exact(Value(status_atual), Value('pos_workshop')), then=pos_workshop), default=demais)
+
+
+def _totais_banca(status_atual, metricas):
+    """Números gerais do dashboard da banca a partir de {métrica: expressão}"""
+    return {
+        # No Pós-Workshop o foco são as vendas validadas pelo gestor; nos demais, as propostas validadas
+        'total_propostas': _na_fase(status_atual, metricas['vendas_concretizadas'], metricas['propostas_validadas']),
+        'propostas_rejeitadas': metricas['propostas_rejeitadas'],
+        'vendas_concretizadas': metricas['vendas_concretizadas'],
+        'faturamento_previsto': metricas['faturamento_previsto'],
+        'faturamento_realizado': metricas['faturamento_realizado'],
+        'mix_produtos': _na_fase(status_atual, metricas['produtos_propostas_vendidas'], metricas['produtos_validados']),
+    }
+
+
+def _colunas_equipe_banca(status_atual, metricas):
+    """Colunas de cada equipe no dashboard da banca a partir de {métrica: expressão}"""
+    return {
+        'propostas_enviadas': metricas['propostas_enviadas'],
+        'propostas_validadas': _na_fase(status_atual, metricas['vendas_concretizadas'], metricas['propostas_validadas']),
+        'vendas_concretizadas': metricas['vendas_concretizadas'],
+        'quantidade_produtos': _na_fase(status_atual, metricas['produtos_vendidos'], metricas['produtos_validados']),
+        'produtos_vendidos': metricas['produtos_vendidos'],
+        'propostas_vendidas_validada': metricas['vendas_concretizadas'],
+        'faturamento_previsto': metricas['faturamento_previsto'],
+        'faturamento_realizado': metricas['faturamento_realizado'],
+        'pontos': metricas['pontos'],
+    }
+
+
+def _metricas_materializadas(prefixo='', agregar=False):
+    """Expressões que leem as colunas de `EstatisticaEquipe` (somadas se `agregar`)"""
+    metricas = {}
+    for campo in CAMPOS_ESTATISTICAS:
+        saida = DecimalField(max_digits=15, decimal_places=2) if campo.startswith('faturamento') else IntegerField()
+        expressao = Sum(f'{prefixo}{campo}') if agregar else F(f'{prefixo}{campo}')
+        metricas[campo] = Coalesce(expressao, Value(0), output_field=saida)
+    return metricas
+
+
+def dados_dashboard_banca(status_atual, ao_vivo=False):
+    """(totais gerais, linhas por equipe ativa) do dashboard da banca em duas consultas
+
+    Os totais consideram todas as equipes, inclusive inativas; equipes ativas
+    sem propostas aparecem zeradas.
+    """
+    equipes = Equipe.objects.filter(ativo=True)
+    if ao_vivo:
+        totais = Proposta.objects.aggregate(**_totais_banca(status_atual, _agregados_estatisticas()))
+        colunas = _colunas_equipe_banca(status_atual, _agregados_estatisticas('propostas__'))
+    else:
+        totais = EstatisticaEquipe.objects.aggregate(**_totais_banca(status_atual, _metricas_materializadas(agregar=True)))
+        colunas = _colunas_equipe_banca(status_atual, _metricas_materializadas('estatistica__'))
+    linhas = list(equipes.annotate(**colunas).values('nome', *colunas))
+    return totais, linhas
@@ -0,0 +1,249 @@
+"""Querysets e paginação das listagens de propostas e vendas.
+
+`PropostaSerializer` exibe nomes de equipe, cliente, vendedor, workshop e dos
+usuários que validaram proposta/venda. Sem JOIN, cada linha custaria até seis
+queries extras; toda lista de propostas deve partir de `propostas_listagem`
+(e de vendas, de `vendas_listagem`) para ser servida em um número constante
+de queries.
+
+Paginação por cursor (keyset) em (`data_envio`, `id`) — a ordenação de
+`Proposta.Meta` com o id como desempate. A próxima página é buscada com
+`WHERE data_envio <= v AND (data_envio < v OR id < pk)` — equivalente a
+`(data_envio, id) < (v, pk)`, com o primeiro termo delimitando a busca no
+índice da ordenação —, então páginas profundas custam o mesmo que a
+primeira (não há OFFSET nem varredura das linhas anteriores).
+
+- `?limite=<n>` e/ou `?cursor=<opaco>` ativam a paginação; a resposta passa a
+  ser `{"results": [...], "next": <url|null>, "cursor": <próximo|null>}`.
+- Sem esses parâmetros (modo de compatibilidade) a resposta continua sendo a
+  lista completa, como antes.
+
+Nas listas de propostas, `?fields=a,b` (somente esses campos) e
+`?exclude=a,b` (todos menos esses) reduzem tanto o JSON quanto as colunas
+lidas do banco.
+
+`ListagemPropostas` é o caminho de leitura das listas de propostas: mesma
+saída de `PropostaSerializer(many=True)`, mas a partir de linhas de
+`.values()` e com os conversores de cada coluna montados uma única vez, em
+vez de instâncias de modelo e campos do DRF percorridos linha a linha.
+"""
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.fields.files import FieldFile
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import Proposta, Venda
+from .pontuacao import BONUS, ROTULOS_BONUS, pontos_validada
+from .serializers import PropostaSerializer
+
+
+RELACIONADOS_PROPOSTA = ('equipe', 'cliente', 'vendedor', 'workshop', 'validado_por', 'venda_validada_por')
+RELACIONADOS_VENDA = ('proposta__cliente', 'proposta__equipe', 'validado_por')
+
+LIMITE_PADRAO = getattr(settings, 'PAGINACAO_LIMITE_PADRAO', 50)
+LIMITE_MAXIMO = getattr(settings, 'PAGINACAO_LIMITE_MAXIMO', 500)
+
+
+def propostas_listagem(queryset=None, **filtros):
+    """Propostas (de `queryset` ou todas) filtradas e com as relações exibidas em JOIN"""
+    if queryset is None:
+        queryset = Proposta.objects.all()
+    return queryset.filter(**filtros).select_related(*RELACIONADOS_PROPOSTA)
+
+
+def vendas_listagem(queryset=None, **filtros):
+    """Vendas (de `queryset` ou todas) filtradas e com as relações exibidas em JOIN"""
+    if queryset is None:
+        queryset = Venda.objects.all()
+    return queryset.filter(**filtros).select_related(*RELACIONADOS_VENDA)
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class CamposInvalidos(ValueError):
+    pass
+
+
+def codificar_cursor(valor, pk):
+    bruto = f'{valor.isoformat()}|{pk}'
+    return urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        bruto = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        valor, pk = bruto.rsplit('|', 1)
+        return datetime.fromisoformat(valor), int(pk)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise CursorInvalido('Cursor inválido')
+
+
+def _limite(request):
+    try:
+        limite = int(request.GET.get('limite') or LIMITE_PADRAO)
+    except ValueError:
+        raise CursorInvalido('Parâmetro limite deve ser numérico')
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def filtrar_apos(queryset, campo, valor, pk):
+    """Linhas depois de (valor, pk) na ordem (-`campo`, -id): `(campo, id) < (valor, pk)`
+
+    O `campo <= valor` é redundante na lógica, mas é ele que o banco usa como
+    limite da busca no índice; só com o OR a consulta percorre o índice
+    desde o início.
+    """
+    return queryset.filter(Q(**{f'{campo}__lte': valor}) & (Q(**{f'{campo}__lt': valor}) | Q(pk__lt=pk)))
+
+
+def paginar(request, queryset, serializar, campo='data_envio'):
+    """Response da listagem: página por cursor em (`campo`, id) ou lista completa (compatibilidade)
+
+    `serializar` é uma classe de serializer ou um callable que recebe as linhas
+    (instâncias ou dicts de `.values()`) e devolve a lista serializada.
+    """
+    if isinstance(serializar, type) and issubclass(serializar, serializers.BaseSerializer):
+        serializer_class = serializar
+        serializar = lambda linhas: serializer_class(linhas, many=True).data  # noqa: E731
+
+    if 'cursor' not in request.GET and 'limite' not in request.GET:
+        return Response(serializar(queryset))
+
+    try:
+        limite = _limite(request)
+        cursor = request.GET.get('cursor')
+        if cursor:
+            queryset = filtrar_apos(queryset, campo, *decodificar_cursor(cursor))
+    except CursorInvalido as erro:
+        return Response({'error': str(erro)}, status=400)
+
+    # Uma linha a mais indica se existe próxima página, sem COUNT
+    linhas = list(queryset.order_by(f'-{campo}', '-pk')[:limite + 1])
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = linhas[-1]
+        if isinstance(ultima, dict):
+            proximo = codificar_cursor(ultima[campo], ultima['id'])
+        else:
+            proximo = codificar_cursor(getattr(ultima, campo), ultima.pk)
+
+    parametros = request.GET.copy()
+    if proximo:
+        parametros['cursor'] = proximo
+    return Response({
+        'results': serializar(linhas),
+        'next': request.build_absolute_uri(f'{request.path}?{parametros.urlencode()}') if proximo else None,
+        'cursor': proximo,
+    })
+
+
+class ListagemPropostas:
+    """Serialização somente leitura equivalente a `PropostaSerializer(many=True)`
+
+    Uso: `listagem = ListagemPropostas()` e `listagem(listagem.consulta(queryset))`
+    (ou `paginar_propostas` nas views). `campos`/`excluir` limitam a saída (e as
+    colunas consultadas) a um subconjunto dos campos do serializer.
+    """
+
+    def __init__(self, campos=None, excluir=None):
+        self._snapshot = None
+        self.colunas = []
+        self.conversores = []
+        todos = PropostaSerializer().fields
+        desconhecidos = sorted((set(campos or []) | set(excluir or [])) - set(todos))
+        if desconhecidos:
+            raise CamposInvalidos(f"Campos desconhecidos: {', '.join(desconhecidos)}")
+        for nome, campo in todos.items():
+            if (campos and nome not in campos) or (excluir and nome in excluir):
+                continue
+            self.conversores.append((nome, *self._conversor(nome, campo)))
+
+    @classmethod
+    def da_requisicao(cls, request):
+        """Listagem com os campos de `?fields=` / `?exclude=` (separados por vírgula)"""
+        def lista(parametro):
+            valor = request.GET.get(parametro, '')
+            return [nome.strip() for nome in valor.split(',') if nome.strip()]
+        return cls(campos=lista('fields'), excluir=lista('exclude'))
+
+    def _coluna(self, coluna):
+        if coluna not in self.colunas:
+            self.colunas.append(coluna)
+        return coluna
+
+    def _conversor(self, nome, campo):
+        """(coluna de .values(), função de conversão ou None, omitir se nulo)"""
+        if nome == 'pontos_produtos':
+            status, quantidade = self._coluna('status'), self._coluna('quantidade_produtos')
+
+            def pontos_produtos(linha):
+                # Configuração da banca só é carregada se houver proposta validada na lista
+                if linha[status] != 'validada' or not linha[quantidade]:
+                    return 0
+                return pontos_validada(self.snapshot, linha[status], linha[quantidade])
+            return None, pontos_produtos, False
+        if nome == 'bonus_selecionados':
+            colunas = [self._coluna(campo_bonus) for campo_bonus, _, _ in BONUS]
+            return None, lambda linha: list(ROTULOS_BONUS[tuple(bool(linha[c]) for c in colunas)]), False
+        if campo.source == 'get_status_display':
+            status = self._coluna('status')
+            rotulos = dict(Proposta.STATUS_CHOICES)
+            return None, lambda linha: rotulos.get(linha[status], linha[status]), False
+        if '.' in campo.source:
+            # Relação nula: o DRF omite a chave (ex.: validado_por_nome)
+            return self._coluna(campo.source.replace('.', '__')), None, True
+        coluna = self._coluna(campo.source)
+        if isinstance(campo, serializers.FileField):
+            campo_modelo = Proposta._meta.get_field(campo.source)
+            return coluna, lambda valor: campo.to_representation(FieldFile(None, campo_modelo, valor)), False
+        if isinstance(campo, (serializers.DecimalField, serializers.DateTimeField)):
+            return coluna, campo.to_representation, False
+        return coluna, None, False
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            from .recalculo import obter_snapshot_pontuacao
+            self._snapshot = obter_snapshot_pontuacao()
+        return self._snapshot
+
+    def consulta(self, queryset):
+        """Projeção de `queryset` apenas nas colunas usadas pela saída (e nas chaves do cursor)"""
+        chaves = [coluna for coluna in ('id', 'data_envio') if coluna not in self.colunas]
+        return queryset.values(*self.colunas, *chaves)
+
+    def __call__(self, linhas):
+        resultado = []
+        for linha in linhas:
+            saida = {}
+            for nome, coluna, converter, omitir_nulo in self.conversores:
+                if coluna is None:
+                    saida[nome] = converter(linha)
+                    continue
+                valor = linha[coluna]
+                if valor is None:
+                    if not omitir_nulo:
+                        saida[nome] = None
+                elif converter is not None:
+                    saida[nome] = converter(valor)
+                else:
+                    saida[nome] = valor
+            resultado.append(saida)
+        return resultado
+
+
+def paginar_propostas(request, queryset):
+    """`paginar` para listas de propostas pelo caminho rápido, com `?fields=`/`?exclude=`"""
+    try:
+        listagem = ListagemPropostas.da_requisicao(request)
+    except CamposInvalidos as erro:
+        return Response({'error': str(erro)}, status=400)
+    return paginar(request, listagem.consulta(queryset), listagem)
@@ -0,0 +1,301 @@
+"""Operações em lote sobre propostas.
+
+`enviar_propostas` grava de uma vez as propostas digitadas por uma equipe:
+todos os itens são validados antes de qualquer gravação, vendedores e
+clientes são resolvidos com uma consulta por modelo (os que faltam entram
+com `bulk_create`), os números da equipe são reservados com um único UPDATE
+no contador e as propostas entram com um único `bulk_create`. Como
+`bulk_create` não dispara signals, estatísticas, ranking da equipe e eventos
+da fila do gestor são atualizados aqui, uma vez por lote.
+
+`validar_propostas` aplica em uma transação as decisões do gestor sobre
+várias propostas: as linhas são travadas com `select_for_update`, só saem
+de `enviada` (mesma regra de `validar_proposta_gestor`), são pontuadas com
+um único snapshot e gravadas com `bulk_update`. Estatísticas e ranking são
+atualizados uma vez, só para as equipes afetadas.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .estatisticas import atualizar_estatisticas_equipe, reconstruir_estatisticas
+from .models import Cliente, ContadorPropostaEquipe, Proposta, Vendedor, Workshop
+from .pontuacao import pontuar
+from .ranking import atualizar_ranking_equipe, atualizar_ranking_equipes
+from .recalculo import obter_snapshot_pontuacao
+from .tempo_real import publicar_eventos_gestor
+
+
+LIMITE_LOTE = getattr(settings, 'PROPOSTAS_LOTE_LIMITE', 100)
+LIMITE_VALIDACAO_LOTE = getattr(settings, 'PROPOSTAS_VALIDACAO_LOTE_LIMITE', 500)
+
+# Ação do gestor -> status final da proposta
+ACOES_VALIDACAO = {'validar': 'validada', 'rejeitar': 'rejeitada'}
+
+CAMPOS_BONUS = [
+    'bonus_vinhos_casa_perini_mundo', 'bonus_vinhos_fracao_unica', 'bonus_espumantes_vintage',
+    'bonus_espumantes_premium', 'bonus_aceleracao',
+]
+
+
+class LoteInvalido(Exception):
+    """Lote recusado; `erros` traz {índice do item: mensagem}"""
+
+    def __init__(self, mensagem, erros=None):
+        super().__init__(mensagem)
+        self.erros = erros or {}
+
+
+def _valor_proposta(valor):
+    valor_str = str(valor).strip()
+    # Formato BR: "50.000,00" (ponto = milhar, vírgula = decimal)
+    if ',' in valor_str:
+        valor_str = valor_str.replace('.', '').replace(',', '.')
+    try:
+        decimal = Decimal(valor_str)
+    except InvalidOperation:
+        raise ValueError('Campo valor_proposta deve ser um número válido')
+    if not decimal.is_finite():
+        raise ValueError('Campo valor_proposta deve ser um número válido')
+    if decimal.as_tuple().exponent < -2 or decimal >= 10 ** 10:
+        raise ValueError('Campo valor_proposta deve ter no máximo 10 dígitos inteiros e 2 casas decimais')
+    return max(decimal, Decimal(0))
+
+
+def _quantidade(valor):
+    try:
+        return max(0, int(valor)) if valor is not None and str(valor).strip() != '' else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+def ler_proposta(dados):
+    """Campos de uma proposta digitada pela equipe (mesmas regras de `propostas_equipe`)
+
+    Levanta ValueError com a mensagem a exibir se o item for inválido.
+    """
+    if not isinstance(dados, dict):
+        raise ValueError('Cada proposta deve ser um objeto')
+    cliente = str(dados.get('cliente') or '').strip()
+    vendedor = str(dados.get('vendedor') or '').strip()
+    valor = dados.get('valor_proposta')
+    if not cliente or not vendedor or not valor:
+        raise ValueError('Campos cliente, vendedor e valor_proposta são obrigatórios')
+
+    proposta = {
+        'cliente': cliente,
+        'vendedor': vendedor,
+        'valor_proposta': _valor_proposta(valor),
+        'descricao': dados.get('descricao') or '',
+        'quantidade_produtos': _quantidade(dados.get('quantidade_produtos', 0)),
+    }
+    for campo in CAMPOS_BONUS:
+        proposta[campo] = dados.get(campo) in [True, 'true', '1']
+    return proposta
+
+
+def _codigo(prefixo, nome):
+    return f"{prefixo}_{nome.upper().replace(' ', '_')}"
+
+
+def _resolver_por_nome(modelo, prefixo, nomes_por_item, erros):
+    """{nome: instância} para os nomes usados no lote, mais os novos a criar
+
+    Nomes já cadastrados reaproveitam o registro de menor id. Nomes novos
+    cujo código gerado já existe (ou estoura o tamanho do campo) viram erro
+    nos itens que os usam.
+    """
+    nomes = set(nomes_por_item.values())
+    existentes = {}
+    for objeto in modelo.objects.filter(nome__in=nomes).order_by('-id'):
+        existentes[objeto.nome] = objeto
+
+    novos = {nome: _codigo(prefixo, nome) for nome in nomes - existentes.keys()}
+    max_codigo = modelo._meta.get_field('codigo').max_length
+    em_uso = set(modelo.objects.filter(codigo__in=novos.values()).values_list('codigo', flat=True))
+    vistos = set()
+    invalidos = {}
+    for nome, codigo in sorted(novos.items()):
+        if len(codigo) > max_codigo:
+            invalidos[nome] = f'Nome "{nome}" longo demais para gerar o código ({max_codigo} caracteres)'
+        elif codigo in em_uso or codigo in vistos:
+            invalidos[nome] = f'Código {codigo} já usado por outro cadastro com nome diferente de "{nome}"'
+        vistos.add(codigo)
+
+    for indice, nome in nomes_por_item.items():
+        if nome in invalidos:
+            erros.setdefault(indice, invalidos[nome])
+    return existentes, {nome: codigo for nome, codigo in novos.items() if nome not in invalidos}
+
+
+def enviar_propostas(equipe, itens, arquivos=None):
+    """Gravar em uma transação as propostas de uma equipe; retorna as propostas criadas
+
+    `arquivos` é o `request.FILES` do multipart: o PDF do item `i` vem no
+    campo `arquivo_pdf_<i>`. Levanta `LoteInvalido` sem gravar nada se algum
+    item for inválido.
+    """
+    arquivos = arquivos or {}
+    if not isinstance(itens, list) or not itens:
+        raise LoteInvalido('Envie uma lista "propostas" com pelo menos uma proposta')
+    if len(itens) > LIMITE_LOTE:
+        raise LoteInvalido(f'Envie no máximo {LIMITE_LOTE} propostas por lote')
+
+    erros = {}
+    dados = {}
+    for indice, item in enumerate(itens):
+        try:
+            dados[indice] = ler_proposta(item)
+        except ValueError as e:
+            erros[indice] = str(e)
+
+    with transaction.atomic():
+        vendedores, novos_vendedores = _resolver_por_nome(
+            Vendedor, 'VEN', {i: d['vendedor'] for i, d in dados.items()}, erros,
+        )
+        clientes, novos_clientes = _resolver_por_nome(
+            Cliente, 'CLI', {i: d['cliente'] for i, d in dados.items()}, erros,
+        )
+        if erros:
+            raise LoteInvalido('Nenhuma proposta foi gravada: corrija os itens com erro', erros)
+
+        vendedores.update({
+            vendedor.nome: vendedor
+            for vendedor in Vendedor.objects.bulk_create(Vendedor(nome=nome, codigo=codigo) for nome, codigo in novos_vendedores.items())
+        })
+        # Cliente novo fica com o vendedor do primeiro item que o cita
+        vendedor_do_cliente = {}
+        for d in dados.values():
+            vendedor_do_cliente.setdefault(d['cliente'], vendedores[d['vendedor']])
+        clientes.update({
+            cliente.nome: cliente
+            for cliente in Cliente.objects.bulk_create(
+                Cliente(nome=nome, codigo=codigo, vendedor=vendedor_do_cliente[nome]) for nome, codigo in novos_clientes.items()
+            )
+        })
+
+        workshop = Workshop.objects.first()
+        if not workshop:
+            workshop = Workshop.objects.create(nome='Workshop Padrão', data=date.today())
+
+        snapshot = obter_snapshot_pontuacao()
+        primeiro = ContadorPropostaEquipe.reservar_numeros(equipe.id, len(dados))
+        propostas = []
+        for indice, d in dados.items():
+            proposta = Proposta(
+                equipe=equipe,
+                cliente=clientes[d.pop('cliente')],
+                vendedor=vendedores[d.pop('vendedor')],
+                workshop=workshop,
+                numero_proposta_equipe=primeiro + indice,
+                arquivo_pdf=arquivos.get(f'arquivo_pdf_{indice}'),
+                **d,
+            )
+            pontuacao = pontuar(snapshot, proposta)
+            proposta.pontos = pontuacao['pontos']
+            proposta.pontos_bonus = pontuacao['pontos_bonus']
+            propostas.append(proposta)
+        Proposta.objects.bulk_create(propostas)
+
+        # bulk_create não dispara signals: estatísticas, ranking e fila do gestor uma vez por lote
+        atualizar_estatisticas_equipe(equipe.id)
+        atualizar_ranking_equipe(equipe.id, snapshot.status_atual)
+        publicar_eventos_gestor([('proposta_enviada', proposta) for proposta in propostas])
+
+    return propostas
+
+
+def _ler_decisao(item):
+    """(proposta_id, ação, motivo) de um item do lote de validação; ValueError se inválido"""
+    if not isinstance(item, dict):
+        raise ValueError('Cada item deve ser um objeto com proposta_id, acao e motivo')
+    try:
+        proposta_id = int(item.get('proposta_id'))
+    except (TypeError, ValueError):
+        raise ValueError('Campo proposta_id deve ser um número')
+    acao = item.get('acao')
+    if acao not in ACOES_VALIDACAO:
+        raise ValueError('Ação inválida. Use "validar" ou "rejeitar"')
+    motivo = str(item.get('motivo') or '').strip()
+    if acao == 'rejeitar' and not motivo:
+        raise ValueError('Motivo da rejeição é obrigatório')
+    return proposta_id, acao, motivo
+
+
+def validar_propostas(usuario, itens):
+    """Validar/rejeitar várias propostas em uma transação; retorna as propostas alteradas
+
+    Levanta `LoteInvalido` sem gravar nada se algum item for inválido, se a
+    proposta não existir ou se ela já tiver saído de `enviada`.
+    """
+    if not isinstance(itens, list) or not itens:
+        raise LoteInvalido('Envie uma lista "propostas" com pelo menos um item')
+    if len(itens) > LIMITE_VALIDACAO_LOTE:
+        raise LoteInvalido(f'Envie no máximo {LIMITE_VALIDACAO_LOTE} itens por lote')
+
+    erros = {}
+    decisoes = {}
+    indice_da_proposta = {}
+    for indice, item in enumerate(itens):
+        try:
+            proposta_id, acao, motivo = _ler_decisao(item)
+        except ValueError as e:
+            erros[indice] = str(e)
+            continue
+        if proposta_id in indice_da_proposta:
+            erros[indice] = f'Proposta {proposta_id} repetida no lote (item {indice_da_proposta[proposta_id]})'
+            continue
+        indice_da_proposta[proposta_id] = indice
+        decisoes[proposta_id] = (acao, motivo)
+
+    with transaction.atomic():
+        # Trava só as propostas (não as linhas de equipe/cliente do select_related)
+        propostas = {
+            proposta.id: proposta
+            for proposta in Proposta.objects.select_for_update(of=('self',))
+            .select_related('equipe', 'cliente', 'vendedor', 'workshop')
+            .filter(id__in=decisoes)
+        }
+        for proposta_id, indice in indice_da_proposta.items():
+            proposta = propostas.get(proposta_id)
+            if proposta is None:
+                erros[indice] = 'Proposta não encontrada'
+            elif proposta.status != 'enviada':
+                erros[indice] = 'Proposta já foi processada'
+        if erros:
+            raise LoteInvalido('Nenhuma proposta foi alterada: corrija os itens com erro', erros)
+
+        snapshot = obter_snapshot_pontuacao()
+        agora = timezone.now()
+        alteradas = []
+        for proposta_id, (acao, motivo) in decisoes.items():
+            proposta = propostas[proposta_id]
+            proposta.status = ACOES_VALIDACAO[acao]
+            proposta.data_validacao = agora
+            proposta.validado_por = usuario
+            if acao == 'validar':
+                proposta.motivo_rejeicao = None
+                pontuacao = pontuar(snapshot, proposta)
+                proposta.pontos = pontuacao['pontos']
+                proposta.pontos_bonus = pontuacao['pontos_bonus']
+            else:
+                proposta.motivo_rejeicao = motivo
+                proposta.pontos = 0
+            alteradas.append(proposta)
+
+        Proposta.objects.bulk_update(
+            alteradas,
+            ['status', 'data_validacao', 'validado_por', 'motivo_rejeicao', 'pontos', 'pontos_bonus'],
+            batch_size=500,
+        )
+
+        # bulk_update não dispara signals: estatísticas e ranking só das equipes afetadas, uma vez
+        equipes = {proposta.equipe_id for proposta in alteradas}
+        reconstruir_estatisticas(equipes)
+        atualizar_ranking_equipes(equipes, snapshot.status_atual)
+        publicar_eventos_gestor([(f'proposta_{proposta.status}', proposta) for proposta in alteradas])
+
+    return alteradas
@@ -0,0 +1,69 @@
+import statistics
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.estatisticas import dados_dashboard_banca, reconstruir_estatisticas
+from api.models import Cliente, Equipe, Proposta, Vendedor, Workshop
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a latência do dashboard da banca (tabela materializada e agregação ao vivo) '
+        'com 10, 100 e 1000 equipes. Os dados de teste são criados em uma transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--equipes', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--propostas-por-equipe', type=int, default=20)
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--status', default='workshop')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'equipes':>8} {'modo':>14} {'queries':>8} {'mediana (ms)':>13} {'p95 (ms)':>9}")
+        for quantidade in options['equipes']:
+            with transaction.atomic():
+                self._popular(quantidade, options['propostas_por_equipe'])
+                for ao_vivo in (False, True):
+                    queries, tempos = self._medir(options['status'], ao_vivo, options['repeticoes'])
+                    modo = 'ao_vivo' if ao_vivo else 'materializado'
+                    p95 = tempos[int(len(tempos) * 0.95) - 1] if len(tempos) > 1 else tempos[0]
+                    self.stdout.write(f'{quantidade:>8} {modo:>14} {queries:>8} {statistics.median(tempos):>13.2f} {p95:>9.2f}')
+                transaction.set_rollback(True)
+
+    def _popular(self, quantidade, por_equipe):
+        vendedor = Vendedor.objects.create(nome='Benchmark', codigo='BENCH-VEN')
+        cliente = Cliente.objects.create(nome='Benchmark', codigo='BENCH-CLI', vendedor=vendedor)
+        workshop = Workshop.objects.create(nome='Benchmark', data=date.today())
+        equipes = Equipe.objects.bulk_create(
+            Equipe(nome=f'Benchmark {i}', codigo=f'BENCH-{i}') for i in range(quantidade)
+        )
+        status_proposta = [s for s, _ in Proposta.STATUS_CHOICES]
+        Proposta.objects.bulk_create(
+            (
+                Proposta(
+                    equipe=equipe, cliente=cliente, vendedor=vendedor, workshop=workshop,
+                    valor_proposta=100 + i, valor_venda=80 + i, status=status_proposta[i % len(status_proposta)],
+                    venda_validada=i % 2 == 0, quantidade_produtos=i % 5, quantidade_produtos_venda=i % 3,
+                    pontos=10 * (i % 4), numero_proposta_equipe=i + 1,
+                )
+                for equipe in equipes
+                for i in range(por_equipe)
+            ),
+            batch_size=1000,
+        )
+        # bulk_create não dispara signals
+        reconstruir_estatisticas()
+
+    def _medir(self, status_atual, ao_vivo, repeticoes):
+        tempos = []
+        for _ in range(repeticoes):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                dados_dashboard_banca(status_atual, ao_vivo=ao_vivo)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        return len(consultas), tempos
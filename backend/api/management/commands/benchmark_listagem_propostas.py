@@ -0,0 +1,69 @@
+import statistics
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.listagem import ListagemPropostas, propostas_listagem
+from api.models import Cliente, Equipe, Proposta, Vendedor, Workshop
+from api.serializers import PropostaSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara PropostaSerializer(many=True) com o caminho rápido (ListagemPropostas) '
+        'em uma lista de propostas. Os dados de teste são criados em uma transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=10000)
+        parser.add_argument('--repeticoes', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._popular(options['linhas'])
+            propostas = propostas_listagem(equipe__codigo__startswith='BENCH-')
+
+            def serializer():
+                return PropostaSerializer(propostas.all(), many=True).data
+
+            def rapido():
+                listagem = ListagemPropostas()
+                return listagem(listagem.consulta(propostas.all()))
+
+            self.stdout.write(f"{'caminho':>18} {'linhas':>7} {'queries':>8} {'mediana (ms)':>13}")
+            for nome, funcao in [('PropostaSerializer', serializer), ('ListagemPropostas', rapido)]:
+                queries, tempos, linhas = self._medir(funcao, options['repeticoes'])
+                self.stdout.write(f'{nome:>18} {linhas:>7} {queries:>8} {statistics.median(tempos):>13.1f}')
+            transaction.set_rollback(True)
+
+    def _popular(self, quantidade):
+        vendedor = Vendedor.objects.create(nome='Benchmark', codigo='BENCH-VEN')
+        cliente = Cliente.objects.create(nome='Benchmark', codigo='BENCH-CLI', vendedor=vendedor)
+        workshop = Workshop.objects.create(nome='Benchmark', data=date.today())
+        equipes = Equipe.objects.bulk_create(Equipe(nome=f'Benchmark {i}', codigo=f'BENCH-{i}') for i in range(20))
+        status_proposta = [s for s, _ in Proposta.STATUS_CHOICES]
+        Proposta.objects.bulk_create(
+            (
+                Proposta(
+                    equipe=equipes[i % len(equipes)], cliente=cliente, vendedor=vendedor, workshop=workshop,
+                    valor_proposta=100 + i, valor_venda=80 + i if i % 2 else None,
+                    status=status_proposta[i % len(status_proposta)], quantidade_produtos=i % 5,
+                    descricao='Proposta de benchmark', bonus_vinhos_fracao_unica=i % 3 == 0,
+                    bonus_aceleracao=i % 7 == 0, numero_proposta_equipe=i + 1,
+                )
+                for i in range(quantidade)
+            ),
+            batch_size=1000,
+        )
+
+    def _medir(self, funcao, repeticoes):
+        tempos = []
+        for _ in range(repeticoes):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                linhas = len(funcao())
+                tempos.append((time.perf_counter() - inicio) * 1000)
+        return len(consultas), tempos, linhas
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.estatisticas import reconstruir_estatisticas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a tabela de estatísticas por equipe (dashboard da banca) a partir das propostas'
+
+    def handle(self, *args, **options):
+        total = reconstruir_estatisticas()
+        self.stdout.write(self.style.SUCCESS(f'Estatísticas reconstruídas para {total} equipes'))
@@ -12,16 +12,61 @@ class StatusSistemaMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        # Obter status atual do sistema de forma lazy para evitar import circular
-        try:
-            from .models import StatusSistema
-            request.status_sistema = StatusSistema.get_status_atual()
-        except (ImportError, Exception):
-            request.status_sistema = 'pre_workshop'  # valor padrão
-        
-        response = self.get_response(request)
+        # Import lazy para evitar import circular
+        from .versoes import escopo_requisicao
+
+        # Fase e configuração lidas uma vez ficam guardadas até o fim da requisição
+        with escopo_requisicao():
+            try:
+                from .models import StatusSistema
+                request.status_sistema = StatusSistema.get_status_atual()
+            except (ImportError, Exception):
+                request.status_sistema = 'pre_workshop'  # valor padrão
+            
+            response = self.get_response(request)
         return response
 
+def carregar_perfil(request):
+    """
+    Perfil de acesso do usuário da requisição, com a equipe, em uma única query.
+
+    O resultado fica guardado na requisição e no cache da relação
+    `user.perfil_acesso`, então o middleware, os decorators e as views
+    reaproveitam o mesmo objeto. Retorna None para anônimos ou usuários sem perfil.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+
+    # Request do DRF e HttpRequest do Django compartilham o mesmo cache
+    http_request = getattr(request, '_request', request)
+    carregado = getattr(http_request, '_perfil_carregado', None)
+    if carregado is not None and carregado[0] == user.pk:
+        return carregado[1]
+
+    from .models import PerfilAcesso
+    from django.contrib.auth.models import User
+
+    perfil = PerfilAcesso.objects.select_related('equipe').filter(usuario_id=user.pk).first()
+    if perfil is not None:
+        perfil.usuario = user
+    # Com None, `user.perfil_acesso` continua levantando DoesNotExist, sem nova query
+    User.perfil_acesso.related.set_cached_value(user, perfil)
+
+    http_request._perfil_carregado = (user.pk, perfil)
+    return perfil
+
+def obter_perfil(request):
+    """
+    Equivalente a `request.user.perfil_acesso` usando `carregar_perfil`:
+    levanta PerfilAcesso.DoesNotExist quando o usuário não tem perfil.
+    """
+    perfil = carregar_perfil(request)
+    if perfil is None:
+        from .models import PerfilAcesso
+        raise PerfilAcesso.DoesNotExist('Usuário sem perfil de acesso')
+    return perfil
+
 class PermissaoMiddleware:
     """
     Middleware para verificar permissões baseadas no perfil do usuário
@@ -38,8 +83,8 @@ class PermissaoMiddleware:
         
         if request.user.is_authenticated:
             try:
-                # Usamos getattr para segurança caso o campo não exista no modelo User
-                request.perfil_acesso = getattr(request.user, 'perfil_acesso', None)
+                # Perfil e equipe em uma única query, reaproveitados pelos decorators e views
+                request.perfil_acesso = carregar_perfil(request)
                 print(f"DEBUG: Middleware - Perfil acesso: {request.perfil_acesso}")
                 print(f"DEBUG: Middleware - Perfil nivel: {request.perfil_acesso.nivel if request.perfil_acesso else 'None'}")
             except Exception as e:
@@ -87,8 +132,8 @@ def verificar_permissao(acao_requerida):
             if not request.user.is_authenticated:
                 return JsonResponse({'error': 'Autenticação requerida'}, status=401)
             
-            # 2. Tenta obter o perfil (usando getattr para evitar quebra)
-            perfil = getattr(request.user, 'perfil_acesso', None)
+            # 2. Obtém o perfil (já carregado nesta requisição, se houver)
+            perfil = carregar_perfil(request)
             
             if not perfil:
                 return JsonResponse({'error': 'Perfil de acesso não encontrado'}, status=403)
@@ -96,25 +141,72 @@ def verificar_permissao(acao_requerida):
             if not perfil.ativo:
                 return JsonResponse({'error': 'Perfil de acesso inativo'}, status=403)
             
-            # 3. Verificar se o método/campo de permissão existe
-            if hasattr(perfil, acao_requerida):
+            # 3. Verificar a permissão: matriz (nível, fase) ou, fora dela, o método/campo do perfil
+            from .permissoes import ACOES, permissoes
+            if acao_requerida in ACOES:
+                resultado = permissoes(perfil.nivel, getattr(request, 'status_sistema', None))[acao_requerida]
+            elif hasattr(perfil, acao_requerida):
                 metodo_ou_valor = getattr(perfil, acao_requerida)
                 
                 # Se for uma função (método do model), executa. Se for booleano, apenas lê.
                 resultado = metodo_ou_valor() if callable(metodo_ou_valor) else metodo_ou_valor
-                
-                if not resultado:
-                    # Tenta pegar o status do request (definido no Middleware lá em cima)
-                    status_atual = getattr(request, 'status_sistema', 'desconhecido')
-                    
-                    return JsonResponse({
-                        'error': f'Permissão negada para a ação: {acao_requerida}',
-                        'nivel_acesso': getattr(perfil, 'nivel', 'N/A'),
-                        'status_sistema': status_atual
-                    }, status=403)
             else:
                 return JsonResponse({'error': 'Ação de permissão inválida ou inexistente'}, status=500)
             
+            if not resultado:
+                # Tenta pegar o status do request (definido no Middleware lá em cima)
+                status_atual = getattr(request, 'status_sistema', 'desconhecido')
+                
+                return JsonResponse({
+                    'error': f'Permissão negada para a ação: {acao_requerida}',
+                    'nivel_acesso': getattr(perfil, 'nivel', 'N/A'),
+                    'status_sistema': status_atual
+                }, status=403)
+            
             return view_func(request, *args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+def resposta_condicional(view_func):
+    """
+    Decorator de GET condicional: ETag/Last-Modified a partir da versão global
+    dos dados (api/versoes.py). Se o cliente já tem a versão atual responde
+    304 antes de executar a view (nenhum agregado é calculado).
+    If-None-Match tem precedência: If-Modified-Since tem resolução de um
+    segundo e pode responder 304 para uma gravação feita no mesmo segundo.
+    Usar abaixo de `verificar_permissao`, para que a permissão seja checada antes.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_func(request, *args, **kwargs)
+
+        from django.http import HttpResponseNotModified
+        from django.utils.http import http_date, parse_http_date_safe
+        from .versoes import versao_dados
+
+        versao, alterado_em = versao_dados()
+        # O corpo depende do usuário (perfil/equipe), então ele entra no ETag
+        usuario = request.user.pk if request.user.is_authenticated else 'anonimo'
+        etag = f'"{versao}-{usuario}"'
+        last_modified = http_date(int(alterado_em))
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            nao_modificado = etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        else:
+            desde = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+            nao_modificado = desde is not None and int(alterado_em) <= desde
+
+        if nao_modificado:
+            response = HttpResponseNotModified()
+        else:
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
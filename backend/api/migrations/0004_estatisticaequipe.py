@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_add_numero_proposta_equipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticaEquipe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('propostas_enviadas', models.IntegerField(default=0, help_text='Propostas aguardando validação')),
+                ('propostas_validadas', models.IntegerField(default=0)),
+                ('propostas_rejeitadas', models.IntegerField(default=0)),
+                ('vendas_pendentes', models.IntegerField(default=0, help_text='Vendas aguardando validação do gestor')),
+                ('vendas_concretizadas', models.IntegerField(default=0, help_text='Vendas validadas pelo gestor')),
+                ('produtos_validados', models.IntegerField(default=0, help_text='Produtos das propostas validadas')),
+                ('produtos_propostas_vendidas', models.IntegerField(default=0, help_text='Produtos (da proposta) das vendas validadas')),
+                ('produtos_vendidos', models.IntegerField(default=0, help_text='Produtos (da venda) das vendas validadas')),
+                ('faturamento_previsto', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('faturamento_realizado', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('pontos', models.IntegerField(default=0)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('equipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='estatistica', to='api.equipe')),
+            ],
+            options={
+                'verbose_name': 'Estatística da Equipe',
+                'verbose_name_plural': 'Estatísticas das Equipes',
+            },
+        ),
+    ]
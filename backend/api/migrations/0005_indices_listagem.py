@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_estatisticaequipe'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='proposta',
+            index=models.Index(fields=['-data_envio', '-id'], name='proposta_data_envio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['-data_criacao', '-id'], name='venda_data_criacao_idx'),
+        ),
+    ]
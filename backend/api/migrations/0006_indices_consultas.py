@@ -0,0 +1,61 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class AddIndexPostgres(migrations.AddIndex):
+    """AddIndex que só cria o índice no PostgreSQL
+
+    Os índices parciais das filas têm o valor da situação na condição
+    (`status = 'vendida'`, `status_validacao = 'pendente'`). O Django envia
+    esse valor como parâmetro na consulta, e o SQLite só usa um índice
+    parcial quando consegue provar a condição sem olhar os parâmetros, então
+    lá o índice seria só custo de escrita. No PostgreSQL o planner compara os
+    valores e usa o índice.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_indices_listagem'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='proposta',
+            index=models.Index(fields=['equipe', 'status'], name='proposta_equipe_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposta',
+            index=models.Index(fields=['equipe', '-data_envio', '-id'], name='proposta_equipe_envio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposta',
+            index=models.Index(fields=['status', '-data_envio', '-id'], name='proposta_status_envio_idx'),
+        ),
+        AddIndexPostgres(
+            model_name='proposta',
+            index=models.Index(condition=models.Q(('status', 'vendida'), ('venda_validada', False)), fields=['-data_envio', '-id'], name='proposta_fila_venda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ranking',
+            index=models.Index(fields=['estado_sistema', 'posicao'], name='ranking_estado_posicao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['status_validacao', '-data_criacao', '-id'], name='venda_status_criacao_idx'),
+        ),
+        AddIndexPostgres(
+            model_name='venda',
+            index=models.Index(condition=models.Q(('status_validacao', 'pendente')), fields=['-data_criacao', '-id'], name='venda_fila_validacao_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def numerar_propostas(apps, schema_editor):
+    """Preencher os contadores e corrigir números repetidos antes da restrição única
+
+    Propostas anteriores à 0003 ficaram com número 0, e envios simultâneos
+    podiam repetir números. Em cada equipe, a primeira proposta (por data de
+    envio) de cada número o mantém; as demais recebem os próximos números livres.
+    """
+    Equipe = apps.get_model('api', 'Equipe')
+    Proposta = apps.get_model('api', 'Proposta')
+    ContadorPropostaEquipe = apps.get_model('api', 'ContadorPropostaEquipe')
+
+    contadores = []
+    for equipe_id in Equipe.objects.values_list('id', flat=True):
+        propostas = list(Proposta.objects.filter(equipe_id=equipe_id).order_by('data_envio', 'id').only('id', 'numero_proposta_equipe'))
+        usados = set()
+        renumerar = []
+        for proposta in propostas:
+            if proposta.numero_proposta_equipe > 0 and proposta.numero_proposta_equipe not in usados:
+                usados.add(proposta.numero_proposta_equipe)
+            else:
+                renumerar.append(proposta)
+        ultimo = max(usados, default=0)
+        for proposta in renumerar:
+            ultimo += 1
+            proposta.numero_proposta_equipe = ultimo
+        if renumerar:
+            Proposta.objects.bulk_update(renumerar, ['numero_proposta_equipe'], batch_size=500)
+        contadores.append(ContadorPropostaEquipe(equipe_id=equipe_id, ultimo_numero=ultimo))
+
+    ContadorPropostaEquipe.objects.bulk_create(contadores, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorPropostaEquipe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_numero', models.IntegerField(default=0)),
+                ('equipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='contador_propostas', to='api.equipe')),
+            ],
+            options={
+                'verbose_name': 'Contador de Propostas da Equipe',
+                'verbose_name_plural': 'Contadores de Propostas das Equipes',
+            },
+        ),
+        migrations.RunPython(numerar_propostas, migrations.RunPython.noop),
+    ]
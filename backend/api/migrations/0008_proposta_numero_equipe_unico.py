@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_contador_proposta_equipe'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='proposta',
+            constraint=models.UniqueConstraint(fields=('equipe', 'numero_proposta_equipe'), name='proposta_numero_equipe_unico'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 
 
@@ -94,6 +94,12 @@ class StatusSistema(models.Model):
     
     @classmethod
     def get_status_atual(cls):
+        """Fase atual, lida do banco apenas quando a versão muda (ver api/versoes.py)"""
+        from .versoes import obter
+        return obter('status_sistema', cls._carregar_status_atual)
+
+    @classmethod
+    def _carregar_status_atual(cls):
         try:
             return cls.objects.first().status_atual
         except:
@@ -120,104 +126,79 @@ class PerfilAcesso(models.Model):
     def __str__(self):
         return f"{self.usuario.username} - {self.get_nivel_display()}"
     
+    # As regras ficam na matriz de api/permissoes.py (consulta por nível e fase)
+    def tem_permissao(self, acao):
+        from .permissoes import tem_permissao
+        return tem_permissao(self.nivel, acao)
+
     # Permissões Administrador
     def pode_criar_equipes(self):
-        return self.nivel in ['administrador', 'admin']
+        return self.tem_permissao('pode_criar_equipes')
     
     def pode_criar_usuarios(self):
-        return self.nivel in ['administrador', 'admin']
+        return self.tem_permissao('pode_criar_usuarios')
     
     def pode_alterar_status_sistema(self):
-        return self.nivel in ['administrador', 'admin']
+        """Apenas admin pode alterar status do sistema"""
+        return self.tem_permissao('pode_alterar_status_sistema')
     
     # Permissões Gestor
     
     def pode_ver_todas_equipes(self):
         """Gestor pode ver todas as equipes da sua regional"""
-        return self.nivel in ['administrador', 'admin', 'gestor']
+        return self.tem_permissao('pode_ver_todas_equipes')
     
     def pode_ver_todas_propostas(self):
         """Gestor pode ver todas as propostas para validação"""
-        return self.nivel in ['administrador', 'admin', 'gestor']
-    
-    def pode_alterar_status_sistema(self):
-        """Apenas admin pode alterar status do sistema"""
-        return self.nivel in ['administrador', 'admin']
-    
-    
+        return self.tem_permissao('pode_ver_todas_propostas')
     
     # Permissões Banca
     def pode_ver_dashboard_geral(self):
-        return self.nivel in ['administrador', 'admin', 'banca']
+        return self.tem_permissao('pode_ver_dashboard_geral')
     
     def pode_gerenciar_regras_pontuacao(self):
         """Apenas banca e admin podem gerenciar regras de pontuação - GESTOR NÃO"""
-        return self.nivel in ['administrador', 'admin', 'banca']
+        return self.tem_permissao('pode_gerenciar_regras_pontuacao')
     
     def pode_ver_ranking_tempo_real(self):
         """Banca pode ver ranking em tempo real"""
-        return self.nivel in ['administrador', 'admin', 'banca']
+        return self.tem_permissao('pode_ver_ranking_tempo_real')
     
     def pode_ver_ranking(self):
         """Quem pode ver ranking - Banca, Admin e Gestor"""
-        return self.nivel in ['administrador', 'admin', 'gestor', 'banca']
+        return self.tem_permissao('pode_ver_ranking')
     
     def pode_validar_propostas(self):
-        """BANCA NÃO VALIDA PROPOSTAS - APENAS GESTOR"""
-        status_atual = StatusSistema.get_status_atual()
-        if status_atual != 'workshop':
-            return False  # Validação apenas durante workshop
-        return self.nivel in ['administrador', 'admin', 'gestor']
+        """BANCA NÃO VALIDA PROPOSTAS - APENAS GESTOR (apenas durante workshop)"""
+        return self.tem_permissao('pode_validar_propostas')
     
     # Permissões Equipe
     def pode_ver_dados_equipe(self):
-        return self.nivel in ['administrador', 'admin', 'gestor', 'equipe']
+        return self.tem_permissao('pode_ver_dados_equipe')
     
     def pode_registrar_previsao(self):
         """PRÉ-WORKSHOP: Não permitido para equipes"""
-        status_atual = StatusSistema.get_status_atual()
-        if status_atual == 'encerrado':
-            return False
-        if status_atual == 'pre_workshop' and self.nivel == 'equipe':
-            return False  # Equipes não operam no pré-workshop
-        return self.nivel in ['administrador', 'gestor', 'equipe']
+        return self.tem_permissao('pode_registrar_previsao')
     
     def pode_registrar_resultado(self):
         """PRÉ-WORKSHOP: Não permitido para equipes"""
-        status_atual = StatusSistema.get_status_atual()
-        if status_atual == 'encerrado':
-            return False
-        if status_atual == 'pre_workshop' and self.nivel == 'equipe':
-            return False  # Equipes não operam no pré-workshop
-        return self.nivel in ['administrador', 'gestor', 'equipe']
+        return self.tem_permissao('pode_registrar_resultado')
     
     def pode_enviar_propostas(self):
         """WORKSHOP: Apenas equipes enviam propostas"""
-        status_atual = StatusSistema.get_status_atual()
-        if status_atual != 'workshop':
-            return False  # Propostas apenas durante workshop
-        return self.nivel == 'equipe'
+        return self.tem_permissao('pode_enviar_propostas')
     
     def pode_marcar_vendas(self):
         """PÓS-WORKSHOP: Apenas equipes marcam vendas"""
-        status_atual = StatusSistema.get_status_atual()
-        if status_atual != 'pos_workshop':
-            return False  # Marcação de vendas apenas no pós-workshop
-        return self.nivel == 'equipe'
+        return self.tem_permissao('pode_marcar_vendas')
     
     def pode_validar_vendas(self):
         """PRÉ-WORKSHOP: Gestor pode validar vendas para preparação"""
-        status_atual = StatusSistema.get_status_atual()
-        if status_atual not in ['pre_workshop', 'pos_workshop']:
-            return False  # Validação apenas no pré ou pós-workshop
-        return self.nivel in ['administrador', 'admin', 'gestor']
+        return self.tem_permissao('pode_validar_vendas')
     
     def pode_acessar_sistema_encerrado(self):
         """ENCERRADO: Apenas admin, gestor e banca acessam dashboards"""
-        status_atual = StatusSistema.get_status_atual()
-        if status_atual != 'encerrado':
-            return True  # Se não está encerrado, todos podem acessar conforme suas permissões
-        return self.nivel in ['administrador', 'admin', 'gestor', 'banca']
+        return self.tem_permissao('pode_acessar_sistema_encerrado')
     
     def _pode_operar_no_status(self):
         """Método legado - mantido para compatibilidade"""
@@ -294,17 +275,75 @@ class Proposta(models.Model):
         verbose_name = "Proposta"
         verbose_name_plural = "Propostas"
         ordering = ['-data_envio']
+        indexes = [
+            # Ordenação das listagens e paginação por cursor (api/listagem.py)
+            models.Index(fields=['-data_envio', '-id'], name='proposta_data_envio_idx'),
+            # Listas e agregados de uma equipe (dashboard, vendas, ranking da equipe)
+            models.Index(fields=['equipe', 'status'], name='proposta_equipe_status_idx'),
+            models.Index(fields=['equipe', '-data_envio', '-id'], name='proposta_equipe_envio_idx'),
+            # Listas por situação (fila do gestor, propostas validadas) já na ordem das listas
+            models.Index(fields=['status', '-data_envio', '-id'], name='proposta_status_envio_idx'),
+            # Fila de vendas por validar: índice parcial só com as propostas da fila
+            # (criado só no PostgreSQL, ver migração 0006)
+            models.Index(
+                fields=['-data_envio', '-id'], name='proposta_fila_venda_idx',
+                condition=models.Q(status='vendida', venda_validada=False),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['equipe', 'numero_proposta_equipe'], name='proposta_numero_equipe_unico'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.pk and self.numero_proposta_equipe == 0:
-            # Atribuir número sequencial por equipe ao criar nova proposta
-            ultimo = Proposta.objects.filter(equipe=self.equipe).order_by('-numero_proposta_equipe').first()
-            self.numero_proposta_equipe = (ultimo.numero_proposta_equipe if ultimo else 0) + 1
-        super().save(*args, **kwargs)
+        # Uma transação para a gravação e os signals de post_save (estatísticas da equipe em api/signals.py)
+        with transaction.atomic():
+            if not self.pk and self.numero_proposta_equipe == 0:
+                # Número reservado na mesma transação do INSERT: se a gravação falhar, o contador volta junto
+                self.numero_proposta_equipe = ContadorPropostaEquipe.reservar_numeros(self.equipe_id)
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Proposta {self.id} - {self.equipe.nome} - {self.cliente.nome}"
 
+class ContadorPropostaEquipe(models.Model):
+    """Último `numero_proposta_equipe` usado por cada equipe
+
+    O UPDATE com F() trava apenas a linha da equipe até o fim da transação:
+    envios simultâneos da mesma equipe recebem números consecutivos sem
+    repetir, e envios de equipes diferentes não esperam uns pelos outros.
+    """
+    equipe = models.OneToOneField(Equipe, on_delete=models.CASCADE, related_name='contador_propostas')
+    ultimo_numero = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador de Propostas da Equipe"
+        verbose_name_plural = "Contadores de Propostas das Equipes"
+
+    def __str__(self):
+        return f"{self.equipe.nome}: {self.ultimo_numero}"
+
+    @classmethod
+    def reservar_numeros(cls, equipe_id, quantidade=1):
+        """Reservar `quantidade` números consecutivos para a equipe e retornar o primeiro
+
+        Deve rodar dentro da transação que grava as propostas, para que um
+        rollback devolva os números e a sequência continue sem lacunas.
+        """
+        with transaction.atomic():
+            atualizados = cls.objects.filter(equipe_id=equipe_id).update(ultimo_numero=models.F('ultimo_numero') + quantidade)
+            if not atualizados:
+                # Primeira proposta da equipe: o contador parte do maior número já gravado
+                maior = Proposta.objects.filter(equipe_id=equipe_id).aggregate(maior=models.Max('numero_proposta_equipe'))['maior'] or 0
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(equipe_id=equipe_id, ultimo_numero=maior + quantidade)
+                    return maior + 1
+                except IntegrityError:
+                    # Outro envio criou o contador ao mesmo tempo
+                    cls.objects.filter(equipe_id=equipe_id).update(ultimo_numero=models.F('ultimo_numero') + quantidade)
+            ultimo = cls.objects.filter(equipe_id=equipe_id).values_list('ultimo_numero', flat=True).get()
+        return ultimo - quantidade + 1
+
 class RegraPontuacao(models.Model):
     """Regras de pontuação definidas pela banca por estado do sistema"""
     nome = models.CharField(max_length=100)
@@ -345,6 +384,17 @@ class ConfiguracaoPontuacao(models.Model):
     
     @classmethod
     def get_configuracao(cls):
+        """Configuração da banca, servida da memória do processo enquanto a versão não mudar
+
+        Cada chamada devolve uma instância nova, então alterar e salvar o
+        retorno não afeta o valor em cache (o save invalida a versão).
+        """
+        from .versoes import obter
+        db, valores = obter('configuracao_pontuacao', cls._carregar_configuracao)
+        return cls.from_db(db, [campo.attname for campo in cls._meta.concrete_fields], valores)
+
+    @classmethod
+    def _carregar_configuracao(cls):
         config, created = cls.objects.get_or_create(
             id=1,
             defaults={
@@ -352,7 +402,7 @@ class ConfiguracaoPontuacao(models.Model):
                 'pontos_por_produto': 1
             }
         )
-        return config
+        return config._state.db, tuple(getattr(config, campo.attname) for campo in cls._meta.concrete_fields)
 
 class Venda(models.Model):
     """Vendas concretizadas no pós-workshop"""
@@ -387,6 +437,17 @@ class Venda(models.Model):
         verbose_name = "Venda"
         verbose_name_plural = "Vendas"
         ordering = ['-data_criacao']
+        indexes = [
+            models.Index(fields=['-data_criacao', '-id'], name='venda_data_criacao_idx'),
+            # Fila de validação de vendas do gestor e listas por situação, já na ordem das listas
+            models.Index(fields=['status_validacao', '-data_criacao', '-id'], name='venda_status_criacao_idx'),
+            # Fila de validação de vendas: índice parcial só com as vendas pendentes
+            # (criado só no PostgreSQL, ver migração 0006)
+            models.Index(
+                fields=['-data_criacao', '-id'], name='venda_fila_validacao_idx',
+                condition=models.Q(status_validacao='pendente'),
+            ),
+        ]
     
     def __str__(self):
         return f"Venda #{self.id} - {self.proposta.equipe.nome} - R$ {self.valor_total_venda} ({self.get_status_validacao_display()})"
@@ -402,9 +463,9 @@ class Venda(models.Model):
     
     def calcular_pontos(self):
         """Calcular pontos baseado na configuração atual"""
-        from api.models import ConfiguracaoPontuacao
-        config = ConfiguracaoPontuacao.get_configuracao()
-        return self.quantidade_produtos_vendidos * config.pontos_por_produto
+        from api.pontuacao import pontos_venda
+        from api.recalculo import obter_snapshot_pontuacao
+        return pontos_venda(obter_snapshot_pontuacao(), self.quantidade_produtos_vendidos)
 
 class Ranking(models.Model):
     """Ranking das equipes por estado do sistema"""
@@ -423,6 +484,54 @@ class Ranking(models.Model):
         verbose_name_plural = "Ranking"
         ordering = ['estado_sistema', 'posicao']
         unique_together = ['equipe', 'estado_sistema']  # Uma posição por equipe por estado
+        indexes = [
+            models.Index(fields=['estado_sistema', 'posicao'], name='ranking_estado_posicao_idx'),
+        ]
     
     def __str__(self):
         return f"#{self.posicao} {self.get_estado_sistema_display()} - {self.equipe.nome} ({self.pontos} pts)"
+
+class EstatisticaEquipe(models.Model):
+    """Totais de propostas/vendas por equipe, mantidos a cada alteração de proposta
+
+    Independe da fase do sistema: cada dashboard escolhe quais colunas exibir.
+    Mantida por `api/estatisticas.py`; `manage.py reconstruir_estatisticas`
+    recalcula a tabela inteira a partir das propostas.
+    """
+    equipe = models.OneToOneField(Equipe, on_delete=models.CASCADE, related_name='estatistica')
+    propostas_enviadas = models.IntegerField(default=0, help_text="Propostas aguardando validação")
+    propostas_validadas = models.IntegerField(default=0)
+    propostas_rejeitadas = models.IntegerField(default=0)
+    vendas_pendentes = models.IntegerField(default=0, help_text="Vendas aguardando validação do gestor")
+    vendas_concretizadas = models.IntegerField(default=0, help_text="Vendas validadas pelo gestor")
+    produtos_validados = models.IntegerField(default=0, help_text="Produtos das propostas validadas")
+    produtos_propostas_vendidas = models.IntegerField(default=0, help_text="Produtos (da proposta) das vendas validadas")
+    produtos_vendidos = models.IntegerField(default=0, help_text="Produtos (da venda) das vendas validadas")
+    faturamento_previsto = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    faturamento_realizado = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    pontos = models.IntegerField(default=0)
+    data_atualizacao = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Estatística da Equipe"
+        verbose_name_plural = "Estatísticas das Equipes"
+
+    def __str__(self):
+        return f"Estatísticas - {self.equipe.nome}"
+
+class Sequencia(models.Model):
+    """Contador crescente compartilhado entre processos (ver `versoes.incrementar`)
+
+    Usado pela versão global dos dados (ETags) e pelas sequências dos canais
+    em tempo real. Fica no banco porque o `incr` do cache em arquivo não é
+    atômico entre os workers do gunicorn e o serviço ASGI.
+    """
+    nome = models.CharField(max_length=100, unique=True)
+    valor = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Sequência"
+        verbose_name_plural = "Sequências"
+
+    def __str__(self):
+        return f"{self.nome}: {self.valor}"
@@ -0,0 +1,78 @@
+"""Matriz de permissões por (nível, fase do sistema).
+
+Todas as regras de `PerfilAcesso.pode_*` dependem apenas do nível do perfil e
+da fase atual, então a tabela completa é montada uma única vez na importação:
+a troca de fase só muda qual linha é consultada. Verificar uma permissão vira
+uma consulta a dicionário, sem query.
+"""
+from .models import PerfilAcesso, StatusSistema
+
+
+ADMINISTRADORES = ['administrador', 'admin']
+GESTAO = ADMINISTRADORES + ['gestor']
+BANCA = ADMINISTRADORES + ['banca']
+
+
+def _regras(nivel, status_atual):
+    """Valor de cada permissão para um nível em uma fase"""
+    return {
+        # Administrador
+        'pode_criar_equipes': nivel in ADMINISTRADORES,
+        'pode_criar_usuarios': nivel in ADMINISTRADORES,
+        'pode_alterar_status_sistema': nivel in ADMINISTRADORES,
+        # Gestor
+        'pode_ver_todas_equipes': nivel in GESTAO,
+        'pode_ver_todas_propostas': nivel in GESTAO,
+        # Banca
+        'pode_ver_dashboard_geral': nivel in BANCA,
+        'pode_gerenciar_regras_pontuacao': nivel in BANCA,
+        'pode_ver_ranking_tempo_real': nivel in BANCA,
+        'pode_ver_ranking': nivel in GESTAO + ['banca'],
+        # Validação de propostas apenas durante o workshop (banca não valida)
+        'pode_validar_propostas': status_atual == 'workshop' and nivel in GESTAO,
+        # Equipe
+        'pode_ver_dados_equipe': nivel in GESTAO + ['equipe'],
+        # Equipes não operam no pré-workshop; ninguém registra após o encerramento
+        'pode_registrar_previsao': (
+            status_atual != 'encerrado'
+            and not (status_atual == 'pre_workshop' and nivel == 'equipe')
+            and nivel in ['administrador', 'gestor', 'equipe']
+        ),
+        'pode_registrar_resultado': (
+            status_atual != 'encerrado'
+            and not (status_atual == 'pre_workshop' and nivel == 'equipe')
+            and nivel in ['administrador', 'gestor', 'equipe']
+        ),
+        'pode_enviar_propostas': status_atual == 'workshop' and nivel == 'equipe',
+        'pode_marcar_vendas': status_atual == 'pos_workshop' and nivel == 'equipe',
+        'pode_validar_vendas': status_atual in ['pre_workshop', 'pos_workshop'] and nivel in GESTAO,
+        # Encerrado: apenas admin, gestor e banca acessam dashboards
+        'pode_acessar_sistema_encerrado': status_atual != 'encerrado' or nivel in GESTAO + ['banca'],
+    }
+
+
+NIVEIS = [nivel for nivel, _ in PerfilAcesso.NIVEL_CHOICES] + ['admin']
+FASES = [status for status, _ in StatusSistema.STATUS_CHOICES]
+
+MATRIZ_PERMISSOES = {
+    (nivel, status_atual): _regras(nivel, status_atual)
+    for nivel in NIVEIS
+    for status_atual in FASES
+}
+
+ACOES = frozenset(_regras(None, None))
+
+
+def permissoes(nivel, status_atual=None):
+    """Linha da matriz ({acao: bool}) para o nível na fase informada (ou na atual)"""
+    if status_atual is None:
+        status_atual = StatusSistema.get_status_atual()
+    linha = MATRIZ_PERMISSOES.get((nivel, status_atual))
+    if linha is None:
+        # Nível ou fase fora das opções conhecidas: calcula sem guardar
+        linha = _regras(nivel, status_atual)
+    return linha
+
+
+def tem_permissao(nivel, acao, status_atual=None):
+    return permissoes(nivel, status_atual)[acao]
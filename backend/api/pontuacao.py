@@ -0,0 +1,178 @@
+"""Regra de pontuação das propostas, sem acesso ao banco.
+
+Tudo aqui recebe um `SnapshotPontuacao` (fase do sistema + configuração da
+banca já carregadas) e devolve números. Views, serializers e os recálculos em
+massa (`api/recalculo.py`) usam as mesmas funções, então pontuar um lote
+inteiro não custa nenhuma query extra.
+
+`expressoes_pontuacao` traduz a mesma regra para expressões SQL (CASE), usadas
+pelo recálculo feito inteiramente no banco.
+"""
+from collections import namedtuple
+from itertools import product
+
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+
+SnapshotPontuacao = namedtuple('SnapshotPontuacao', ['status_atual', 'pontos_proposta_validada', 'pontos_por_produto'])
+
+# Bônus exibidos na proposta: (campo, rótulo, pontos)
+BONUS = [
+    ('bonus_vinhos_casa_perini_mundo', 'Linha Vinhos Casa Perini Mundo (min 5 Caixas)', 5),
+    ('bonus_vinhos_fracao_unica', 'Linha Vinhos Fração Única (min 5 Caixas)', 5),
+    ('bonus_espumantes_vintage', 'Linha Espumantes Vintage (min 5 Caixas)', 5),
+    ('bonus_espumantes_premium', 'Linha Espumantes Premium (min 2 Caixas)', 5),
+    ('bonus_aceleracao', 'Bônus de Aceleração (Venda fechada durante o game)', 25),
+]
+
+# Bônus de produtos que entram na pontuação da proposta (o de aceleração é apenas exibido)
+CAMPOS_BONUS = [campo for campo, _, _ in BONUS if campo != 'bonus_aceleracao']
+PONTOS_BONUS = {campo: pontos for campo, _, pontos in BONUS}
+
+# Campos necessários para pontuar uma proposta
+CAMPOS_PONTUACAO = [
+    'id', 'status', 'venda_validada', 'quantidade_produtos', 'quantidade_produtos_venda',
+    'pontos', 'pontos_bonus',
+] + CAMPOS_BONUS
+
+
+def criar_snapshot(config, status_atual):
+    """Congelar a configuração da banca e a fase atual em um snapshot imutável"""
+    return SnapshotPontuacao(
+        status_atual=status_atual,
+        pontos_proposta_validada=config.pontos_proposta_validada or 0,
+        pontos_por_produto=config.pontos_por_produto or 0,
+    )
+
+
+def calcular_bonus(proposta):
+    return sum(PONTOS_BONUS[campo] for campo in CAMPOS_BONUS if getattr(proposta, campo))
+
+
+def bonus_selecionados(proposta):
+    """Lista de bônus selecionados para exibição"""
+    return [
+        {'label': rotulo, 'pontos': pontos}
+        for campo, rotulo, pontos in BONUS
+        if getattr(proposta, campo)
+    ]
+
+
+# Lista de bônus exibida para cada combinação de campos marcados (na ordem de BONUS),
+# usada pelas listagens que leem linhas de .values() em vez de instâncias
+ROTULOS_BONUS = {
+    marcados: [{'label': rotulo, 'pontos': pontos} for (_, rotulo, pontos), marcado in zip(BONUS, marcados) if marcado]
+    for marcados in product([False, True], repeat=len(BONUS))
+}
+
+
+def pontuar(snapshot, proposta):
+    """Calcular a pontuação de uma proposta
+    - No Workshop: Pontos por proposta validada + (quantidade_produtos × pontos_por_produto) + bônus
+    - No Pós-Workshop: Pontos por venda validada + (quantidade_produtos_venda × pontos_por_produto) + bônus
+    - Demais estados: mantém os pontos já calculados de propostas validadas/vendas validadas
+
+    Retorna um dicionário com `pontos` e `pontos_bonus` (valores a gravar na
+    proposta) e a composição `pontos_base` + `pontos_produtos` quando a regra
+    recalcula a proposta. Quando não recalcula, `pontos_bonus` volta inalterado.
+    """
+    resultado = {
+        'pontos': 0,
+        'pontos_base': 0,
+        'pontos_produtos': 0,
+        'pontos_bonus': proposta.pontos_bonus,
+    }
+
+    if snapshot.status_atual == 'workshop':
+        # No Workshop, ganha pontos se a proposta for validada
+        if proposta.status == 'validada':
+            resultado['pontos_base'] = snapshot.pontos_proposta_validada
+            resultado['pontos_produtos'] = (proposta.quantidade_produtos or 0) * snapshot.pontos_por_produto
+            resultado['pontos_bonus'] = calcular_bonus(proposta)
+        elif proposta.status == 'vendida':
+            # Se já mudou para vendida mas ainda estamos no status global Workshop (raro), mantém pontos da validação
+            resultado['pontos'] = proposta.pontos or 0
+            return resultado
+        else:
+            return resultado
+
+    elif snapshot.status_atual == 'pos_workshop':
+        # No Pós-Workshop, ganha pontos APENAS se a venda for validada pelo gestor
+        if not (proposta.status == 'vendida' and proposta.venda_validada):
+            return resultado
+        resultado['pontos_base'] = snapshot.pontos_proposta_validada  # Reutiliza a regra de pontuação base
+        resultado['pontos_produtos'] = (proposta.quantidade_produtos_venda or 0) * snapshot.pontos_por_produto
+        resultado['pontos_bonus'] = calcular_bonus(proposta)
+
+    else:
+        # Outros estados do sistema (pre_workshop, encerrado): mantém o que já foi calculado
+        if proposta.status == 'validada' or (proposta.status == 'vendida' and proposta.venda_validada):
+            resultado['pontos'] = proposta.pontos or 0
+        return resultado
+
+    resultado['pontos'] = resultado['pontos_base'] + resultado['pontos_produtos'] + resultado['pontos_bonus']
+    return resultado
+
+
+def pontuar_lote(snapshot, propostas):
+    """Pontuar várias propostas com o mesmo snapshot: {proposta.id: pontuação}"""
+    return {proposta.id: pontuar(snapshot, proposta) for proposta in propostas}
+
+
+def pontos_produtos_validada(snapshot, proposta):
+    """Pontos de uma proposta validada (fixos + quantidade × pontos por produto), sem bônus"""
+    return pontos_validada(snapshot, proposta.status, proposta.quantidade_produtos)
+
+
+def pontos_validada(snapshot, status, quantidade_produtos):
+    if status != 'validada' or not quantidade_produtos:
+        return 0
+    return snapshot.pontos_proposta_validada + snapshot.pontos_por_produto * quantidade_produtos
+
+
+def pontos_venda(snapshot, quantidade_produtos_vendidos):
+    """Pontos de uma venda: quantidade de produtos vendidos × pontos por produto"""
+    return (quantidade_produtos_vendidos or 0) * snapshot.pontos_por_produto
+
+
+def _expressao_bonus():
+    bonus = Value(0)
+    for campo in CAMPOS_BONUS:
+        bonus = bonus + Case(When(**{campo: True}, then=Value(PONTOS_BONUS[campo])), default=Value(0))
+    return bonus
+
+
+def expressoes_pontuacao(snapshot):
+    """Expressões SQL equivalentes a `pontuar` para (pontos, pontos_bonus)"""
+    base = Value(snapshot.pontos_proposta_validada)
+    por_produto = Value(snapshot.pontos_por_produto)
+    bonus = _expressao_bonus()
+
+    if snapshot.status_atual == 'workshop':
+        validada = Q(status='validada')
+        pontos = Case(
+            When(validada, then=base + F('quantidade_produtos') * por_produto + bonus),
+            When(status='vendida', then=F('pontos')),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        pontos_bonus = Case(When(validada, then=bonus), default=F('pontos_bonus'), output_field=IntegerField())
+
+    elif snapshot.status_atual == 'pos_workshop':
+        venda_validada = Q(status='vendida', venda_validada=True)
+        pontos = Case(
+            When(venda_validada, then=base + F('quantidade_produtos_venda') * por_produto + bonus),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        pontos_bonus = Case(When(venda_validada, then=bonus), default=F('pontos_bonus'), output_field=IntegerField())
+
+    else:
+        pontos = Case(
+            When(Q(status='validada') | Q(status='vendida', venda_validada=True), then=F('pontos')),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        pontos_bonus = F('pontos_bonus')
+
+    return pontos, pontos_bonus
@@ -0,0 +1,189 @@
+"""Motor de ranking das equipes.
+
+Cada alteração em uma proposta afeta apenas a equipe dona dela, então o
+caminho normal (`atualizar_ranking_equipe`) recalcula só a linha de
+`Ranking` dessa equipe e reordena as posições com um único UPDATE.
+A reconstrução completa (`atualizar_ranking`) fica reservada para mudanças
+estruturais: equipe criada/removida, troca de fase ou mudança de regras.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .estatisticas import reconstruir_estatisticas
+from .models import Equipe, Proposta, Ranking, StatusSistema
+from .tempo_real import publicar_ranking_apos_commit
+from .versoes import marcar_dados_alterados
+
+
+logger = logging.getLogger(__name__)
+
+
+CAMPOS_RANKING = [
+    'posicao', 'pontos', 'propostas_enviadas', 'propostas_validadas',
+    'vendas_concretizadas', 'valor_total_vendas', 'data_atualizacao',
+]
+
+
+def _agregados_ranking(prefixo=''):
+    """Expressões de agregação usadas no ranking.
+
+    `prefixo` permite usar as mesmas expressões a partir de `Equipe`
+    (prefixo='propostas__') ou diretamente sobre `Proposta` (prefixo='').
+    """
+    venda_validada = Q(**{f'{prefixo}status': 'vendida', f'{prefixo}venda_validada': True})
+    return {
+        'propostas_enviadas': Count(f'{prefixo}id'),
+        'propostas_validadas': Count(f'{prefixo}id', filter=Q(**{f'{prefixo}status': 'validada'})),
+        'vendas_concretizadas': Count(f'{prefixo}id', filter=venda_validada),
+        'valor_total_vendas': Coalesce(Sum(f'{prefixo}valor_venda', filter=venda_validada), Value(0), output_field=DecimalField(max_digits=15, decimal_places=2)),
+        'pontos': Coalesce(Sum(f'{prefixo}pontos', filter=Q(**{f'{prefixo}status__in': ['validada', 'vendida']})), Value(0), output_field=IntegerField()),
+    }
+
+
+def reordenar_posicoes(status_atual):
+    """Recalcula `posicao` de todas as equipes da fase em um único UPDATE.
+
+    A posição é 1 + quantidade de equipes à frente, usando o mesmo critério
+    da reconstrução completa: pontos, depois valor de vendas e, no empate,
+    a equipe mais antiga (menor id) fica à frente.
+    """
+    a_frente = Ranking.objects.filter(
+        estado_sistema=OuterRef('estado_sistema'),
+    ).filter(
+        Q(pontos__gt=OuterRef('pontos'))
+        | Q(pontos=OuterRef('pontos'), valor_total_vendas__gt=OuterRef('valor_total_vendas'))
+        | Q(pontos=OuterRef('pontos'), valor_total_vendas=OuterRef('valor_total_vendas'), equipe_id__lt=OuterRef('equipe_id'))
+    ).order_by().values('estado_sistema').annotate(total=Count('id')).values('total')
+
+    Ranking.objects.filter(estado_sistema=status_atual).update(
+        posicao=Coalesce(Subquery(a_frente, output_field=IntegerField()), Value(0)) + 1
+    )
+
+
+def atualizar_ranking_equipe(equipe_id, status_atual=None):
+    """Atualizar apenas a linha de ranking da equipe afetada e reordenar posições"""
+    if not equipe_id:
+        return
+    if isinstance(equipe_id, Equipe):
+        equipe_id = equipe_id.pk
+    if status_atual is None:
+        status_atual = StatusSistema.get_status_atual()
+
+    with transaction.atomic():
+        estatisticas = Proposta.objects.filter(equipe_id=equipe_id).aggregate(**_agregados_ranking())
+        estatisticas['pontos'] = int(estatisticas['pontos'])
+        estatisticas['data_atualizacao'] = timezone.now()
+
+        atualizados = Ranking.objects.filter(equipe_id=equipe_id, estado_sistema=status_atual).update(**estatisticas)
+        if not atualizados:
+            if not Equipe.objects.filter(id=equipe_id).exists():
+                return
+            estatisticas.pop('data_atualizacao')
+            Ranking.objects.create(equipe_id=equipe_id, estado_sistema=status_atual, posicao=0, **estatisticas)
+
+        reordenar_posicoes(status_atual)
+        publicar_ranking_apos_commit(status_atual)
+        marcar_dados_alterados()
+
+
+def atualizar_ranking_equipes(equipe_ids, status_atual=None):
+    """Atualizar as linhas de ranking de várias equipes e reordenar posições uma vez
+
+    Usado pelas operações em lote (`api/lotes.py`): uma consulta agrupada
+    para todas as equipes afetadas, em vez de uma agregação e uma
+    reordenação por equipe.
+    """
+    equipe_ids = {equipe.pk if isinstance(equipe, Equipe) else equipe for equipe in equipe_ids if equipe}
+    if not equipe_ids:
+        return
+    if status_atual is None:
+        status_atual = StatusSistema.get_status_atual()
+
+    with transaction.atomic():
+        # Partindo de Equipe: equipes sem propostas saem zeradas e equipes removidas ficam de fora
+        equipes = Equipe.objects.filter(id__in=equipe_ids).annotate(**_agregados_ranking('propostas__')).values(
+            'id', 'propostas_enviadas', 'propostas_validadas', 'vendas_concretizadas',
+            'valor_total_vendas', 'pontos',
+        )
+        existentes = {r.equipe_id: r for r in Ranking.objects.filter(equipe_id__in=equipe_ids, estado_sistema=status_atual)}
+        agora = timezone.now()
+        para_atualizar = []
+        para_criar = []
+
+        for item in equipes:
+            equipe_id = item.pop('id')
+            item['pontos'] = int(item['pontos'])
+            ranking = existentes.get(equipe_id)
+            if ranking is None:
+                para_criar.append(Ranking(equipe_id=equipe_id, estado_sistema=status_atual, posicao=0, **item))
+                continue
+            ranking.data_atualizacao = agora
+            for campo, valor in item.items():
+                setattr(ranking, campo, valor)
+            para_atualizar.append(ranking)
+
+        if not para_atualizar and not para_criar:
+            return
+        if para_atualizar:
+            Ranking.objects.bulk_update(para_atualizar, [c for c in CAMPOS_RANKING if c != 'posicao'], batch_size=500)
+        if para_criar:
+            Ranking.objects.bulk_create(para_criar, batch_size=500)
+
+        reordenar_posicoes(status_atual)
+        publicar_ranking_apos_commit(status_atual)
+        marcar_dados_alterados()
+
+
+def atualizar_ranking():
+    """Atualizar ranking completo de todas as equipes
+
+    Todas as estatísticas saem de uma única consulta agrupada por equipe e
+    são gravadas com bulk_update/bulk_create, então o número de queries não
+    depende da quantidade de equipes.
+    """
+    status_atual = StatusSistema.get_status_atual()
+
+    with transaction.atomic():
+        equipes = list(
+            Equipe.objects.order_by('id').annotate(**_agregados_ranking('propostas__')).values(
+                'id', 'propostas_enviadas', 'propostas_validadas', 'vendas_concretizadas',
+                'valor_total_vendas', 'pontos',
+            )
+        )
+
+        # Ordenar por pontuação (decrescente) e definir posições
+        equipes.sort(key=lambda item: (item['pontos'], item['valor_total_vendas']), reverse=True)
+
+        agora = timezone.now()
+        existentes = {r.equipe_id: r for r in Ranking.objects.filter(estado_sistema=status_atual)}
+        para_atualizar = []
+        para_criar = []
+
+        for posicao, item in enumerate(equipes, 1):
+            equipe_id = item.pop('id')
+            item['pontos'] = int(item['pontos'])
+            ranking = existentes.get(equipe_id)
+            if ranking is None:
+                para_criar.append(Ranking(equipe_id=equipe_id, estado_sistema=status_atual, posicao=posicao, **item))
+                continue
+            ranking.posicao = posicao
+            ranking.data_atualizacao = agora
+            for campo, valor in item.items():
+                setattr(ranking, campo, valor)
+            para_atualizar.append(ranking)
+
+        if para_atualizar:
+            Ranking.objects.bulk_update(para_atualizar, CAMPOS_RANKING, batch_size=500)
+        if para_criar:
+            Ranking.objects.bulk_create(para_criar, batch_size=500)
+
+        # Recálculos em massa de pontos não disparam signals: alinhar as estatísticas
+        reconstruir_estatisticas()
+        publicar_ranking_apos_commit(status_atual)
+        marcar_dados_alterados()
+
+    logger.debug('Ranking atualizado para %s equipes', len(equipes))
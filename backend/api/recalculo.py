@@ -0,0 +1,94 @@
+"""Persistência da pontuação: carrega o snapshot, pontua e grava.
+
+A regra em si fica em `api/pontuacao.py`; aqui ficam apenas as leituras e
+gravações no banco (uma proposta, todas em lote ou via UPDATE no banco).
+"""
+import logging
+
+from django.db import transaction
+
+from .models import ConfiguracaoPontuacao, Proposta, StatusSistema
+from .pontuacao import CAMPOS_PONTUACAO, criar_snapshot, expressoes_pontuacao, pontuar
+from .ranking import atualizar_ranking
+
+
+logger = logging.getLogger(__name__)
+
+
+def obter_snapshot_pontuacao():
+    """Snapshot com a fase atual e a configuração de pontuação da banca"""
+    return criar_snapshot(ConfiguracaoPontuacao.get_configuracao(), StatusSistema.get_status_atual())
+
+
+def calcular_pontos_proposta(proposta, snapshot=None):
+    """Calcular e salvar os pontos de uma proposta baseado nas regras da banca"""
+    if snapshot is None:
+        snapshot = obter_snapshot_pontuacao()
+
+    pontuacao = pontuar(snapshot, proposta)
+
+    # Salvar pontos na proposta
+    proposta.pontos = pontuacao['pontos']
+    proposta.pontos_bonus = pontuacao['pontos_bonus']
+    proposta.save(update_fields=['pontos', 'pontos_bonus'])
+
+    logger.debug(
+        'Proposta %s finalizada com %s pontos (%s, bônus %s)',
+        proposta.id, proposta.pontos, snapshot.status_atual, proposta.pontos_bonus,
+    )
+
+    return proposta.pontos
+
+
+def recalcular_todos_pontos(tamanho_lote=2000):
+    """Recalcular pontos de todas as propostas após mudança nas regras da banca
+
+    Configuração e fase são lidas uma única vez; as propostas são percorridas
+    em blocos com `.iterator()` e apenas as que mudaram são gravadas com
+    `bulk_update`. Ao final o ranking da fase atual é reconstruído.
+    Retorna a quantidade de propostas alteradas.
+    """
+    snapshot = obter_snapshot_pontuacao()
+
+    alteradas = 0
+    pendentes = []
+
+    with transaction.atomic():
+        propostas = Proposta.objects.only(*CAMPOS_PONTUACAO).order_by('id')
+        for proposta in propostas.iterator(chunk_size=tamanho_lote):
+            pontuacao = pontuar(snapshot, proposta)
+            if pontuacao['pontos'] == proposta.pontos and pontuacao['pontos_bonus'] == proposta.pontos_bonus:
+                continue
+            proposta.pontos = pontuacao['pontos']
+            proposta.pontos_bonus = pontuacao['pontos_bonus']
+            pendentes.append(proposta)
+
+            if len(pendentes) >= tamanho_lote:
+                Proposta.objects.bulk_update(pendentes, ['pontos', 'pontos_bonus'])
+                alteradas += len(pendentes)
+                pendentes = []
+
+        if pendentes:
+            Proposta.objects.bulk_update(pendentes, ['pontos', 'pontos_bonus'])
+            alteradas += len(pendentes)
+
+    atualizar_ranking()
+    return alteradas
+
+
+def recalcular_pontos_no_banco(snapshot=None):
+    """Recalcular pontos de todas as propostas com um único UPDATE ... CASE
+
+    Mesmo resultado de `recalcular_todos_pontos`, mas executado inteiramente
+    no banco. Retorna a quantidade de linhas atualizadas.
+    """
+    if snapshot is None:
+        snapshot = obter_snapshot_pontuacao()
+
+    pontos, pontos_bonus = expressoes_pontuacao(snapshot)
+
+    with transaction.atomic():
+        atualizadas = Proposta.objects.update(pontos=pontos, pontos_bonus=pontos_bonus)
+
+    atualizar_ranking()
+    return atualizadas
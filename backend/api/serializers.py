@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from .models import Vendedor, Cliente, Workshop, PrevisaoWorkshop, ResultadoPosWorkshop, Equipe, StatusSistema, PerfilAcesso, Proposta, RegraPontuacao, Ranking, ConfiguracaoPontuacao, Venda
+from .pontuacao import bonus_selecionados, pontos_produtos_validada
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -119,37 +120,25 @@ class PropostaSerializer(serializers.ModelSerializer):
         model = Proposta
         fields = '__all__'
 
+    def _snapshot_pontuacao(self):
+        # Configuração da banca carregada uma única vez por serialização (inclusive many=True)
+        raiz = self.root
+        snapshot = getattr(raiz, '_snapshot_pontuacao_cache', None)
+        if snapshot is None:
+            from .recalculo import obter_snapshot_pontuacao
+            snapshot = obter_snapshot_pontuacao()
+            raiz._snapshot_pontuacao_cache = snapshot
+        return snapshot
+
     def get_pontos_produtos(self, obj):
         """Calcular pontos totais por quantidade de produtos em propostas validadas"""
         if obj.status != 'validada' or not obj.quantidade_produtos:
             return 0
-
-        # Usar configuração da banca
-        from .models import ConfiguracaoPontuacao
-        config = ConfiguracaoPontuacao.get_configuracao()
-
-        # Pontos por produtos: quantidade × pontos por produto
-        pontos_produtos = config.pontos_por_produto * obj.quantidade_produtos
-
-        # Pontos totais da proposta: pontos fixos + pontos por produtos
-        pontos_totais = config.pontos_proposta_validada + pontos_produtos
-
-        return pontos_totais
+        return pontos_produtos_validada(self._snapshot_pontuacao(), obj)
 
     def get_bonus_selecionados(self, obj):
         """Retorna lista de bônus selecionados para exibição"""
-        bonus = []
-        if obj.bonus_vinhos_casa_perini_mundo:
-            bonus.append({'label': 'Linha Vinhos Casa Perini Mundo (min 5 Caixas)', 'pontos': 5})
-        if obj.bonus_vinhos_fracao_unica:
-            bonus.append({'label': 'Linha Vinhos Fração Única (min 5 Caixas)', 'pontos': 5})
-        if obj.bonus_espumantes_vintage:
-            bonus.append({'label': 'Linha Espumantes Vintage (min 5 Caixas)', 'pontos': 5})
-        if obj.bonus_espumantes_premium:
-            bonus.append({'label': 'Linha Espumantes Premium (min 2 Caixas)', 'pontos': 5})
-        if obj.bonus_aceleracao:
-            bonus.append({'label': 'Bônus de Aceleração (Venda fechada durante o game)', 'pontos': 25})
-        return bonus
+        return bonus_selecionados(obj)
 
 
 
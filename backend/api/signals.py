@@ -0,0 +1,45 @@
+"""Invalidação dos caches de `api/versoes.py` e manutenção de `EstatisticaEquipe`"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ConfiguracaoPontuacao, Equipe, PerfilAcesso, PrevisaoWorkshop, Proposta, Ranking, StatusSistema, Venda
+from .estatisticas import atualizar_estatisticas_equipe
+from .versoes import invalidar, marcar_dados_alterados
+
+
+@receiver([post_save, post_delete], sender=ConfiguracaoPontuacao)
+def invalidar_configuracao_pontuacao(sender, **kwargs):
+    invalidar('configuracao_pontuacao')
+
+
+@receiver([post_save, post_delete], sender=StatusSistema)
+def invalidar_status_sistema(sender, **kwargs):
+    invalidar('status_sistema')
+
+
+# Gravações em massa (update/bulk_update) não disparam signals: ranking.py marca explicitamente.
+# Várias marcações na mesma transação resultam em um único avanço (ver marcar_dados_alterados)
+@receiver([post_save, post_delete], sender=Proposta)
+@receiver([post_save, post_delete], sender=Venda)
+@receiver([post_save, post_delete], sender=Ranking)
+@receiver([post_save, post_delete], sender=StatusSistema)
+@receiver([post_save, post_delete], sender=Equipe)
+@receiver([post_save, post_delete], sender=PrevisaoWorkshop)
+@receiver([post_save, post_delete], sender=PerfilAcesso)
+@receiver([post_save, post_delete], sender=ConfiguracaoPontuacao)
+def avancar_versao_dados(sender, **kwargs):
+    marcar_dados_alterados()
+
+
+@receiver(post_save, sender=Proposta)
+def atualizar_estatisticas_proposta_salva(sender, instance, raw=False, **kwargs):
+    if not raw:
+        atualizar_estatisticas_equipe(instance.equipe_id)
+
+
+@receiver(post_delete, sender=Proposta)
+def atualizar_estatisticas_proposta_removida(sender, instance, origin=None, **kwargs):
+    # Exclusão em cascata da própria equipe: a linha de estatísticas sai junto
+    if isinstance(origin, Equipe):
+        return
+    atualizar_estatisticas_equipe(instance.equipe_id, criar=False)
@@ -0,0 +1,295 @@
+"""Canais em tempo real: ranking da banca (SSE) e fila do gestor (WebSocket).
+
+Quem altera os dados publica, após o commit, no cache compartilhado
+(`settings.CACHES`), que funciona como camada de canal entre os workers do
+gunicorn e o serviço ASGI:
+
+- Ranking: `api/ranking.py` grava uma foto compacta do ranking da fase. Cada
+  conexão do stream apenas lê essa foto e envia só as linhas que mudaram,
+  então N telas conectadas custam uma consulta por alteração, não N.
+- Fila do gestor: as views de proposta/venda gravam eventos numerados com a
+  linha alterada (mesmo formato de `listar_propostas_gestor`), lidos pelo
+  WebSocket `/ws/gestor/` montado em `backend/asgi.py`.
+
+As numerações (versão da foto, sequência dos eventos) vêm de contadores no
+banco (`versoes.incrementar`), e não do `incr` do cache, que no cache em
+arquivo não é atômico entre processos.
+
+Os dois canais só funcionam servidos pelo `backend/asgi.py` (serviço
+`realtime` do docker-compose). Como `EventSource` e `WebSocket` do navegador
+não enviam cabeçalhos, a autenticação usa o token de acesso JWT em `?token=`.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import Ranking, StatusSistema
+from .permissoes import permissoes
+from .versoes import incrementar
+
+
+CHAVE_RANKING = 'tempo_real:ranking'
+CHAVE_SEQUENCIA = 'tempo_real:sequencia'
+CHAVE_SEQUENCIA_GESTOR = 'tempo_real:gestor:sequencia'
+
+# Intervalo de leitura do cache, heartbeat e duração máxima de cada conexão (segundos).
+# Ao fim da duração o navegador reconecta sozinho (campo `retry`).
+INTERVALO = 1
+HEARTBEAT = 15
+DURACAO_MAXIMA = 300
+
+# Tempo (segundos) que cada evento da fila do gestor fica disponível para leitura
+RETENCAO_EVENTOS = 3600
+# Acima disso o cliente recarrega a fila em vez de receber evento a evento
+MAX_EVENTOS_PENDENTES = 200
+
+
+def proxima_sequencia(chave=CHAVE_SEQUENCIA, publicar=None, quantidade=1):
+    """Contador crescente compartilhado entre processos; `publicar(seq)` grava no cache em ordem"""
+    return incrementar(chave, publicar, quantidade)
+
+
+def ranking_compacto(status_atual):
+    """Linhas do ranking da fase com apenas os campos exibidos no telão"""
+    linhas = Ranking.objects.filter(estado_sistema=status_atual).order_by('posicao').values_list(
+        'equipe_id', 'equipe__nome', 'posicao', 'pontos', 'propostas_enviadas',
+        'propostas_validadas', 'vendas_concretizadas', 'valor_total_vendas',
+    )
+    return [
+        {
+            'equipe_id': equipe_id,
+            'equipe': nome,
+            'posicao': posicao,
+            'pontos': pontos,
+            'propostas_enviadas': enviadas,
+            'propostas_validadas': validadas,
+            'vendas_concretizadas': vendas,
+            'valor_total_vendas': float(valor),
+        }
+        for equipe_id, nome, posicao, pontos, enviadas, validadas, vendas, valor in linhas
+    ]
+
+
+def publicar_ranking(status_atual):
+    """Gravar a foto atual do ranking no cache (uma consulta por alteração)
+
+    A foto é lida e gravada com a sequência travada: uma publicação
+    concorrente não consegue sobrescrevê-la com uma foto mais antiga.
+    """
+    def gravar(versao):
+        cache.set(CHAVE_RANKING, {
+            'versao': versao,
+            'estado_atual': status_atual,
+            'ranking': ranking_compacto(status_atual),
+        }, timeout=None)
+
+    proxima_sequencia(publicar=gravar)
+
+
+def publicar_ranking_apos_commit(status_atual):
+    transaction.on_commit(lambda: publicar_ranking(status_atual))
+
+
+def diff_ranking(anterior, atual):
+    """Linhas novas/alteradas e equipes removidas entre duas fotos do ranking"""
+    anteriores = {linha['equipe_id']: linha for linha in anterior}
+    atuais = {linha['equipe_id'] for linha in atual}
+    return {
+        'alterados': [linha for linha in atual if anteriores.get(linha['equipe_id']) != linha],
+        'removidos': [equipe_id for equipe_id in anteriores if equipe_id not in atuais],
+    }
+
+
+def _evento(nome, dados, id_evento=None):
+    linhas = []
+    if id_evento is not None:
+        linhas.append(f'id: {id_evento}')
+    linhas.append(f'event: {nome}')
+    linhas.append(f'data: {json.dumps(dados, ensure_ascii=False)}')
+    return '\n'.join(linhas) + '\n\n'
+
+
+def nivel_do_token(token):
+    """Nível de acesso da claim do token JWT, ou None se o token for inválido"""
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    try:
+        acesso = AccessToken(token)
+    except TokenError:
+        return None
+    if not acesso.get('ativo', True):
+        return None
+    return acesso.get('nivel')
+
+
+async def _eventos_ranking():
+    yield f'retry: {int(INTERVALO * 1000)}\n\n'
+
+    enviado = None
+    ocioso = 0
+    decorrido = 0
+    while decorrido < DURACAO_MAXIMA:
+        foto = await cache.aget(CHAVE_RANKING)
+        if foto is not None and (enviado is None or foto['versao'] != enviado['versao']):
+            if enviado is None or foto['estado_atual'] != enviado['estado_atual']:
+                yield _evento('snapshot', foto, foto['versao'])
+            else:
+                diff = diff_ranking(enviado['ranking'], foto['ranking'])
+                if diff['alterados'] or diff['removidos']:
+                    yield _evento('diff', {'versao': foto['versao'], 'estado_atual': foto['estado_atual'], **diff}, foto['versao'])
+            enviado = foto
+            ocioso = 0
+        elif ocioso >= HEARTBEAT:
+            yield ': heartbeat\n\n'
+            ocioso = 0
+
+        await asyncio.sleep(INTERVALO)
+        ocioso += INTERVALO
+        decorrido += INTERVALO
+
+
+async def ranking_banca_stream(request):
+    """Stream SSE do ranking da banca: `snapshot` na conexão, depois `diff` a cada alteração"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Stream disponível apenas no serviço ASGI (backend/asgi.py)'}, status=503)
+
+    nivel = nivel_do_token(request.GET.get('token', ''))
+    if nivel is None:
+        return JsonResponse({'error': 'Token de acesso inválido ou expirado'}, status=401)
+
+    status_atual = await sync_to_async(StatusSistema.get_status_atual)()
+    if not permissoes(nivel, status_atual)['pode_ver_ranking_tempo_real']:
+        return JsonResponse({'error': 'Permissão negada para a ação: pode_ver_ranking_tempo_real'}, status=403)
+
+    foto = await cache.aget(CHAVE_RANKING)
+    if foto is None or foto['estado_atual'] != status_atual:
+        await sync_to_async(publicar_ranking)(status_atual)
+
+    response = StreamingHttpResponse(_eventos_ranking(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _chave_evento(seq):
+    return f'tempo_real:gestor:evento:{seq}'
+
+
+def gravar_evento_gestor(tipo, proposta):
+    gravar_eventos_gestor([(tipo, proposta)])
+
+
+def gravar_eventos_gestor(eventos):
+    """Gravar [(tipo, proposta)] com números consecutivos (uma reserva na sequência)"""
+    # Eventos gravados antes de a sequência ficar visível no cache para o WebSocket
+    def gravar(ultimo):
+        primeiro = ultimo - len(eventos) + 1
+        cache.set_many({
+            _chave_evento(seq): {'seq': seq, 'tipo': tipo, 'proposta': proposta}
+            for seq, (tipo, proposta) in enumerate(eventos, primeiro)
+        }, timeout=RETENCAO_EVENTOS)
+        cache.set(CHAVE_SEQUENCIA_GESTOR, ultimo, timeout=None)
+
+    if eventos:
+        proxima_sequencia(CHAVE_SEQUENCIA_GESTOR, gravar, len(eventos))
+
+
+def _dados_evento(proposta=None, proposta_id=None):
+    from .serializers import PropostaSerializer
+
+    dados = PropostaSerializer(proposta).data if proposta is not None else {'id': proposta_id}
+    return json.loads(json.dumps(dados, default=str))
+
+
+def publicar_evento_gestor(tipo, proposta=None, proposta_id=None):
+    """Publicar na fila do gestor, após o commit, um evento com apenas a linha alterada
+
+    Tipos: proposta_enviada, proposta_validada, proposta_rejeitada,
+    proposta_removida (só o id), venda_marcada, venda_validada, venda_rejeitada.
+    """
+    dados = _dados_evento(proposta, proposta_id)
+    transaction.on_commit(lambda: gravar_evento_gestor(tipo, dados))
+
+
+def publicar_eventos_gestor(eventos):
+    """Como `publicar_evento_gestor` para [(tipo, proposta)], com uma única reserva de números"""
+    dados = [(tipo, _dados_evento(proposta)) for tipo, proposta in eventos]
+    transaction.on_commit(lambda: gravar_eventos_gestor(dados))
+
+
+def _status_atual():
+    # Fora do ciclo de request do Django: fechar conexões como o handler faria
+    close_old_connections()
+    try:
+        return StatusSistema.get_status_atual()
+    finally:
+        close_old_connections()
+
+
+async def _novos_eventos(ultimo, faltando):
+    """Eventos publicados depois de `ultimo`, em ordem
+
+    Um número ainda sem evento gravado é aguardado por uma leitura; se
+    continuar faltando (expirou) ou se houver eventos demais pendentes (ou a
+    sequência não existia na conexão), o cliente recebe `resync` para
+    recarregar a fila completa.
+    """
+    atual = await cache.aget(CHAVE_SEQUENCIA_GESTOR) or 0
+    if atual <= ultimo:
+        return [], ultimo, None
+    if atual - ultimo > MAX_EVENTOS_PENDENTES:
+        return [{'seq': atual, 'tipo': 'resync'}], atual, None
+
+    chaves = [_chave_evento(seq) for seq in range(ultimo + 1, atual + 1)]
+    gravados = await cache.aget_many(chaves)
+    eventos = []
+    for seq, chave in zip(range(ultimo + 1, atual + 1), chaves):
+        evento = gravados.get(chave)
+        if evento is None:
+            if faltando == seq:
+                return eventos + [{'seq': atual, 'tipo': 'resync'}], atual, None
+            return eventos, seq - 1, seq
+        eventos.append(evento)
+    return eventos, atual, None
+
+
+async def fila_gestor_websocket(scope, receive, send):
+    """Aplicação ASGI do WebSocket da fila de validação (`/ws/gestor/?token=<JWT>`)
+
+    Mensagens enviadas ao cliente: `{"seq", "tipo", "proposta"}`. Mensagens
+    recebidas do cliente são ignoradas.
+    """
+    mensagem = await receive()
+    if mensagem['type'] != 'websocket.connect':
+        return
+
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [''])[0]
+    nivel = nivel_do_token(token)
+    status_atual = await sync_to_async(_status_atual)()
+    if nivel is None or not permissoes(nivel, status_atual)['pode_ver_todas_propostas']:
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    await send({'type': 'websocket.accept'})
+    ultimo = await cache.aget(CHAVE_SEQUENCIA_GESTOR) or 0
+    faltando = None
+    while True:
+        try:
+            mensagem = await asyncio.wait_for(receive(), timeout=INTERVALO)
+        except asyncio.TimeoutError:
+            mensagem = None
+        if mensagem is not None:
+            if mensagem['type'] == 'websocket.disconnect':
+                return
+            continue
+
+        eventos, ultimo, faltando = await _novos_eventos(ultimo, faltando)
+        for evento in eventos:
+            await send({'type': 'websocket.send', 'text': json.dumps(evento, ensure_ascii=False)})
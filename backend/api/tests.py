@@ -1,3 +1,1153 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+from datetime import date
+from decimal import Decimal
+from itertools import product
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from backend.asgi import application
+
+from . import tempo_real
+from .autenticacao import JWTPerfilAuthentication, gerar_tokens
+from .estatisticas import CAMPOS_ESTATISTICAS, _agregados_estatisticas, reconstruir_estatisticas
+from .listagem import CamposInvalidos, ListagemPropostas, filtrar_apos, propostas_listagem, vendas_listagem
+from .middleware import carregar_perfil
+from .models import (
+    Cliente, ConfiguracaoPontuacao, ContadorPropostaEquipe, Equipe, EstatisticaEquipe, PerfilAcesso, PrevisaoWorkshop, Proposta,
+    Ranking, ResultadoPosWorkshop, Sequencia, StatusSistema, Vendedor, Workshop,
+)
+from .permissoes import ACOES, tem_permissao
+from .pontuacao import criar_snapshot, pontuar_lote
+from .ranking import atualizar_ranking, atualizar_ranking_equipe
+from .recalculo import calcular_pontos_proposta, obter_snapshot_pontuacao, recalcular_pontos_no_banco, recalcular_todos_pontos
+from .serializers import PropostaSerializer
+from .versoes import CHAVE_VERSAO_DADOS, _AvancoVersaoDados, _avancar_versao_dados, _memo, escopo_requisicao, versao_dados
+from .views import _total_por_vendedor
+
+
+class RankingEquipeTests(TestCase):
+    """Alteração em uma proposta recalcula só a linha da equipe dona e reordena as posições"""
+
+    def setUp(self):
+        self.vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+        self.cliente = Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=self.vendedor)
+        self.workshop = Workshop.objects.create(nome='Workshop', data=date.today())
+        self.status_atual = StatusSistema.get_status_atual()
+        self.equipes = [self.criar_equipe(i) for i in range(4)]
+        # Vendas desempatam pontos iguais: a última equipe começa na frente
+        self.criar_proposta(self.equipes[3], status='vendida', venda_validada=True, valor_venda=500, pontos=0)
+        atualizar_ranking()
+
+    def criar_equipe(self, i):
+        equipe = Equipe.objects.create(nome=f'Equipe {i}', codigo=f'EQ{i}')
+        self.criar_proposta(equipe, status='validada', pontos=10)
+        return equipe
+
+    def criar_proposta(self, equipe, **campos):
+        return Proposta.objects.create(
+            equipe=equipe, cliente=self.cliente, vendedor=self.vendedor, workshop=self.workshop, valor_proposta=100, **campos,
+        )
+
+    def ranking(self):
+        return {
+            r.equipe_id: r for r in Ranking.objects.filter(estado_sistema=self.status_atual)
+        }
+
+    def validar(self, equipe, pontos):
+        """Proposta validada pelo gestor; retorna as queries de `atualizar_ranking_equipe`"""
+        proposta = self.criar_proposta(equipe)
+        proposta.status = 'validada'
+        proposta.pontos = pontos
+        proposta.save()
+        with CaptureQueriesContext(connection) as queries:
+            atualizar_ranking_equipe(equipe.pk)
+        return queries
+
+    def test_so_a_equipe_da_proposta_muda(self):
+        e0, e1, e2, e3 = self.equipes
+        antes = self.ranking()
+        self.assertEqual([antes[e.pk].posicao for e in (e3, e0, e1, e2)], [1, 2, 3, 4])
+
+        self.validar(e1, 5)
+
+        depois = self.ranking()
+        self.assertEqual((depois[e1.pk].pontos, depois[e1.pk].propostas_validadas), (15, 2))
+        for equipe in (e0, e2, e3):
+            self.assertEqual(
+                [getattr(depois[equipe.pk], campo) for campo in ['pontos', 'propostas_enviadas', 'valor_total_vendas', 'data_atualizacao']],
+                [getattr(antes[equipe.pk], campo) for campo in ['pontos', 'propostas_enviadas', 'valor_total_vendas', 'data_atualizacao']],
+            )
+        # Pontos, depois valor de vendas, depois a equipe de menor id
+        self.assertEqual([depois[e.pk].posicao for e in (e1, e3, e0, e2)], [1, 2, 3, 4])
+
+    def test_queries_nao_crescem_com_as_equipes(self):
+        poucas = len(self.validar(self.equipes[1], 5))
+        self.equipes += [self.criar_equipe(i) for i in range(4, 12)]
+        atualizar_ranking()
+
+        self.assertEqual(len(self.validar(self.equipes[1], 5)), poucas)
+        self.assertEqual(self.ranking()[self.equipes[1].pk].posicao, 1)
+
+
+class AtualizarRankingTests(TestCase):
+    """Reconstrução completa igual ao cálculo por equipe, com queries constantes"""
+
+    CAMPOS = ['posicao', 'pontos', 'propostas_enviadas', 'propostas_validadas', 'vendas_concretizadas', 'valor_total_vendas']
+
+    def setUp(self):
+        self.vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+        self.cliente = Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=self.vendedor)
+        self.workshop = Workshop.objects.create(nome='Workshop', data=date.today())
+        self.status_atual = StatusSistema.get_status_atual()
+        self.criar_equipes(0, 6)
+
+    def criar_equipes(self, inicio, fim):
+        propostas = [
+            dict(status='enviada', pontos=0),
+            dict(status='validada', pontos=10),
+            dict(status='rejeitada', pontos=4),
+            dict(status='vendida', venda_validada=True, valor_venda=300, pontos=10),
+            dict(status='vendida', venda_validada=False, valor_venda=900, pontos=6),
+        ]
+        for i in range(inicio, fim):
+            equipe = Equipe.objects.create(nome=f'Equipe {i}', codigo=f'EQ{i}')
+            # Equipes empatam de duas em duas; a última de cada grupo de seis fica sem propostas
+            quantidade = 0 if i % 6 == 5 else (i % 6) // 2 * 2 + 1
+            for campos in propostas[:quantidade]:
+                Proposta.objects.create(
+                    equipe=equipe, cliente=self.cliente, vendedor=self.vendedor, workshop=self.workshop,
+                    valor_proposta=100, **campos,
+                )
+            # Metade das equipes já tem linha de ranking (desatualizada)
+            if i % 2:
+                Ranking.objects.create(equipe=equipe, estado_sistema=self.status_atual, posicao=99, pontos=99)
+
+    def ranking(self):
+        return {
+            r['equipe_id']: r
+            for r in Ranking.objects.filter(estado_sistema=self.status_atual).values('equipe_id', *self.CAMPOS)
+        }
+
+    def test_igual_ao_calculo_por_equipe(self):
+        atualizar_ranking()
+        completo = self.ranking()
+
+        Ranking.objects.all().delete()
+        for equipe_id in Equipe.objects.values_list('id', flat=True):
+            atualizar_ranking_equipe(equipe_id)
+
+        self.assertEqual(len(completo), Equipe.objects.count())
+        self.assertEqual(completo, self.ranking())
+
+    def test_queries_nao_crescem_com_as_equipes(self):
+        with CaptureQueriesContext(connection) as poucas:
+            atualizar_ranking()
+        self.criar_equipes(6, 18)
+        with CaptureQueriesContext(connection) as muitas:
+            atualizar_ranking()
+
+        self.assertEqual(len(muitas), len(poucas))
+        self.assertEqual(len(self.ranking()), 18)
+
+
+class RecalcularTodosPontosTests(TestCase):
+    """Mudança na configuração da banca repontua todas as propostas, com queries por bloco"""
+
+    def setUp(self):
+        StatusSistema.objects.create(status_atual='workshop')
+        self.config = ConfiguracaoPontuacao.objects.create(id=1, pontos_proposta_validada=7, pontos_por_produto=3)
+        cache.clear()
+        _memo.clear()
+        equipe = Equipe.objects.create(nome='Equipe A', codigo='EQA')
+        vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+        self.dados = dict(
+            equipe=equipe, vendedor=vendedor, workshop=Workshop.objects.create(nome='Workshop', data=date.today()),
+            cliente=Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=vendedor), valor_proposta=100,
+        )
+        self.criar_propostas(25)
+
+    def criar_propostas(self, quantidade):
+        for i in range(quantidade):
+            proposta = Proposta.objects.create(
+                status='validada', quantidade_produtos=i % 4 + 1,
+                bonus_vinhos_casa_perini_mundo=i % 2 == 0, bonus_espumantes_premium=i % 3 == 0, **self.dados,
+            )
+            calcular_pontos_proposta(proposta)
+
+    def alterar_configuracao(self, pontos_proposta_validada, pontos_por_produto):
+        self.config.pontos_proposta_validada = pontos_proposta_validada
+        self.config.pontos_por_produto = pontos_por_produto
+        self.config.save()
+        snapshot = obter_snapshot_pontuacao()
+        return {
+            id_: (pontuacao['pontos'], pontuacao['pontos_bonus'])
+            for id_, pontuacao in pontuar_lote(snapshot, Proposta.objects.all()).items()
+        }
+
+    def recalcular(self):
+        # Só a repontuação: o ranking reconstruído tem teste próprio
+        with mock.patch('api.recalculo.atualizar_ranking'), CaptureQueriesContext(connection) as queries:
+            recalcular_todos_pontos(tamanho_lote=10)
+        return len(queries)
+
+    def pontos(self):
+        return {id_: (pontos, bonus) for id_, pontos, bonus in Proposta.objects.values_list('id', 'pontos', 'pontos_bonus')}
+
+    def test_repontua_todas_as_propostas(self):
+        antes = self.pontos()
+        esperado = self.alterar_configuracao(20, 5)
+
+        self.recalcular()
+
+        self.assertEqual(self.pontos(), esperado)
+        self.assertTrue(all(esperado[id_][0] != pontos for id_, (pontos, _) in antes.items()))
+
+    def test_queries_por_bloco_e_nao_por_proposta(self):
+        self.alterar_configuracao(20, 5)
+        tres_blocos = self.recalcular()
+
+        self.criar_propostas(20)
+        esperado = self.alterar_configuracao(9, 1)
+        cinco_blocos = self.recalcular()
+
+        # 20 propostas a mais custam só os dois bulk_update dos blocos novos
+        self.assertEqual(cinco_blocos - tres_blocos, 2)
+        self.assertEqual(self.pontos(), esperado)
+
+
+class RecalculoPontosNoBancoTests(TestCase):
+    """O UPDATE com CASE deve produzir os mesmos pontos da regra em Python"""
+
+    def setUp(self):
+        self.config = ConfiguracaoPontuacao.objects.create(id=1, pontos_proposta_validada=7, pontos_por_produto=3)
+        equipe = Equipe.objects.create(nome='Equipe A', codigo='EQA')
+        vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+        cliente = Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=vendedor)
+        workshop = Workshop.objects.create(nome='Workshop', data=date.today())
+
+        status_proposta = [s for s, _ in Proposta.STATUS_CHOICES]
+        for i, (status, venda_validada, bonus) in enumerate(product(status_proposta, [False, True], range(5))):
+            Proposta.objects.create(
+                equipe=equipe, cliente=cliente, vendedor=vendedor, workshop=workshop,
+                valor_proposta=100, status=status, venda_validada=venda_validada,
+                quantidade_produtos=i % 4, quantidade_produtos_venda=i % 3,
+                bonus_vinhos_casa_perini_mundo=bonus > 0,
+                bonus_vinhos_fracao_unica=bonus > 1,
+                bonus_espumantes_vintage=bonus > 2,
+                bonus_espumantes_premium=bonus > 3,
+                bonus_aceleracao=bonus % 2 == 1,
+                pontos=11 * (i % 5), pontos_bonus=i % 6,
+            )
+
+    def test_equivalente_a_pontuar_em_todas_as_fases(self):
+        for status_atual, _ in StatusSistema.STATUS_CHOICES:
+            with self.subTest(status_atual=status_atual):
+                snapshot = criar_snapshot(self.config, status_atual)
+                esperado = {
+                    id_: (pontuacao['pontos'], pontuacao['pontos_bonus'])
+                    for id_, pontuacao in pontuar_lote(snapshot, Proposta.objects.all()).items()
+                }
+
+                recalcular_pontos_no_banco(snapshot=snapshot)
+
+                obtido = {
+                    id_: (pontos, pontos_bonus)
+                    for id_, pontos, pontos_bonus in Proposta.objects.values_list('id', 'pontos', 'pontos_bonus')
+                }
+                self.assertEqual(obtido, esperado)
+
+
+class ConfiguracaoPontuacaoCacheTests(TestCase):
+    """A configuração da banca é lida do banco uma vez e recarregada após o save"""
+
+    def setUp(self):
+        ConfiguracaoPontuacao.objects.create(id=1, pontos_proposta_validada=1, pontos_por_produto=1)
+        cache.clear()
+        _memo.clear()
+
+    def test_leituras_repetidas_nao_consultam_o_banco(self):
+        ConfiguracaoPontuacao.get_configuracao()
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                config = ConfiguracaoPontuacao.get_configuracao()
+        self.assertEqual(config.pontos_por_produto, 1)
+
+    def test_save_invalida_o_cache(self):
+        config = ConfiguracaoPontuacao.get_configuracao()
+        config.pontos_por_produto = 9
+        self.assertEqual(ConfiguracaoPontuacao.get_configuracao().pontos_por_produto, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            config.save()
+        self.assertEqual(ConfiguracaoPontuacao.get_configuracao().pontos_por_produto, 9)
+
+
+class StatusSistemaCacheTests(TestCase):
+    """A fase é lida no máximo uma vez e recarregada após a troca de status"""
+
+    def setUp(self):
+        self.status = StatusSistema.objects.create(status_atual='workshop')
+        cache.clear()
+        _memo.clear()
+
+    def test_troca_de_fase_invalida_o_cache(self):
+        with escopo_requisicao():
+            with self.assertNumQueries(1):
+                for _ in range(5):
+                    self.assertEqual(StatusSistema.get_status_atual(), 'workshop')
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.status.status_atual = 'pos_workshop'
+                self.status.save()
+            self.assertEqual(StatusSistema.get_status_atual(), 'pos_workshop')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(StatusSistema.get_status_atual(), 'pos_workshop')
+
+
+class MatrizPermissoesTests(TestCase):
+    """A matriz pré-calculada responde igual às regras por chamada de `PerfilAcesso.pode_*`"""
+
+    # Regras como eram calculadas a cada chamada, antes da matriz (nível, fase)
+    REGRAS_ORIGINAIS = {
+        'pode_criar_equipes': lambda nivel, status: nivel in ['administrador', 'admin'],
+        'pode_criar_usuarios': lambda nivel, status: nivel in ['administrador', 'admin'],
+        'pode_alterar_status_sistema': lambda nivel, status: nivel in ['administrador', 'admin'],
+        'pode_ver_todas_equipes': lambda nivel, status: nivel in ['administrador', 'admin', 'gestor'],
+        'pode_ver_todas_propostas': lambda nivel, status: nivel in ['administrador', 'admin', 'gestor'],
+        'pode_ver_dashboard_geral': lambda nivel, status: nivel in ['administrador', 'admin', 'banca'],
+        'pode_gerenciar_regras_pontuacao': lambda nivel, status: nivel in ['administrador', 'admin', 'banca'],
+        'pode_ver_ranking_tempo_real': lambda nivel, status: nivel in ['administrador', 'admin', 'banca'],
+        'pode_ver_ranking': lambda nivel, status: nivel in ['administrador', 'admin', 'gestor', 'banca'],
+        'pode_validar_propostas': lambda nivel, status: status == 'workshop' and nivel in ['administrador', 'admin', 'gestor'],
+        'pode_ver_dados_equipe': lambda nivel, status: nivel in ['administrador', 'admin', 'gestor', 'equipe'],
+        'pode_registrar_previsao': lambda nivel, status: (
+            status != 'encerrado' and not (status == 'pre_workshop' and nivel == 'equipe')
+            and nivel in ['administrador', 'gestor', 'equipe']
+        ),
+        'pode_registrar_resultado': lambda nivel, status: (
+            status != 'encerrado' and not (status == 'pre_workshop' and nivel == 'equipe')
+            and nivel in ['administrador', 'gestor', 'equipe']
+        ),
+        'pode_enviar_propostas': lambda nivel, status: status == 'workshop' and nivel == 'equipe',
+        'pode_marcar_vendas': lambda nivel, status: status == 'pos_workshop' and nivel == 'equipe',
+        'pode_validar_vendas': lambda nivel, status: (
+            status in ['pre_workshop', 'pos_workshop'] and nivel in ['administrador', 'admin', 'gestor']
+        ),
+        'pode_acessar_sistema_encerrado': lambda nivel, status: (
+            status != 'encerrado' or nivel in ['administrador', 'admin', 'gestor', 'banca']
+        ),
+    }
+
+    def test_todas_as_acoes_cobertas(self):
+        self.assertEqual(set(self.REGRAS_ORIGINAIS), set(ACOES))
+
+    def test_mesmo_resultado_em_toda_combinacao(self):
+        # 'admin' é aceito pelas regras sem estar nas opções; 'visitante' cai no cálculo fora da matriz
+        niveis = [nivel for nivel, _ in PerfilAcesso.NIVEL_CHOICES] + ['admin', 'visitante']
+        fases = [status for status, _ in StatusSistema.STATUS_CHOICES]
+
+        for acao, nivel, status in product(sorted(ACOES), niveis, fases):
+            with self.subTest(acao=acao, nivel=nivel, status=status):
+                esperado = self.REGRAS_ORIGINAIS[acao](nivel, status)
+                self.assertIs(tem_permissao(nivel, acao, status), esperado)
+                with mock.patch.object(StatusSistema, 'get_status_atual', return_value=status):
+                    self.assertIs(getattr(PerfilAcesso(nivel=nivel), acao)(), esperado)
+
+
+class CarregarPerfilTests(TestCase):
+    """Perfil e equipe carregados uma única vez por requisição"""
+
+    def test_perfil_e_equipe_em_uma_query(self):
+        equipe = Equipe.objects.create(nome='Equipe A', codigo='EQA')
+        user = User.objects.create_user('eqa', password='senha')
+        PerfilAcesso.objects.create(usuario=user, nivel='equipe', equipe=equipe)
+
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=user.pk)
+
+        with self.assertNumQueries(1):
+            perfil = carregar_perfil(request)
+            self.assertEqual(perfil.equipe.codigo, 'EQA')
+            self.assertIs(carregar_perfil(request), perfil)
+            self.assertIs(request.user.perfil_acesso, perfil)
+
+    def test_usuario_sem_perfil(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_user('sem_perfil', password='senha')
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(carregar_perfil(request))
+            self.assertIsNone(carregar_perfil(request))
+            with self.assertRaises(PerfilAcesso.DoesNotExist):
+                request.user.perfil_acesso
+
+
+class JWTPerfilAuthenticationTests(TestCase):
+    """Token de acesso autentica sem consultar o banco"""
+
+    def setUp(self):
+        self.equipe = Equipe.objects.create(nome='Equipe A', codigo='EQA')
+        self.user = User.objects.create_user('eqa', password='senha')
+        self.perfil = PerfilAcesso.objects.create(usuario=self.user, nivel='equipe', equipe=self.equipe)
+
+    def test_autentica_sem_queries(self):
+        tokens = gerar_tokens(self.user, self.perfil)
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+        with self.assertNumQueries(0):
+            user, _ = JWTPerfilAuthentication().authenticate(request)
+            request.user = user
+            perfil = carregar_perfil(request)
+
+        self.assertEqual((user.pk, user.username), (self.user.pk, 'eqa'))
+        self.assertEqual((perfil.nivel, perfil.equipe_id, perfil.ativo), ('equipe', self.equipe.pk, True))
+
+    def test_login_e_renovacao(self):
+        resposta = self.client.post('/api/auth/login/', {'username': 'eqa', 'password': 'senha'}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('access', resposta.data)
+
+        self.perfil.ativo = False
+        self.perfil.save()
+        resposta = self.client.post('/api/auth/token/refresh/', {'refresh': resposta.data['refresh']}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 403)
+
+    def test_usuario_inativo(self):
+        tokens = gerar_tokens(self.user, self.perfil)
+        self.user.is_active = False
+        self.user.save()
+
+        resposta = self.client.post('/api/auth/token/refresh/', {'refresh': tokens['refresh']}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 403)
+
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {gerar_tokens(self.user, self.perfil)['access']}")
+        with self.assertRaises(AuthenticationFailed):
+            JWTPerfilAuthentication().authenticate(request)
+
+    def test_selecionar_equipe_devolve_tokens_com_a_nova_equipe(self):
+        outra = Equipe.objects.create(nome='Equipe B', codigo='EQB')
+        tokens = gerar_tokens(self.user, self.perfil)
+
+        resposta = self.client.post(
+            '/api/auth/selecionar_equipe/', {'equipe_id': outra.pk},
+            content_type='application/json', HTTP_AUTHORIZATION=f"Bearer {tokens['access']}",
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(AccessToken(resposta.data['access'])['equipe_id'], outra.pk)
+        self.assertEqual(RefreshToken(resposta.data['refresh'])['equipe_id'], outra.pk)
+
+    def test_token_sem_equipe_usa_a_equipe_gravada(self):
+        # Token emitido antes da equipe ser associada ao perfil
+        self.perfil.equipe = None
+        tokens = gerar_tokens(self.user, self.perfil)
+        outra = Equipe.objects.create(nome='Equipe B', codigo='EQB')
+        PerfilAcesso.objects.filter(pk=self.perfil.pk).update(equipe=outra)
+        vendedor = Vendedor.objects.create(nome='V', codigo='V')
+        Proposta.objects.create(
+            equipe=outra, cliente=Cliente.objects.create(nome='C', codigo='C', vendedor=vendedor), vendedor=vendedor,
+            workshop=Workshop.objects.create(nome='W', data=date.today()), valor_proposta=Decimal('100'),
+        )
+
+        resposta = self.client.get('/api/equipe/propostas/', HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([p['equipe'] for p in resposta.data], [outra.pk])
+        self.assertEqual(PerfilAcesso.objects.get(pk=self.perfil.pk).equipe_id, outra.pk)
+
+
+class RankingStreamTests(TestCase):
+    """Stream SSE envia a foto do ranking e depois só as linhas alteradas"""
+
+    def setUp(self):
+        cache.clear()
+        self.equipe = Equipe.objects.create(nome='Equipe A', codigo='EQA')
+        user = User.objects.create_user('banca', password='senha')
+        self.token = gerar_tokens(user, PerfilAcesso.objects.create(usuario=user, nivel='banca'))['access']
+
+    async def test_snapshot_e_diff(self):
+        intervalo, tempo_real.INTERVALO = tempo_real.INTERVALO, 0.01
+        self.addCleanup(setattr, tempo_real, 'INTERVALO', intervalo)
+
+        resposta = await self.async_client.get('/api/banca/ranking/stream/', {'token': self.token})
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+        eventos = resposta.streaming_content.__aiter__()
+        await eventos.__anext__()  # retry
+        self.assertIn(b'event: snapshot', await eventos.__anext__())
+
+        await sync_to_async(atualizar_ranking_equipe)(self.equipe.id, 'pre_workshop')
+        await sync_to_async(tempo_real.publicar_ranking)('pre_workshop')
+        evento = await eventos.__anext__()
+        self.assertIn(b'event: diff', evento)
+        self.assertIn(b'"equipe": "Equipe A"', evento)
+
+    async def test_token_invalido(self):
+        resposta = await self.async_client.get('/api/banca/ranking/stream/', {'token': 'x'})
+        self.assertEqual(resposta.status_code, 401)
+
+
+class FilaGestorWebSocketTests(TestCase):
+    """WebSocket do gestor recebe apenas os eventos publicados após a conexão"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('gestor', password='senha')
+        self.token = gerar_tokens(user, PerfilAcesso.objects.create(usuario=user, nivel='gestor'))['access']
+
+    async def _conectar(self, token):
+        entrada, saida = asyncio.Queue(), asyncio.Queue()
+        await entrada.put({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': '/ws/gestor/', 'query_string': f'token={token}'.encode()}
+        tarefa = asyncio.ensure_future(application(scope, entrada.get, saida.put))
+        self.addCleanup(tarefa.cancel)
+        return entrada, saida
+
+    async def test_recebe_evento_publicado(self):
+        intervalo, tempo_real.INTERVALO = tempo_real.INTERVALO, 0.01
+        self.addCleanup(setattr, tempo_real, 'INTERVALO', intervalo)
+
+        await sync_to_async(tempo_real.gravar_evento_gestor)('proposta_enviada', {'id': 1})
+        entrada, saida = await self._conectar(self.token)
+        self.assertEqual((await saida.get())['type'], 'websocket.accept')
+
+        await sync_to_async(tempo_real.gravar_evento_gestor)('proposta_validada', {'id': 2, 'status': 'validada'})
+        mensagem = await asyncio.wait_for(saida.get(), timeout=5)
+        self.assertEqual(json.loads(mensagem['text'])['tipo'], 'proposta_validada')
+        self.assertEqual(json.loads(mensagem['text'])['proposta'], {'id': 2, 'status': 'validada'})
+
+        await entrada.put({'type': 'websocket.disconnect'})
+
+    async def test_token_invalido_fecha_conexao(self):
+        _, saida = await self._conectar('x')
+        self.assertEqual(await asyncio.wait_for(saida.get(), timeout=5), {'type': 'websocket.close', 'code': 4403})
+
+
+class SequenciaTests(TestCase):
+    """Numeração dos eventos vem do contador no banco, não do `incr` do cache"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_eventos_com_sequencias_unicas_e_crescentes(self):
+        tempo_real.gravar_evento_gestor('proposta_enviada', {'id': 1})
+        primeira = cache.get(tempo_real.CHAVE_SEQUENCIA_GESTOR)
+        # Perder a chave do cache não reinicia nem repete a numeração
+        cache.delete(tempo_real.CHAVE_SEQUENCIA_GESTOR)
+        tempo_real.gravar_evento_gestor('proposta_validada', {'id': 1})
+        segunda = cache.get(tempo_real.CHAVE_SEQUENCIA_GESTOR)
+
+        self.assertEqual(segunda, primeira + 1)
+        self.assertEqual(Sequencia.objects.get(nome=tempo_real.CHAVE_SEQUENCIA_GESTOR).valor, segunda)
+        self.assertEqual(cache.get(tempo_real._chave_evento(primeira))['tipo'], 'proposta_enviada')
+        self.assertEqual(cache.get(tempo_real._chave_evento(segunda))['tipo'], 'proposta_validada')
+
+
+class RespostaCondicionalTests(TestCase):
+    """Dashboards respondem 304 enquanto a versão dos dados não muda"""
+
+    def setUp(self):
+        cache.clear()
+        # Fixture confirmada: o avanço de versão pendente não fica aberto durante o teste
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equipe = Equipe.objects.create(nome='Equipe A', codigo='EQA')
+            user = User.objects.create_user('eqa', password='senha')
+            perfil = PerfilAcesso.objects.create(usuario=user, nivel='equipe', equipe=self.equipe)
+        self.autorizacao = f"Bearer {gerar_tokens(user, perfil)['access']}"
+
+    def test_etag_e_304(self):
+        resposta = self.client.get('/api/equipe/dashboard/', HTTP_AUTHORIZATION=self.autorizacao)
+        self.assertEqual(resposta.status_code, 200)
+        etag = resposta['ETag']
+
+        with self.assertNumQueries(0):
+            resposta = self.client.get('/api/equipe/dashboard/', HTTP_AUTHORIZATION=self.autorizacao, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equipe.nome = 'Equipe B'
+            self.equipe.save()
+        resposta = self.client.get('/api/equipe/dashboard/', HTTP_AUTHORIZATION=self.autorizacao, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+
+    def test_versao_nunca_se_repete(self):
+        vistas = []
+        for _ in range(3):
+            _avancar_versao_dados()
+            vistas.append(versao_dados()[0])
+            cache.clear()  # cache limpo não reinicia nem repete a versão
+        vistas.append(versao_dados()[0])
+        self.assertEqual(vistas, sorted(set(vistas)))
+        self.assertEqual(Sequencia.objects.get(nome=CHAVE_VERSAO_DADOS).valor, vistas[-1])
+
+    def test_um_avanco_por_transacao(self):
+        vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+        dados = dict(
+            equipe=self.equipe, vendedor=vendedor, valor_proposta=100, workshop=Workshop.objects.create(nome='W', data=date.today()),
+            cliente=Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=vendedor),
+        )
+        inicial = Sequencia.objects.get(nome=CHAVE_VERSAO_DADOS).valor
+
+        # Proposta, ranking da equipe e estatísticas disparam vários signals na mesma transação
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                proposta = Proposta.objects.create(**dados)
+                proposta.status = 'validada'
+                proposta.save()
+                atualizar_ranking_equipe(self.equipe.pk)
+        self.assertEqual(sum(isinstance(c, _AvancoVersaoDados) for c in callbacks), 1)
+        self.assertEqual(Sequencia.objects.get(nome=CHAVE_VERSAO_DADOS).valor, inicial + 1)
+
+        # Savepoint desfeito leva o avanço junto; a marcação seguinte agenda de novo
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        Proposta.objects.create(**dados)
+                        raise IntegrityError
+                except IntegrityError:
+                    pass
+                self.equipe.save()
+        self.assertEqual(sum(isinstance(c, _AvancoVersaoDados) for c in callbacks), 1)
+        self.assertEqual(Sequencia.objects.get(nome=CHAVE_VERSAO_DADOS).valor, inicial + 2)
+
+
+class EstatisticaEquipeTests(TestCase):
+    """A tabela materializada acompanha cada gravação de proposta"""
+
+    def setUp(self):
+        self.equipes = [Equipe.objects.create(nome=f'Equipe {i}', codigo=f'EQ{i}') for i in range(2)]
+        vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+        cliente = Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=vendedor)
+        workshop = Workshop.objects.create(nome='Workshop', data=date.today())
+        status_proposta = [s for s, _ in Proposta.STATUS_CHOICES]
+        for i, (status, venda_validada) in enumerate(product(status_proposta, [False, True])):
+            Proposta.objects.create(
+                equipe=self.equipes[i % 2], cliente=cliente, vendedor=vendedor, workshop=workshop,
+                valor_proposta=100 + i, valor_venda=50 + i, status=status, venda_validada=venda_validada,
+                quantidade_produtos=i, quantidade_produtos_venda=i + 1, pontos=10 * i,
+            )
+
+    def assertEstatisticasCorretas(self):
+        esperado = {
+            item.pop('id'): item
+            for item in Equipe.objects.annotate(**_agregados_estatisticas('propostas__')).values('id', *CAMPOS_ESTATISTICAS)
+        }
+        obtido = {
+            item.pop('equipe_id'): item
+            for item in EstatisticaEquipe.objects.values('equipe_id', *CAMPOS_ESTATISTICAS)
+        }
+        self.assertEqual(obtido, esperado)
+
+    def test_gravacao_e_estatisticas_na_mesma_transacao(self):
+        proposta = Proposta.objects.filter(equipe=self.equipes[0]).first()
+        valor = proposta.valor_proposta
+        proposta.valor_proposta = valor + 1
+        with mock.patch('api.signals.atualizar_estatisticas_equipe', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                proposta.save()
+        # A falha no signal desfaz a própria gravação: a linha nunca fica defasada
+        proposta.refresh_from_db()
+        self.assertEqual(proposta.valor_proposta, valor)
+        self.assertEstatisticasCorretas()
+
+    def test_mantida_a_cada_alteracao(self):
+        self.assertEstatisticasCorretas()
+
+        proposta = Proposta.objects.filter(status='validada').first()
+        proposta.status = 'vendida'
+        proposta.save()
+        Proposta.objects.filter(status='enviada').first().delete()
+        self.assertEstatisticasCorretas()
+
+        EstatisticaEquipe.objects.update(pontos=0)
+        self.assertEqual(reconstruir_estatisticas(), 2)
+        self.assertEstatisticasCorretas()
+
+    def test_exclusao_da_equipe(self):
+        self.equipes[0].delete()
+        self.assertEstatisticasCorretas()
+
+    def test_dashboard_banca_em_duas_queries(self):
+        user = User.objects.create_user('banca', password='senha')
+        perfil = PerfilAcesso.objects.create(usuario=user, nivel='banca')
+        autorizacao = f"Bearer {gerar_tokens(user, perfil)['access']}"
+        Equipe.objects.create(nome='Sem propostas', codigo='EQV')
+
+        for status_atual in ['workshop', 'pos_workshop']:
+            with self.subTest(status_atual=status_atual):
+                StatusSistema.objects.all().delete()
+                StatusSistema.objects.create(status_atual=status_atual)
+                StatusSistema.get_status_atual()
+
+                respostas = []
+                for url in ['/api/banca/dashboard/', '/api/banca/dashboard/?ao_vivo=1']:
+                    with self.assertNumQueries(2):
+                        resposta = self.client.get(url, HTTP_AUTHORIZATION=autorizacao)
+                    self.assertEqual(resposta.status_code, 200)
+                    respostas.append(resposta.json())
+
+                self.assertEqual(respostas[0], respostas[1])
+                self.assertEqual(len(respostas[0]['equipes']), 3)
+                self.assertEqual(respostas[0]['propostas_rejeitadas'], 2)
+
+
+class DashboardGestorTests(TestCase):
+    """Totais do gestor saem de uma única consulta agrupada por equipe"""
+
+    def setUp(self):
+        # Fixture confirmada: a versão dos dados já está no cache quando o dashboard é lido
+        with self.captureOnCommitCallbacks(execute=True):
+            vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+            cliente = Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=vendedor)
+            workshop = Workshop.objects.create(nome='Workshop', data=date.today())
+            status_proposta = ['enviada', 'enviada', 'validada', 'rejeitada', 'vendida']
+            for i in range(3):
+                equipe = Equipe.objects.create(nome=f'Equipe {i}', codigo=f'EQ{i}')
+                for status in status_proposta[i:]:
+                    Proposta.objects.create(
+                        equipe=equipe, cliente=cliente, vendedor=vendedor, workshop=workshop,
+                        valor_proposta=100, status=status,
+                    )
+            user = User.objects.create_user('gestor', password='senha')
+            perfil = PerfilAcesso.objects.create(usuario=user, nivel='gestor')
+        self.autorizacao = f"Bearer {gerar_tokens(user, perfil)['access']}"
+        StatusSistema.get_status_atual()
+
+    def test_uma_query_agrupada(self):
+        with self.assertNumQueries(1):
+            resposta = self.client.get('/api/gestor/dashboard/', HTTP_AUTHORIZATION=self.autorizacao)
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados['total_equipes'], 3)
+        self.assertEqual(dados['total_propostas'], 12)
+        self.assertEqual(dados['propostas_pendentes'], 3)
+        self.assertEqual(dados['propostas_validadas'], 3)
+        self.assertEqual(dados['propostas_rejeitadas'], 3)
+        self.assertEqual(
+            {linha['equipe']: linha['propostas_pendentes'] for linha in dados['equipes']},
+            {'Equipe 0': 2, 'Equipe 1': 1, 'Equipe 2': 0},
+        )
+
+
+class TotalPorVendedorTests(TestCase):
+    """Previsto/realizado por vendedor em uma query, sem multiplicar as somas"""
+
+    def setUp(self):
+        self.workshops = [Workshop.objects.create(nome=f'Workshop {i}', data=date.today()) for i in range(2)]
+        self.vendedores = [Vendedor.objects.create(nome=f'Vendedor {i}', codigo=f'VEN{i}') for i in range(3)]
+        cliente = Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=self.vendedores[0])
+        for i, vendedor in enumerate(self.vendedores[:2]):
+            for workshop in self.workshops:
+                for _ in range(i + 1):
+                    PrevisaoWorkshop.objects.create(
+                        workshop=workshop, cliente=cliente, vendedor=vendedor, valor_total_previsto=10,
+                        numero_propostas=2, linhas_produto='', faturamento_total_previsto=100,
+                    )
+                ResultadoPosWorkshop.objects.create(
+                    workshop=workshop, cliente=cliente, vendedor=vendedor, valor_fechado=10,
+                    numero_propostas_fechadas=1, linhas_produto_vendidas='', faturamento_total_realizado=40,
+                )
+
+    def totais(self, workshop_id=None):
+        with self.assertNumQueries(1):
+            return {
+                linha['nome']: (linha['previsto'], linha['previstas'], linha['realizado'], linha['fechadas'])
+                for linha in Vendedor.objects.annotate(
+                    previsto=_total_por_vendedor(PrevisaoWorkshop, 'faturamento_total_previsto', workshop_id, decimal=True),
+                    previstas=_total_por_vendedor(PrevisaoWorkshop, 'numero_propostas', workshop_id),
+                    realizado=_total_por_vendedor(ResultadoPosWorkshop, 'faturamento_total_realizado', workshop_id, decimal=True),
+                    fechadas=_total_por_vendedor(ResultadoPosWorkshop, 'numero_propostas_fechadas', workshop_id),
+                ).values('nome', 'previsto', 'previstas', 'realizado', 'fechadas')
+            }
+
+    def test_somas_por_vendedor_e_workshop(self):
+        self.assertEqual(self.totais(), {
+            'Vendedor 0': (200, 4, 80, 2),
+            'Vendedor 1': (400, 8, 80, 2),
+            'Vendedor 2': (0, 0, 0, 0),
+        })
+        self.assertEqual(self.totais(self.workshops[0].pk)['Vendedor 1'], (200, 4, 40, 1))
+
+
+class ListagemPropostasTests(TestCase):
+    """Listas de propostas custam o mesmo número de queries com 1 ou N linhas"""
+
+    def setUp(self):
+        ConfiguracaoPontuacao.objects.create(id=1, pontos_proposta_validada=7, pontos_por_produto=3)
+        self.equipe = Equipe.objects.create(nome='Equipe A', codigo='EQA')
+        self.gestor = User.objects.create_user('gestor', password='senha')
+        perfil = PerfilAcesso.objects.create(usuario=self.gestor, nivel='gestor')
+        self.autorizacao = f"Bearer {gerar_tokens(self.gestor, perfil)['access']}"
+        StatusSistema.objects.create(status_atual='workshop')
+
+    def criar_propostas(self, quantidade):
+        for i in range(quantidade):
+            vendedor = Vendedor.objects.create(nome=f'Vendedor {i}', codigo=f'VEN{Vendedor.objects.count()}')
+            cliente = Cliente.objects.create(nome=f'Cliente {i}', codigo=f'CLI{Cliente.objects.count()}', vendedor=vendedor)
+            workshop = Workshop.objects.create(nome=f'Workshop {i}', data=date.today())
+            for status in ['enviada', 'validada', 'vendida']:
+                Proposta.objects.create(
+                    equipe=self.equipe, cliente=cliente, vendedor=vendedor, workshop=workshop,
+                    valor_proposta=100, status=status, quantidade_produtos=2, validado_por=self.gestor, venda_validada_por=self.gestor,
+                )
+
+    def contar_queries(self, url):
+        cache.clear()
+        _memo.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url, HTTP_AUTHORIZATION=self.autorizacao)
+        self.assertEqual(resposta.status_code, 200)
+        return len(consultas)
+
+    def test_queries_constantes(self):
+        for url in ['/api/propostas/', '/api/gestor/propostas/']:
+            with self.subTest(url=url):
+                Proposta.objects.all().delete()
+                self.criar_propostas(1)
+                poucas = self.contar_queries(url)
+                self.criar_propostas(5)
+                self.assertEqual(self.contar_queries(url), poucas)
+
+    def test_paginacao_por_cursor(self):
+        self.criar_propostas(3)
+        # Empates em data_envio são desempatados pelo id
+        Proposta.objects.filter(status='vendida').update(data_envio=Proposta.objects.first().data_envio)
+        esperado = list(Proposta.objects.order_by('-data_envio', '-id').values_list('id', flat=True))
+
+        resposta = self.client.get('/api/propostas/', HTTP_AUTHORIZATION=self.autorizacao)
+        self.assertEqual(len(resposta.json()), len(esperado))
+
+        obtido = []
+        url = '/api/propostas/?limite=4&fields=id'
+        while url:
+            dados = self.client.get(url, HTTP_AUTHORIZATION=self.autorizacao).json()
+            self.assertLessEqual(len(dados['results']), 4)
+            self.assertTrue(all(list(linha) == ['id'] for linha in dados['results']))
+            obtido += [linha['id'] for linha in dados['results']]
+            url = dados['next']
+        self.assertEqual(obtido, esperado)
+
+        resposta = self.client.get('/api/propostas/?cursor=invalido', HTTP_AUTHORIZATION=self.autorizacao)
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_pagina_por_cursor_busca_no_indice(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Formato do EXPLAIN específico do SQLite')
+        paginas = {
+            'api_proposta': filtrar_apos(propostas_listagem(), 'data_envio', timezone.now(), 10).order_by('-data_envio', '-pk')[:51],
+            'api_venda': filtrar_apos(vendas_listagem(), 'data_criacao', timezone.now(), 10).order_by('-data_criacao', '-pk')[:51],
+        }
+        for tabela, pagina in paginas.items():
+            with self.subTest(tabela=tabela):
+                plano = pagina.explain()
+                # Busca delimitada pelo cursor, não a varredura do índice desde a primeira linha
+                self.assertRegex(plano, rf'SEARCH {tabela} USING INDEX \w+ \(data_\w+<\?\)')
+                self.assertNotIn(f'SCAN {tabela}', plano)
+
+
+class ListagemPropostasRapidaTests(TestCase):
+    """O caminho por .values() produz exatamente a saída do PropostaSerializer"""
+
+    def setUp(self):
+        ConfiguracaoPontuacao.objects.create(id=1, pontos_proposta_validada=7, pontos_por_produto=3)
+        equipe = Equipe.objects.create(nome='Equipe A', codigo='EQA')
+        vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+        cliente = Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=vendedor)
+        workshop = Workshop.objects.create(nome='Workshop', data=date.today())
+        gestor = User.objects.create_user('gestor', password='senha')
+        status_proposta = [s for s, _ in Proposta.STATUS_CHOICES]
+        for i, (status, bonus) in enumerate(product(status_proposta, range(6))):
+            Proposta.objects.create(
+                equipe=equipe, cliente=cliente, vendedor=vendedor, workshop=workshop,
+                valor_proposta='1234.5', valor_venda='99.90' if i % 2 else None, status=status,
+                quantidade_produtos=i % 4, descricao='' if i % 3 else None,
+                arquivo_pdf=f'propostas/{i}.pdf' if i % 2 else '',
+                validado_por=gestor if i % 2 else None, data_validacao=timezone.now() if i % 3 else None,
+                bonus_vinhos_casa_perini_mundo=bonus > 0, bonus_espumantes_premium=bonus > 3,
+                bonus_aceleracao=bonus % 2 == 1,
+            )
+        cache.clear()
+        _memo.clear()
+
+    def test_saida_identica_ao_serializer(self):
+        propostas = propostas_listagem()
+        esperado = json.loads(json.dumps(PropostaSerializer(propostas, many=True).data))
+        listagem = ListagemPropostas()
+        obtido = json.loads(json.dumps(listagem(listagem.consulta(propostas))))
+        self.assertEqual(obtido, esperado)
+        self.assertEqual([list(linha) for linha in obtido], [list(linha) for linha in esperado])
+
+    def test_fields_e_exclude(self):
+        propostas = propostas_listagem()
+        listagem = ListagemPropostas(campos=['id', 'status', 'equipe_nome', 'bonus_selecionados'])
+        consulta = listagem.consulta(propostas)
+        sql = str(consulta.query)
+        self.assertNotIn('descricao', sql)
+        self.assertNotIn('observacoes_venda', sql)
+        linhas = listagem(consulta)
+        self.assertEqual(list(linhas[0]), ['id', 'equipe_nome', 'bonus_selecionados', 'status'])
+
+        completo = ListagemPropostas()(ListagemPropostas().consulta(propostas))
+        sem_textos = ListagemPropostas(excluir=['descricao', 'observacoes_venda', 'motivo_rejeicao'])
+        self.assertEqual(
+            sem_textos(sem_textos.consulta(propostas)),
+            [
+                {nome: valor for nome, valor in linha.items() if nome not in ('descricao', 'observacoes_venda', 'motivo_rejeicao')}
+                for linha in completo
+            ],
+        )
+
+        with self.assertRaises(CamposInvalidos):
+            ListagemPropostas(campos=['nao_existe'])
+
+
+class IndicesConsultasTests(TestCase):
+    """Cada consulta frequente das views é resolvida por busca em índice, já na ordem da lista (EXPLAIN)"""
+
+    def consultas(self):
+        listagem = ListagemPropostas()
+
+        def pagina(propostas):
+            # Ordem e LIMIT de `listagem.paginar`
+            return listagem.consulta(propostas).order_by('-data_envio', '-id')[:51]
+
+        return {
+            'propostas da equipe': pagina(propostas_listagem(equipe_id=1)),
+            'fila de validação do gestor': pagina(propostas_listagem(status='enviada')),
+            'vendas por validar': pagina(propostas_listagem(status='vendida', venda_validada=False)),
+            'vendas da equipe': pagina(propostas_listagem(equipe_id=1, status__in=['validada', 'nao_vendida'])),
+            'propostas validadas': pagina(propostas_listagem(status='validada')),
+            'todas as propostas (página pelo cursor)': pagina(filtrar_apos(propostas_listagem(), 'data_envio', timezone.now(), 10)),
+            'estatísticas da equipe': Proposta.objects.filter(equipe_id=1).values('equipe').annotate(**_agregados_estatisticas()),
+            'vendas pendentes': vendas_listagem(status_validacao='pendente').order_by('-data_criacao', '-id')[:51],
+            'ranking da fase': Ranking.objects.filter(estado_sistema='workshop').order_by('posicao'),
+        }
+
+    def test_consultas_usam_indice(self):
+        if connection.vendor == 'postgresql':
+            # Tabelas de teste são minúsculas: sem isso o planner prefere Seq Scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off; SET enable_sort = off')
+
+        for nome, consulta in self.consultas().items():
+            with self.subTest(consulta=nome):
+                plano = consulta.explain()
+                if connection.vendor == 'postgresql':
+                    self.assertNotIn('Seq Scan', plano)
+                    self.assertNotRegex(plano, r'(?m)^\s*(->\s*)?Sort\b')
+                else:
+                    # SCAN = varredura (da tabela ou do índice inteiro); TEMP B-TREE = ordenação fora do índice
+                    self.assertTrue(any('SEARCH api_' in linha for linha in plano.splitlines()), plano)
+                    self.assertNotIn('SCAN ', plano)
+                    self.assertNotIn('TEMP B-TREE', plano)
+
+    def test_filas_pendentes_usam_indice_parcial(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Índices parciais das filas só existem no PostgreSQL (migração 0006)')
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off; SET enable_sort = off')
+
+        consultas = self.consultas()
+        self.assertIn('proposta_fila_venda_idx', consultas['vendas por validar'].explain())
+        self.assertIn('venda_fila_validacao_idx', consultas['vendas pendentes'].explain())
+
+
+class ContadorPropostaEquipeTests(TestCase):
+    """Numeração por equipe vem do contador, sem repetir e sem lacunas"""
+
+    def setUp(self):
+        self.equipes = [Equipe.objects.create(nome=f'Equipe {i}', codigo=f'EQ{i}') for i in range(2)]
+        vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+        cliente = Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=vendedor)
+        workshop = Workshop.objects.create(nome='Workshop', data=date.today())
+        self.dados = dict(cliente=cliente, vendedor=vendedor, workshop=workshop, valor_proposta=100)
+
+    def criar(self, equipe):
+        return Proposta.objects.create(equipe=equipe, **self.dados).numero_proposta_equipe
+
+    def test_numeracao_sequencial_por_equipe(self):
+        numeros = [self.criar(self.equipes[i % 2]) for i in range(6)]
+        self.assertEqual(numeros, [1, 1, 2, 2, 3, 3])
+        self.assertEqual(ContadorPropostaEquipe.reservar_numeros(self.equipes[0].id, 5), 4)
+        self.assertEqual(self.criar(self.equipes[0]), 9)
+
+    def test_insert_com_erro_devolve_o_numero(self):
+        self.criar(self.equipes[0])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Proposta.objects.create(equipe=self.equipes[0], **{**self.dados, 'valor_proposta': None})
+        self.assertEqual(self.criar(self.equipes[0]), 2)
+
+    def test_contador_parte_do_maior_numero_existente(self):
+        # Propostas gravadas sem passar pelo contador (ex.: bulk_create com número explícito)
+        Proposta.objects.bulk_create([Proposta(equipe=self.equipes[1], numero_proposta_equipe=n, **self.dados) for n in (1, 7)])
+        self.assertEqual(self.criar(self.equipes[1]), 8)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Proposta.objects.create(equipe=self.equipes[1], numero_proposta_equipe=8, **self.dados)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PropostasEquipeLoteTests(TestCase):
+    """Envio em lote: tudo ou nada, com consultas constantes por lote"""
+
+    def setUp(self):
+        cache.clear()
+        StatusSistema.objects.create(status_atual='workshop')
+        ConfiguracaoPontuacao.objects.create(pontos_proposta_validada=10, pontos_por_produto=1)
+        self.equipe = Equipe.objects.create(nome='Equipe A', codigo='EQA')
+        vendedor = Vendedor.objects.create(nome='Ana', codigo='VEN_ANA')
+        Cliente.objects.create(nome='Mercado', codigo='CLI_MERCADO', vendedor=vendedor)
+        user = User.objects.create_user('eqa', password='senha')
+        perfil = PerfilAcesso.objects.create(usuario=user, nivel='equipe', equipe=self.equipe)
+        self.autorizacao = f"Bearer {gerar_tokens(user, perfil)['access']}"
+
+    def enviar(self, propostas, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                '/api/equipe/propostas/lote/', {'propostas': propostas},
+                content_type='application/json', HTTP_AUTHORIZATION=self.autorizacao, **kwargs,
+            )
+
+    def itens(self, quantidade, inicio=0):
+        return [
+            {'cliente': f'Cliente {i}' if i % 2 else 'Mercado', 'vendedor': 'Ana' if i % 3 else f'Vendedor {i}',
+             'valor_proposta': '1.500,50', 'quantidade_produtos': i, 'bonus_aceleracao': 'true'}
+            for i in range(inicio, inicio + quantidade)
+        ]
+
+    def test_lote_grava_tudo_com_consultas_constantes(self):
+        self.assertEqual(self.enviar(self.itens(2)).status_code, 201)  # aquece perfil, fase e configuração
+        with CaptureQueriesContext(connection) as poucas:
+            resposta = self.enviar(self.itens(2, inicio=2))
+        self.assertEqual(resposta.status_code, 201)
+        with CaptureQueriesContext(connection) as muitas:
+            resposta = self.enviar(self.itens(18, inicio=4))
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(len(muitas), len(poucas))
+
+        self.assertEqual(resposta.json()['total'], 18)
+        self.assertEqual(
+            list(Proposta.objects.order_by('id').values_list('numero_proposta_equipe', flat=True)),
+            list(range(1, 23)),
+        )
+        self.assertEqual(Vendedor.objects.filter(nome='Ana').count(), 1)
+        self.assertEqual(Cliente.objects.filter(nome='Mercado').count(), 1)
+        self.assertEqual(Proposta.objects.filter(valor_proposta=Decimal('1500.50'), bonus_aceleracao=True).count(), 22)
+        self.assertEqual(Ranking.objects.get(equipe=self.equipe, estado_sistema='workshop').propostas_enviadas, 22)
+        self.assertEqual(EstatisticaEquipe.objects.get(equipe=self.equipe).propostas_enviadas, 22)
+
+    def test_item_invalido_nao_grava_nada(self):
+        itens = self.itens(3)
+        itens[1]['valor_proposta'] = 'abc'
+        itens[2]['cliente'] = ''
+        resposta = self.enviar(itens)
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(set(resposta.json()['details']), {'1', '2'})
+        self.assertFalse(Proposta.objects.exists())
+        self.assertFalse(Vendedor.objects.filter(nome='Vendedor 0').exists())
+
+    def test_multipart_com_pdf(self):
+        resposta = self.client.post(
+            '/api/equipe/propostas/lote/',
+            {
+                'propostas': json.dumps(self.itens(2)),
+                'arquivo_pdf_1': SimpleUploadedFile('proposta.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            },
+            HTTP_AUTHORIZATION=self.autorizacao,
+        )
+        self.assertEqual(resposta.status_code, 201)
+        sem_pdf, com_pdf = Proposta.objects.order_by('numero_proposta_equipe')
+        self.assertFalse(sem_pdf.arquivo_pdf)
+        self.assertTrue(com_pdf.arquivo_pdf.name.startswith('propostas/proposta'))
+
+
+class ValidarPropostasLoteTests(TestCase):
+    """Validação em lote pelo gestor: transições guardadas e ranking só das equipes afetadas"""
+
+    def setUp(self):
+        cache.clear()
+        StatusSistema.objects.create(status_atual='workshop')
+        ConfiguracaoPontuacao.objects.create(pontos_proposta_validada=10, pontos_por_produto=2)
+        vendedor = Vendedor.objects.create(nome='Vendedor', codigo='VEN')
+        cliente = Cliente.objects.create(nome='Cliente', codigo='CLI', vendedor=vendedor)
+        workshop = Workshop.objects.create(nome='Workshop', data=date.today())
+        self.equipes = [Equipe.objects.create(nome=f'Equipe {i}', codigo=f'EQ{i}') for i in range(3)]
+        self.propostas = [
+            Proposta.objects.create(
+                equipe=self.equipes[i % 2], cliente=cliente, vendedor=vendedor, workshop=workshop,
+                valor_proposta=100, quantidade_produtos=i, bonus_aceleracao=i == 0,
+            )
+            for i in range(8)
+        ]
+        self.processada = Proposta.objects.create(
+            equipe=self.equipes[2], cliente=cliente, vendedor=vendedor, workshop=workshop,
+            valor_proposta=100, status='validada', pontos=10,
+        )
+        user = User.objects.create_user('gestor', password='senha')
+        perfil = PerfilAcesso.objects.create(usuario=user, nivel='gestor')
+        self.autorizacao = f"Bearer {gerar_tokens(user, perfil)['access']}"
+
+    def enviar(self, itens):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                '/api/gestor/propostas/validar_lote/', {'propostas': itens},
+                content_type='application/json', HTTP_AUTHORIZATION=self.autorizacao,
+            )
+
+    def test_lote_valida_e_rejeita_com_consultas_constantes(self):
+        # Primeiro lote aquece perfil, fase e configuração e cria as linhas de ranking
+        resposta = self.enviar([
+            {'proposta_id': self.propostas[0].id, 'acao': 'validar'},
+            {'proposta_id': self.propostas[1].id, 'acao': 'rejeitar', 'motivo': 'Sem produtos'},
+        ])
+        self.assertEqual(resposta.status_code, 200)
+        with CaptureQueriesContext(connection) as poucas:
+            resposta = self.enviar([{'proposta_id': p.id, 'acao': 'validar'} for p in self.propostas[2:4]])
+        self.assertEqual(resposta.status_code, 200)
+        with CaptureQueriesContext(connection) as muitas:
+            resposta = self.enviar(
+                [{'proposta_id': p.id, 'acao': 'validar'} for p in self.propostas[4:7]]
+                + [{'proposta_id': self.propostas[7].id, 'acao': 'rejeitar', 'motivo': 'Duplicada'}]
+            )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(muitas), len(poucas))
+        self.assertEqual((resposta.json()['validadas'], resposta.json()['rejeitadas']), (3, 1))
+
+        for proposta in self.propostas:
+            proposta.refresh_from_db()
+        self.assertEqual([p.status for p in self.propostas], ['validada', 'rejeitada'] + ['validada'] * 5 + ['rejeitada'])
+        self.assertEqual(self.propostas[0].pontos, 10 + self.propostas[0].pontos_bonus)
+        self.assertEqual([p.pontos for p in self.propostas[2:7]], [10 + 2 * i for i in range(2, 7)])
+        self.assertEqual(self.propostas[7].motivo_rejeicao, 'Duplicada')
+
+        for equipe in self.equipes[:2]:
+            ranking = Ranking.objects.get(equipe=equipe, estado_sistema='workshop')
+            validadas = [p for p in self.propostas if p.equipe_id == equipe.id and p.status == 'validada']
+            self.assertEqual(ranking.propostas_validadas, len(validadas))
+            self.assertEqual(ranking.pontos, sum(p.pontos for p in validadas))
+            self.assertEqual(EstatisticaEquipe.objects.get(equipe=equipe).propostas_validadas, len(validadas))
+        self.assertFalse(Ranking.objects.filter(equipe=self.equipes[2]).exists())
+
+    def test_item_invalido_nao_altera_nada(self):
+        resposta = self.enviar([
+            {'proposta_id': self.propostas[0].id, 'acao': 'validar'},
+            {'proposta_id': self.processada.id, 'acao': 'rejeitar', 'motivo': 'Tarde demais'},
+            {'proposta_id': self.propostas[1].id, 'acao': 'rejeitar'},
+            {'proposta_id': 999999, 'acao': 'validar'},
+            {'proposta_id': self.propostas[0].id, 'acao': 'rejeitar', 'motivo': 'Repetida'},
+            {'proposta_id': self.propostas[2].id, 'acao': 'aprovar'},
+        ])
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(set(resposta.json()['details']), {'1', '2', '3', '4', '5'})
+        self.assertFalse(Proposta.objects.exclude(id=self.processada.id).exclude(status='enviada').exists())
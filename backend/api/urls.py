@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import tempo_real, views
 
 router = DefaultRouter()
 router.register(r'vendedores', views.VendedorViewSet)
@@ -19,6 +19,7 @@ urlpatterns = [
     # URLs de gestão
     path('auth/login/', views.login_view, name='login'),
     path('auth/login_equipe/', views.login_equipe, name='login_equipe'),
+    path('auth/token/refresh/', views.renovar_token, name='renovar_token'),
     path('auth/selecionar_equipe/', views.selecionar_equipe, name='selecionar_equipe'),
     path('auth/equipes_disponiveis/', views.listar_equipes_disponiveis, name='listar_equipes_disponiveis'),
     path('auth/meu_perfil/', views.meu_perfil, name='meu_perfil'),
@@ -40,6 +41,7 @@ urlpatterns = [
     # URLs específicas da banca
     path('banca/dashboard/', views.dashboard_banca, name='dashboard_banca'),
     path('banca/ranking/', views.ranking_banca, name='ranking_banca'),
+    path('banca/ranking/stream/', tempo_real.ranking_banca_stream, name='ranking_banca_stream'),
     path('banca/regra-proposta-validada/', views.regra_proposta_validada_api, name='regra_proposta_validada_api'),
     path('banca/regra-venda-produto/', views.regra_venda_produto_api, name='regra_venda_produto_api'),
     
@@ -49,6 +51,7 @@ urlpatterns = [
     path('gestor/propostas/', views.listar_propostas_gestor, name='listar_propostas_gestor'),
     path('gestor/propostas/<int:proposta_id>/', views.detalhar_proposta_gestor, name='detalhar_proposta_gestor'),
     path('gestor/propostas/<int:proposta_id>/validar/', views.validar_proposta_gestor, name='validar_proposta_gestor'),
+    path('gestor/propostas/validar_lote/', views.validar_propostas_gestor_lote, name='validar_propostas_gestor_lote'),
     path('gestor/vendas/<int:venda_id>/validar/', views.validar_venda_pre_workshop, name='validar_venda_gestor'),
     
     # URLs para equipes corrigirem propostas
@@ -58,6 +61,7 @@ urlpatterns = [
     # URLs específicas para equipes
     path('equipe/dashboard/', views.dashboard_equipe, name='dashboard_equipe'),
     path('equipe/propostas/', views.propostas_equipe, name='propostas_equipe'),
+    path('equipe/propostas/lote/', views.propostas_equipe_lote, name='propostas_equipe_lote'),
     path('equipe/vendas/', views.vendas_api, name='vendas_api'),
     path('equipe/vendas/<int:pk>/', views.venda_detail_api, name='venda_detail_api'),
     path('equipe/propostas-validadas/', views.propostas_validadas_api, name='propostas_validadas_api'),
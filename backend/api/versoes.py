@@ -0,0 +1,179 @@
+"""Cache de leituras frequentes com carimbo de versão compartilhado.
+
+Cada recurso cacheado (configuração da banca, fase do sistema) tem um carimbo de versão
+guardado no cache do Django (`settings.CACHES`), compartilhado entre os
+workers do gunicorn. Cada processo guarda o último valor carregado junto com
+o carimbo lido antes da carga; enquanto o carimbo não muda, a leitura não vai
+ao banco. Gravar o recurso troca o carimbo (ver `api/signals.py`) e todos os
+workers recarregam na próxima leitura.
+
+Além dos recursos, há uma versão global dos dados exibidos em rankings e
+dashboards (`versao_dados`), avançada após o commit de qualquer gravação em
+propostas, vendas, ranking, equipes ou fase. Ela gera os ETags das
+respostas condicionais (`middleware.resposta_condicional`). O contador fica
+no banco (`incrementar`): cada avanço recebe um número nunca usado antes e
+o cache só espelha o último, em ordem. Assim, enquanto a versão no cache
+não muda, nenhuma gravação foi confirmada depois da leitura que gerou o
+ETag; o inverso não vale (um avanço pode vir de uma gravação que não mudou
+o corpo de uma resposta específica).
+
+Dentro de `escopo_requisicao()` (aberto pelo `StatusSistemaMiddleware`) o
+valor fica guardado também para o resto da requisição, e as leituras
+seguintes não consultam nem o cache compartilhado.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+# nome do recurso -> (versão, valor) carregado neste processo
+_memo = {}
+
+# nome do recurso -> valor já usado na requisição atual
+_escopo = ContextVar('escopo_versoes', default=None)
+
+
+CHAVE_VERSAO_DADOS = 'versao_dados'
+CHAVE_DADOS_ALTERADOS_EM = 'versao_dados:alterado_em'
+
+
+def _chave(nome):
+    return f'versao:{nome}'
+
+
+def versao_atual(nome):
+    """Carimbo de versão atual do recurso (criado na primeira leitura)"""
+    chave = _chave(nome)
+    versao = cache.get(chave)
+    if versao is None:
+        versao = uuid.uuid4().hex
+        if not cache.add(chave, versao, timeout=None):
+            versao = cache.get(chave, versao)
+    return versao
+
+
+def _trocar_versao(nome):
+    cache.set(_chave(nome), uuid.uuid4().hex, timeout=None)
+    _memo.pop(nome, None)
+    escopo = _escopo.get()
+    if escopo is not None:
+        escopo.pop(nome, None)
+
+
+def invalidar(nome):
+    """Invalidar o recurso em todos os processos
+
+    O carimbo é trocado imediatamente (o próprio processo já enxerga a
+    alteração) e de novo após o commit, para descartar o valor antigo que
+    outro worker possa ter carregado enquanto a transação estava aberta.
+    """
+    _trocar_versao(nome)
+    transaction.on_commit(lambda: _trocar_versao(nome))
+
+
+@contextmanager
+def escopo_requisicao():
+    """Guardar os valores lidos até o fim do bloco (uma requisição)"""
+    token = _escopo.set({})
+    try:
+        yield
+    finally:
+        _escopo.reset(token)
+
+
+def obter(nome, carregar):
+    """Valor do recurso: escopo da requisição, memória do processo se a versão bater, senão `carregar()`"""
+    escopo = _escopo.get()
+    if escopo is not None and nome in escopo:
+        return escopo[nome]
+
+    versao = versao_atual(nome)
+    memo = _memo.get(nome)
+    if memo is not None and memo[0] == versao:
+        valor = memo[1]
+    else:
+        valor = carregar()
+        _memo[nome] = (versao, valor)
+
+    if escopo is not None:
+        escopo[nome] = valor
+    return valor
+
+
+def incrementar(nome, publicar=None, quantidade=1):
+    """Contador crescente compartilhado entre processos (linha de `Sequencia` no banco)
+
+    O UPDATE com F() é atômico e trava a linha até o fim da transação, então
+    cada chamada recebe um valor único. `publicar(valor)` roda com a linha
+    ainda travada: as gravações no cache feitas por processos diferentes
+    acontecem na ordem dos valores e o cache nunca volta para um valor menor.
+    Com `quantidade` > 1 reserva um bloco e retorna (e publica) o último valor.
+    Na criação o contador parte do instante atual em milissegundos, acima dos
+    valores que os clientes já conectados possam ter guardado.
+    """
+    from .models import Sequencia
+
+    with transaction.atomic():
+        if not Sequencia.objects.filter(nome=nome).update(valor=F('valor') + quantidade):
+            try:
+                with transaction.atomic():
+                    Sequencia.objects.create(nome=nome, valor=int(time.time() * 1000) + quantidade - 1)
+            except IntegrityError:
+                # Outro processo criou o contador ao mesmo tempo
+                Sequencia.objects.filter(nome=nome).update(valor=F('valor') + quantidade)
+        valor = Sequencia.objects.filter(nome=nome).values_list('valor', flat=True).get()
+        if publicar is not None:
+            publicar(valor)
+    return valor
+
+
+def _avancar_versao_dados():
+    def gravar(versao):
+        cache.set_many({CHAVE_VERSAO_DADOS: versao, CHAVE_DADOS_ALTERADOS_EM: time.time()}, timeout=None)
+
+    incrementar(CHAVE_VERSAO_DADOS, gravar)
+
+
+class _AvancoVersaoDados:
+    """Avanço da versão agendado para o commit da transação atual"""
+
+    def __init__(self):
+        self.executado = False
+
+    def __call__(self):
+        self.executado = True
+        _avancar_versao_dados()
+
+
+def marcar_dados_alterados():
+    """Avançar a versão global dos dados quando a transação atual fizer commit
+
+    Só depois do commit: quem ler a versão nova já enxerga os dados novos.
+    Uma gravação dispara vários signals (proposta, ranking, ...), mas a
+    transação avança a versão uma vez só: se já há um avanço pendente na
+    fila de `on_commit` outro não é agendado. Rollback de savepoint tira o
+    avanço da fila junto com as gravações, e a próxima marcação o agenda de novo.
+    """
+    conexao = transaction.get_connection()
+    if any(isinstance(funcao, _AvancoVersaoDados) and not funcao.executado for _, funcao, *_ in conexao.run_on_commit):
+        return
+    transaction.on_commit(_AvancoVersaoDados())
+
+
+def versao_dados():
+    """(versão, instante da última alteração em segundos) dos dados de ranking/dashboards
+
+    Se o cache foi limpo, avança o contador do banco: a versão nova não
+    coincide com nenhum ETag já entregue.
+    """
+    valores = cache.get_many([CHAVE_VERSAO_DADOS, CHAVE_DADOS_ALTERADOS_EM])
+    versao = valores.get(CHAVE_VERSAO_DADOS)
+    if versao is None:
+        _avancar_versao_dados()
+        return versao_dados()
+    return versao, valores.get(CHAVE_DADOS_ALTERADOS_EM) or time.time()
@@ -1,15 +1,16 @@
+import json
 import logging
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework import viewsets, generics, status
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
 from rest_framework.response import Response
 
-from django.db.models import Sum, Count, Q, F, FloatField, Value
+from django.db.models import Sum, Count, Q, F, DecimalField, FloatField, IntegerField, OuterRef, Subquery, Value
 
 from django.db.models.functions import Coalesce
 
@@ -21,7 +22,11 @@ from django.utils import timezone
 
 from rest_framework.authtoken.models import Token
 
-from .middleware import verificar_status_sistema, verificar_permissao
+from .autenticacao import gerar_tokens
+from .estatisticas import dados_dashboard_banca
+from .listagem import CamposInvalidos, ListagemPropostas, paginar, paginar_propostas, propostas_listagem, vendas_listagem
+from .lotes import LoteInvalido, enviar_propostas, validar_propostas
+from .middleware import carregar_perfil, obter_perfil, resposta_condicional, verificar_status_sistema, verificar_permissao
 
 from .serializers import (
 
@@ -40,207 +45,16 @@ from .serializers import (
 
 from .models import Vendedor, Cliente, Workshop, PrevisaoWorkshop, ResultadoPosWorkshop, PerfilAcesso, Equipe, Proposta, RegraPontuacao, Ranking, ConfiguracaoPontuacao, Venda
 from .models import StatusSistema
+from .ranking import atualizar_ranking, atualizar_ranking_equipe
+from .permissoes import permissoes
+from .pontuacao import criar_snapshot
+from .recalculo import calcular_pontos_proposta, recalcular_pontos_no_banco, recalcular_todos_pontos
+from .tempo_real import publicar_evento_gestor
 
 
 logger = logging.getLogger(__name__)
 
 
-# Funções auxiliares de pontuação (movidas para o topo para evitar NameError)
-
-def calcular_pontos_proposta(proposta):
-    """Calcular pontos de uma proposta baseado nas regras da banca
-    - No Workshop: Pontos por proposta validada + (quantidade_produtos × pontos_por_produto)
-    - No Pós-Workshop: Pontos por venda validada + (quantidade_produtos_venda × pontos_por_produto)
-    """
-
-    from .models import ConfiguracaoPontuacao
-
-    status_atual = StatusSistema.get_status_atual()
-    config = ConfiguracaoPontuacao.get_configuracao()
-    
-    pontos = 0
-    
-    # LÓGICA POR ESTADO DO SISTEMA
-    if status_atual == 'workshop':
-        # No Workshop, ganha pontos se a proposta for validada
-        if proposta.status == 'validada':
-            pontos_proposta = config.pontos_proposta_validada or 0
-            pontos_produtos = (proposta.quantidade_produtos or 0) * (config.pontos_por_produto or 0)
-            
-            # CÁLCULO DE PONTOS BÔNUS
-            pontos_bonus = 0
-            if proposta.bonus_vinhos_casa_perini_mundo: pontos_bonus += 5
-            if proposta.bonus_vinhos_fracao_unica: pontos_bonus += 5
-            if proposta.bonus_espumantes_vintage: pontos_bonus += 5
-            if proposta.bonus_espumantes_premium: pontos_bonus += 5
-            
-            pontos = pontos_proposta + pontos_produtos + pontos_bonus
-            proposta.pontos_bonus = pontos_bonus
-            
-            print(f"DEBUG SCORE (Workshop): Prop #{proposta.id} -> {pontos} ({pontos_proposta} + {proposta.quantidade_produtos}x{config.pontos_por_produto} + {pontos_bonus} bonus)")
-        elif proposta.status == 'vendida':
-            # Se já mudou para vendida mas ainda estamos no status global Workshop (raro), mantém pontos da validação
-            pontos = proposta.pontos or 0
-
-    elif status_atual == 'pos_workshop':
-        # No Pós-Workshop, ganha pontos APENAS se a venda for validada pelo gestor
-        if proposta.status == 'vendida' and proposta.venda_validada:
-            pontos_venda = config.pontos_proposta_validada or 0 # Reutiliza a regra de pontuação base
-            # USA A QUANTIDADE DE PRODUTOS VENDIDOS informada pela equipe
-            pontos_produtos = (proposta.quantidade_produtos_venda or 0) * (config.pontos_por_produto or 0)
-            
-            # CÁLCULO DE PONTOS BÔNUS (Mesmo bônus que veio do Workshop)
-            pontos_bonus = 0
-            if proposta.bonus_vinhos_casa_perini_mundo: pontos_bonus += 5
-            if proposta.bonus_vinhos_fracao_unica: pontos_bonus += 5
-            if proposta.bonus_espumantes_vintage: pontos_bonus += 5
-            if proposta.bonus_espumantes_premium: pontos_bonus += 5
-            
-            pontos = pontos_venda + pontos_produtos + pontos_bonus
-            proposta.pontos_bonus = pontos_bonus
-            
-            print(f"DEBUG SCORE (Pós-Workshop): Prop #{proposta.id} -> {pontos} pontos da VENDA ({pontos_venda} + {proposta.quantidade_produtos_venda}x{config.pontos_por_produto} + {pontos_bonus} bonus)")
-        else:
-            # Propostas validadas mas não vendidas (ou venda não validada) não contam pontos no ranking do Pós-Workshop
-            pontos = 0
-            print(f"DEBUG SCORE (Pós-Workshop): Prop #{proposta.id} -> 0 pontos (venda não validada ou proposta apenas validada)")
-            
-    else:
-        # Outros estados do sistema (pre_workshop, encerrado)
-        # Segue a lógica de manter o que já foi calculado ou zerar se necessário
-        if proposta.status == 'validada' or (proposta.status == 'vendida' and proposta.venda_validada):
-            # Tenta manter o cálculo atual
-            pontos = proposta.pontos or 0
-        else:
-            pontos = 0
-
-    # Salvar pontos na proposta
-    proposta.pontos = pontos
-    proposta.save(update_fields=['pontos', 'pontos_bonus'])
-    
-    print(f"DEBUG: Proposta {proposta.id} finalizada com {pontos} pontos")
-    
-    return pontos
-
-
-def atualizar_ranking_equipe(equipe, status_atual):
-    """Atualizar ranking de uma equipe específica"""
-    if not equipe:
-        return
-        
-    # Calcular total de pontos da equipe (somando propostas validadas/vendidas)
-    propostas_validadas_vendidas = Proposta.objects.filter(
-        equipe=equipe,
-        status__in=['validada', 'vendida']
-    )
-    
-    total_pontos_equipe = propostas_validadas_vendidas.aggregate(
-        total=Coalesce(Sum('pontos'), 0)
-    )['total'] or 0
-    
-    print(f"DEBUG: ========== Atualizando ranking da equipe {equipe.nome} ==========")
-    print(f"  - Total de propostas validadas/vendidas: {propostas_validadas_vendidas.count()}")
-    
-    # Mostrar detalhes de cada proposta
-    for prop in propostas_validadas_vendidas:
-        print(f"    • Proposta #{prop.id}: {prop.pontos} pontos (status: {prop.status}, produtos: {prop.quantidade_produtos})")
-    
-    print(f"  - TOTAL PONTOS DA EQUIPE (soma): {total_pontos_equipe}")
-    
-    # Atualizar ou criar ranking
-    ranking, created = Ranking.objects.get_or_create(
-        equipe=equipe,
-        estado_sistema=status_atual,
-        defaults={
-            'posicao': 1,
-            'pontos': total_pontos_equipe,
-            'propostas_enviadas': 0,
-            'propostas_validadas': 0,
-            'vendas_concretizadas': 0,
-            'valor_total_vendas': 0
-        }
-    )
-    
-    if not created:
-        print(f"  - Pontos ANTIGOS no ranking: {ranking.pontos}")
-        ranking.pontos = total_pontos_equipe
-        ranking.save()
-        print(f"  - Pontos NOVOS no ranking: {ranking.pontos}")
-    else:
-        print(f"  - Ranking CRIADO com {total_pontos_equipe} pontos")
-    
-    print(f"DEBUG: ========== Fim atualização equipe {equipe.nome} ==========")
-    print()
-
-
-def atualizar_ranking():
-    """Atualizar ranking completo de todas as equipes"""
-    from django.db.models import Sum, Count
-    
-    status_atual = StatusSistema.get_status_atual()
-    equipes = Equipe.objects.all()
-    
-    # Calcular estatísticas para cada equipe
-    ranking_calculado = []
-    
-    for equipe in equipes:
-        propostas = Proposta.objects.filter(equipe=equipe)
-        
-        # Estatísticas básicas
-        propostas_enviadas = propostas.count()
-        propostas_validadas = propostas.filter(status='validada').count()
-        vendas_concretizadas = propostas.filter(
-            status='vendida', 
-            venda_validada=True
-        ).count()
-        
-        # Valor total de vendas
-        valor_total_vendas = propostas.filter(
-            status='vendida',
-            venda_validada=True
-        ).aggregate(total=Sum('valor_venda'))['total'] or 0
-        
-        # PONTUAÇÃO BASEADA NO SISTEMA ATUAL
-        # Usa o campo pontos já calculado pelas propostas
-        pontos_totais = propostas.filter(
-            status__in=['validada', 'vendida']
-        ).aggregate(total=Sum('pontos'))['total'] or 0
-        
-        print(f"DEBUG: Ranking - Equipe {equipe.nome}")
-        print(f"  - Propostas validadas: {propostas_validadas}")
-        print(f"  - Vendas concretizadas: {vendas_concretizadas}")
-        print(f"  - Pontos totais: {pontos_totais}")
-        
-        ranking_calculado.append({
-            'equipe': equipe,
-            'pontos': int(pontos_totais),
-            'propostas_enviadas': propostas_enviadas,
-            'propostas_validadas': propostas_validadas,
-            'vendas_concretizadas': vendas_concretizadas,
-            'valor_total_vendas': valor_total_vendas,
-        })
-    
-    # Ordenar por pontuação (decrescente) e definir posições
-    ranking_calculado.sort(key=lambda item: (item['pontos'], item['valor_total_vendas']), reverse=True)
-    
-    for i, item in enumerate(ranking_calculado, 1):
-        Ranking.objects.update_or_create(
-            equipe=item['equipe'],
-            estado_sistema=status_atual,
-            defaults={
-                'posicao': i,
-                'pontos': item['pontos'],
-                'propostas_enviadas': item['propostas_enviadas'],
-                'propostas_validadas': item['propostas_validadas'],
-                'vendas_concretizadas': item['vendas_concretizadas'],
-                'valor_total_vendas': item['valor_total_vendas'],
-            }
-        )
-    
-    print(f"DEBUG: Ranking atualizado para {len(ranking_calculado)} equipes")
-
-
-
 class UserViewSet(generics.CreateAPIView):
 
     queryset = User.objects.all()
@@ -308,17 +122,7 @@ def get_perfil_acesso_usuario(request):
 
     """Obtém o perfil de acesso do usuário logado ou retorna None para acesso público"""
 
-    if request.user.is_authenticated:
-
-        try:
-
-            return request.user.perfil_acesso
-
-        except PerfilAcesso.DoesNotExist:
-
-            return None
-
-    return None
+    return carregar_perfil(request)
 
 
 
@@ -459,9 +263,14 @@ def dashboard_geral(request):
 
 
 
-@api_view(['GET'])
-
-
+def _total_por_vendedor(modelo, campo, workshop_id=None, decimal=False):
+    """Soma de `campo` de `modelo` por vendedor, como subconsulta correlacionada"""
+    registros = modelo.objects.filter(vendedor=OuterRef('pk'))
+    if workshop_id:
+        registros = registros.filter(workshop_id=workshop_id)
+    saida = DecimalField(max_digits=15, decimal_places=2) if decimal else IntegerField()
+    total = registros.order_by().values('vendedor').annotate(total=Sum(campo)).values('total')
+    return Coalesce(Subquery(total, output_field=saida), Value(0), output_field=saida)
 
 
 @api_view(['GET'])
@@ -504,6 +313,13 @@ def dashboard_vendedor(request, vendedor_id=None):
     
 
 
+    # Filtros opcionais: ?vendedor=<id> (equivale à rota com id) e ?workshop=<id>
+    try:
+        vendedor_id = vendedor_id or int(request.GET.get('vendedor') or 0) or None
+        workshop_id = int(request.GET.get('workshop') or 0) or None
+    except ValueError:
+        return Response({'error': 'Filtros vendedor e workshop devem ser ids numéricos'}, status=400)
+
     if vendedor_id:
 
         # Verificar permissão específica
@@ -516,45 +332,26 @@ def dashboard_vendedor(request, vendedor_id=None):
 
     
 
-    data = []
-
-    
-
-    for vendedor in queryset:
-
-        # Dados previstos
-
-        dados_previstos = PrevisaoWorkshop.objects.filter(vendedor=vendedor).aggregate(
-
-            faturamento_previsto=Coalesce(Sum('faturamento_total_previsto'), 0),
-
-            propostas_previstas=Coalesce(Sum('numero_propostas'), 0)
-
-        )
-
-        
-
-        # Dados realizados
-
-        dados_realizados = ResultadoPosWorkshop.objects.filter(vendedor=vendedor).aggregate(
-
-            faturamento_realizado=Coalesce(Sum('faturamento_total_realizado'), 0),
-
-            propostas_fechadas=Coalesce(Sum('numero_propostas_fechadas'), 0)
+    # Previsto e realizado por subconsulta correlacionada: uma única query para
+    # todos os vendedores (um JOIN com as duas tabelas multiplicaria as somas)
+    vendedores = queryset.annotate(
+        faturamento_previsto=_total_por_vendedor(PrevisaoWorkshop, 'faturamento_total_previsto', workshop_id, decimal=True),
+        propostas_previstas=_total_por_vendedor(PrevisaoWorkshop, 'numero_propostas', workshop_id),
+        faturamento_realizado=_total_por_vendedor(ResultadoPosWorkshop, 'faturamento_total_realizado', workshop_id, decimal=True),
+        propostas_fechadas=_total_por_vendedor(ResultadoPosWorkshop, 'numero_propostas_fechadas', workshop_id),
+    ).values('nome', 'faturamento_previsto', 'faturamento_realizado', 'propostas_previstas', 'propostas_fechadas')
 
-        )
+    data = []
 
-        
+    for vendedor in vendedores:
 
-        # Cálculos
+        faturamento_previsto = vendedor['faturamento_previsto']
 
-        faturamento_previsto = dados_previstos['faturamento_previsto'] or 0
+        faturamento_realizado = vendedor['faturamento_realizado']
 
-        faturamento_realizado = dados_realizados['faturamento_realizado'] or 0
+        propostas_previstas = vendedor['propostas_previstas']
 
-        propostas_previstas = dados_previstos['propostas_previstas'] or 0
-
-        propostas_fechadas = dados_realizados['propostas_fechadas'] or 0
+        propostas_fechadas = vendedor['propostas_fechadas']
 
         
 
@@ -568,7 +365,7 @@ def dashboard_vendedor(request, vendedor_id=None):
 
         data.append({
 
-            'vendedor': vendedor.nome,
+            'vendedor': vendedor['nome'],
 
 
             'faturamento_previsto': faturamento_previsto,
@@ -713,6 +510,7 @@ def comparativo_workshop(request, workshop_id):
 
 @api_view(['POST'])
 
+@authentication_classes([])
 @permission_classes([AllowAny])
 
 def login_equipe(request):
@@ -758,6 +556,8 @@ def login_equipe(request):
 
                 'token': token.key,
 
+                **gerar_tokens(user, perfil),
+
                 'user': {
 
                     'id': user.id,
@@ -809,7 +609,7 @@ def selecionar_equipe(request):
 
     try:
 
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
 
         
 
@@ -835,10 +635,13 @@ def selecionar_equipe(request):
 
         
 
+        # Tokens com a nova equipe_id: o de acesso atual ainda traz a anterior
         return Response({
 
             'message': 'Equipe selecionada com sucesso',
 
+            **gerar_tokens(request.user, perfil),
+
             'equipe': {
 
                 'id': equipe.id,
@@ -870,7 +673,7 @@ def listar_equipes_disponiveis(request):
 
     try:
 
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
 
         
 
@@ -900,40 +703,58 @@ def listar_equipes_disponiveis(request):
 
 
 
+def _equipe_do_perfil(request, perfil):
+    """Equipe do perfil logado; sem equipe associada, tenta a de código igual ao username
+
+    O perfil montado das claims do JWT pode estar defasado: sem equipe no
+    token, a equipe é relida do banco antes da associação automática, e o
+    `perfil` recebido passa a apontar para a equipe usada.
+    """
+    if perfil.equipe_id:
+        return perfil.equipe
+    atual = PerfilAcesso.objects.select_related('equipe').get(pk=perfil.pk)
+    if atual.equipe:
+        perfil.equipe = atual.equipe
+        return atual.equipe
+    try:
+        equipe = Equipe.objects.get(codigo=request.user.username)
+    except Equipe.DoesNotExist:
+        return None
+    # Associar a equipe ao perfil se encontrada
+    atual.equipe = equipe
+    atual.save()
+    perfil.equipe = equipe
+    logger.info(f'Equipe {equipe.nome} associada automaticamente ao usuário {request.user.username}')
+    return equipe
+
+
+def _resposta_sem_equipe(request):
+    return Response({
+        'error': 'Equipe não selecionada para este usuário',
+        'message': 'Entre em contato com o administrador para associar uma equipe ao seu usuário',
+        'username': request.user.username
+    }, status=400)
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def propostas_equipe(request):
     """Gerenciar propostas da equipe logada"""
 
     try:
-        perfil = request.user.perfil_acesso
-        # Recarregar do banco para garantir que temos os dados mais recentes
-        perfil.refresh_from_db()
+        perfil = obter_perfil(request)
     except PerfilAcesso.DoesNotExist:
         return Response({'error': 'Perfil de acesso não encontrado'}, status=403)
 
     if perfil.nivel != 'equipe':
         return Response({'error': 'Acesso negado'}, status=403)
 
-    if not perfil.equipe:
-        # Tentar encontrar a equipe pelo código do username
-        try:
-            equipe = Equipe.objects.get(codigo=request.user.username)
-            # Associar a equipe ao perfil se encontrada
-            perfil.equipe = equipe
-            perfil.save()
-            logger.info(f'Equipe {equipe.nome} associada automaticamente ao usuário {request.user.username} em propostas_equipe')
-        except Equipe.DoesNotExist:
-            return Response({
-                'error': 'Equipe não selecionada para este usuário',
-                'message': 'Entre em contato com o administrador para associar uma equipe ao seu usuário',
-                'username': request.user.username
-            }, status=400)
+    if not _equipe_do_perfil(request, perfil):
+        return _resposta_sem_equipe(request)
     
     if request.method == 'GET':
-        propostas = Proposta.objects.filter(equipe=perfil.equipe)
-        serializer = PropostaSerializer(propostas, many=True)
-        return Response(serializer.data)
+        propostas = propostas_listagem(equipe=perfil.equipe)
+        return paginar_propostas(request, propostas)
     
     elif request.method == 'POST':
         if not perfil.pode_enviar_propostas():
@@ -1030,7 +851,8 @@ def propostas_equipe(request):
                 # Funções de utilidade (usando as definidas no topo deste arquivo)
                 try:
                     calcular_pontos_proposta(proposta)
-                    atualizar_ranking()
+                    atualizar_ranking_equipe(proposta.equipe_id)
+                    publicar_evento_gestor('proposta_enviada', proposta)
                 except Exception as e:
                     print(f"ERRO ao calcular pontos/atualizar ranking: {str(e)}")
                     # Não impede o retorno da proposta criada
@@ -1051,9 +873,58 @@ def propostas_equipe(request):
             return Response({'error': f'Erro interno: {str(e)}'}, status=400)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def propostas_equipe_lote(request):
+    """Enviar várias propostas da equipe logada de uma vez
+
+    Corpo JSON `{"propostas": [{...}, ...]}` com os mesmos campos do POST de
+    `propostas_equipe`, ou multipart com `propostas` (a lista em JSON) e o PDF
+    de cada item em `arquivo_pdf_<índice>`. Se algum item for inválido nada é
+    gravado e a resposta traz os erros por índice em `details`.
+    """
+    try:
+        perfil = obter_perfil(request)
+    except PerfilAcesso.DoesNotExist:
+        return Response({'error': 'Perfil de acesso não encontrado'}, status=403)
+
+    if perfil.nivel != 'equipe':
+        return Response({'error': 'Acesso negado'}, status=403)
+
+    equipe = _equipe_do_perfil(request, perfil)
+    if not equipe:
+        return _resposta_sem_equipe(request)
+
+    if not perfil.pode_enviar_propostas():
+        return Response({
+            'error': 'Envio de propostas não permitido no status atual',
+            'status_atual': StatusSistema.get_status_atual()
+        }, status=403)
+
+    itens = request.data if isinstance(request.data, list) else request.data.get('propostas')
+    if isinstance(itens, str):
+        try:
+            itens = json.loads(itens)
+        except ValueError:
+            return Response({'error': 'Campo propostas deve ser uma lista em JSON'}, status=400)
+
+    try:
+        propostas = enviar_propostas(equipe, itens, request.FILES)
+    except LoteInvalido as e:
+        logger.debug('Lote de propostas da equipe %s recusado: %s %s', equipe.nome, e, e.erros)
+        return Response({'error': str(e), 'details': e.erros}, status=400)
+
+    logger.info('%s propostas criadas em lote para a equipe %s', len(propostas), equipe.nome)
+    return Response({
+        'total': len(propostas),
+        'propostas': PropostaSerializer(propostas, many=True).data,
+    }, status=201)
+
+
 
 @csrf_exempt
 @api_view(['POST'])
+@authentication_classes([])
 @permission_classes([AllowAny])
 def login_view(request):
     """Login único para equipes e login individual para outros perfis"""
@@ -1080,6 +951,8 @@ def login_view(request):
                 
                 response_data = {
                     'token': token.key,
+
+                    **gerar_tokens(user, perfil),
                     'user': {
                         'id': user.id,
                         'username': user.username,
@@ -1107,6 +980,32 @@ def login_view(request):
 
 
 
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def renovar_token(request):
+    """Trocar o token de renovação por um novo par de tokens
+
+    O perfil é relido do banco, então mudanças de nível, equipe ou
+    desativação passam a valer no próximo token de acesso.
+    """
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    try:
+        refresh = RefreshToken(request.data.get('refresh', ''))
+        perfil = PerfilAcesso.objects.select_related('usuario').get(usuario_id=refresh['user_id'])
+    except (TokenError, KeyError):
+        return Response({'error': 'Token de renovação inválido ou expirado'}, status=401)
+    except PerfilAcesso.DoesNotExist:
+        return Response({'error': 'Perfil de acesso não encontrado'}, status=403)
+
+    if not perfil.ativo or not perfil.usuario.is_active:
+        return Response({'error': 'Perfil de acesso inativo'}, status=403)
+
+    return Response(gerar_tokens(perfil.usuario, perfil))
+
 @api_view(['GET', 'POST', 'DELETE'])
 
 @verificar_permissao('pode_criar_equipes')
@@ -1175,6 +1074,9 @@ def gerenciar_equipes(request):
                 # Finalmente remover a equipe
                 equipe.delete()
 
+            # Mudança estrutural: reconstruir ranking completo
+            atualizar_ranking()
+
             return Response({'message': 'Equipe removida com sucesso'}, status=200)
 
         except Equipe.DoesNotExist:
@@ -1262,6 +1164,9 @@ def gerenciar_equipes(request):
                     'error': f'Erro ao criar usuário para a equipe: {str(e)}'
                 }, status=400)
             
+            # Mudança estrutural: reconstruir ranking completo
+            atualizar_ranking()
+            
             return Response(serializer.data, status=201)
         
         print(f"DEBUG: Erros do serializer: {serializer.errors}")
@@ -1486,6 +1391,9 @@ def gerenciar_status_sistema(request):
                 status.alterado_por = request.user
                 status.save()
             
+            # Troca de fase: reconstruir ranking completo da nova fase
+            atualizar_ranking()
+            
             serializer = StatusSistemaSerializer(status)
             return Response(serializer.data)
             
@@ -1509,6 +1417,9 @@ def gerenciar_status_sistema(request):
                 status.alterado_por = request.user
                 status.save()
             
+            # Troca de fase: reconstruir ranking completo da nova fase
+            atualizar_ranking()
+            
             serializer = StatusSistemaSerializer(status)
             return Response(serializer.data)
             
@@ -1528,7 +1439,9 @@ def meu_perfil(request):
 
     try:
 
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
+        status_atual = StatusSistema.get_status_atual()
+        linha_permissoes = permissoes(perfil.nivel, status_atual)
 
         return Response({
 
@@ -1554,25 +1467,15 @@ def meu_perfil(request):
 
             },
 
-            'status_sistema': StatusSistema.get_status_atual(),
+            'status_sistema': status_atual,
 
             'permissoes': {
-
-                'pode_criar_equipes': perfil.pode_criar_equipes(),
-
-                'pode_criar_usuarios': perfil.pode_criar_usuarios(),
-
-                'pode_alterar_status_sistema': perfil.pode_alterar_status_sistema(),
-
-                
-                'pode_ver_dashboard_geral': perfil.pode_ver_dashboard_geral(),
-
-                'pode_validar_propostas': perfil.pode_validar_propostas(),
-
-                'pode_registrar_previsao': perfil.pode_registrar_previsao(),
-
-                'pode_registrar_resultado': perfil.pode_registrar_resultado(),
-
+                acao: linha_permissoes[acao]
+                for acao in [
+                    'pode_criar_equipes', 'pode_criar_usuarios', 'pode_alterar_status_sistema',
+                    'pode_ver_dashboard_geral', 'pode_validar_propostas',
+                    'pode_registrar_previsao', 'pode_registrar_resultado',
+                ]
             }
 
         })
@@ -1607,25 +1510,24 @@ def gerenciar_propostas(request):
 
             # Equipe vê apenas suas propostas
 
-            propostas = Proposta.objects.filter(equipe=perfil.equipe)
+            propostas = propostas_listagem(equipe=perfil.equipe)
 
         elif perfil and perfil.nivel == 'gestor':
 
             # Gestor vê todas as propostas
 
-            propostas = Proposta.objects.all()
+            propostas = propostas_listagem()
 
         else:
 
             # Admin e Banca veem todas
 
-            propostas = Proposta.objects.all()
+            propostas = propostas_listagem()
 
         
 
-        serializer = PropostaSerializer(propostas, many=True)
 
-        return Response(serializer.data)
+        return paginar_propostas(request, propostas)
 
     
 
@@ -1667,7 +1569,8 @@ def gerenciar_propostas(request):
 
             # Atualizar ranking
 
-            atualizar_ranking()
+            atualizar_ranking_equipe(proposta.equipe_id)
+            publicar_evento_gestor('proposta_enviada', proposta)
 
             
 
@@ -1712,8 +1615,9 @@ def validar_proposta(request, proposta_id):
             
             print(f"DEBUG: Proposta {proposta_id} VALIDADA - Pontos calculados: {pontos}")
             
-            # Atualizar ranking geral
-            atualizar_ranking()
+            # Atualizar ranking da equipe
+            atualizar_ranking_equipe(proposta.equipe_id)
+            publicar_evento_gestor('proposta_validada', proposta)
             
             return Response({
                 'message': 'Proposta validada com sucesso',
@@ -1737,8 +1641,9 @@ def validar_proposta(request, proposta_id):
             proposta.pontos = 0  # Zerar pontos
             proposta.save(update_fields=['status', 'motivo_rejeicao', 'data_validacao', 'validado_por', 'pontos'])
             
-            # Atualizar ranking geral
-            atualizar_ranking()
+            # Atualizar ranking da equipe
+            atualizar_ranking_equipe(proposta.equipe_id)
+            publicar_evento_gestor('proposta_rejeitada', proposta)
             
             return Response({'message': 'Proposta rejeitada com sucesso'})
         
@@ -1802,6 +1707,7 @@ def marcar_venda(request, proposta_id):
         # então aqui apenas recalculamos o baseline (proposta validada)
 
         calcular_pontos_proposta(proposta)
+        publicar_evento_gestor('venda_marcada', proposta)
 
         
 
@@ -1821,7 +1727,7 @@ def registrar_venda_pre_workshop(request, proposta_id):
     """Registrar venda de proposta validada no Pré-Workshop"""
     
     try:
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
         
         # Verificar se está no Pré-Workshop
         status_atual = StatusSistema.get_status_atual()
@@ -1944,7 +1850,8 @@ def validar_venda(request, proposta_id):
 
         proposta.save()
 
-        atualizar_ranking()
+        atualizar_ranking_equipe(proposta.equipe_id)
+        publicar_evento_gestor('venda_validada' if acao == 'validar' else 'venda_rejeitada', proposta)
 
         
 
@@ -1964,7 +1871,7 @@ def vendas_para_validar(request):
     """Listar vendas pendentes de validação para o gestor no Pré-Workshop"""
     
     try:
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
         
         # Verificar se está no Pré-Workshop
         status_atual = StatusSistema.get_status_atual()
@@ -1975,10 +1882,9 @@ def vendas_para_validar(request):
             }, status=403)
         
         # Filtrar vendas pendentes
-        vendas = Venda.objects.filter(status_validacao='pendente')
+        vendas = vendas_listagem(status_validacao='pendente')
         
-        serializer = VendaSerializer(vendas, many=True)
-        return Response(serializer.data)
+        return paginar(request, vendas, VendaSerializer, campo='data_criacao')
         
     except Exception as e:
         return Response({'error': str(e)}, status=500)
@@ -1991,7 +1897,7 @@ def validar_venda_pre_workshop(request, venda_id):
     """Validar ou rejeitar venda no Pré-Workshop (apenas gestor)"""
     
     try:
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
         
         # Verificar se está no Pré-Workshop
         status_atual = StatusSistema.get_status_atual()
@@ -2022,7 +1928,7 @@ def validar_venda_pre_workshop(request, venda_id):
             venda.save()
             
             # Atualizar ranking
-            atualizar_ranking()
+            atualizar_ranking_equipe(venda.proposta.equipe_id)
             
             message = 'Venda validada com sucesso!'
             
@@ -2042,12 +1948,11 @@ def validar_venda_pre_workshop(request, venda_id):
 
             try:
                 calcular_pontos_proposta(proposta)
-                atualizar_ranking()
             except Exception:
                 pass
             
             # Atualizar ranking
-            atualizar_ranking()
+            atualizar_ranking_equipe(proposta.equipe_id)
             
             message = 'Venda rejeitada com sucesso!'
             
@@ -2069,6 +1974,7 @@ def validar_venda_pre_workshop(request, venda_id):
 
 @permission_classes([IsAuthenticated])
 
+@resposta_condicional
 def ranking_view(request):
 
     """Ranking das equipes conforme estado atual do sistema"""
@@ -2162,7 +2068,7 @@ def listar_equipes_gestor(request):
 
     try:
 
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
 
         print(f"DEBUG: Listar equipes - Usuário: {request.user.username} - Nível: {perfil.nivel}")
 
@@ -2218,16 +2124,16 @@ def listar_propostas_gestor(request):
 
     
 
-    perfil = request.user.perfil_acesso
+    perfil = obter_perfil(request)
 
     
 
     if perfil.nivel == 'administrador':
 
-        propostas = Proposta.objects.all()
+        propostas = propostas_listagem()
 
     elif perfil.nivel == 'gestor':
-        propostas = Proposta.objects.all()
+        propostas = propostas_listagem()
 
     else:
 
@@ -2241,9 +2147,8 @@ def listar_propostas_gestor(request):
 
     
 
-    serializer = PropostaSerializer(propostas_pendentes, many=True)
 
-    return Response(serializer.data)
+    return paginar_propostas(request, propostas_pendentes)
 
 
 
@@ -2261,7 +2166,7 @@ def detalhar_proposta_gestor(request, proposta_id):
 
         proposta = Proposta.objects.get(id=proposta_id)
 
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
 
         
 
@@ -2296,6 +2201,39 @@ def detalhar_proposta_gestor(request, proposta_id):
 
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@verificar_permissao('pode_validar_propostas')
+def validar_propostas_gestor_lote(request):
+    """Validar/rejeitar várias propostas em uma transação (apenas gestor)
+
+    Corpo: `{"propostas": [{"proposta_id": 1, "acao": "validar"},
+    {"proposta_id": 2, "acao": "rejeitar", "motivo": "..."}]}`. Se algum item
+    for inválido (ou a proposta já tiver sido processada) nada é alterado e a
+    resposta traz os erros por índice em `details`.
+    """
+    itens = request.data if isinstance(request.data, list) else request.data.get('propostas')
+
+    try:
+        propostas = validar_propostas(request.user, itens)
+    except LoteInvalido as e:
+        logger.debug('Lote de validação recusado: %s %s', e, e.erros)
+        return Response({'error': str(e), 'details': e.erros}, status=400)
+
+    validadas = sum(1 for proposta in propostas if proposta.status == 'validada')
+    logger.info('Validação em lote por %s: %s validadas, %s rejeitadas', request.user.username, validadas, len(propostas) - validadas)
+    return Response({
+        'message': f'{len(propostas)} propostas processadas com sucesso',
+        'validadas': validadas,
+        'rejeitadas': len(propostas) - validadas,
+        'propostas': [
+            {'id': proposta.id, 'status': proposta.status, 'pontos': proposta.pontos}
+            for proposta in propostas
+        ],
+    })
+
+
+
 @api_view(['PUT'])
 
 @permission_classes([IsAuthenticated])
@@ -2312,7 +2250,7 @@ def validar_proposta_gestor(request, proposta_id):
 
         proposta = Proposta.objects.get(id=proposta_id)
 
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
 
         
 
@@ -2356,7 +2294,8 @@ def validar_proposta_gestor(request, proposta_id):
 
         proposta.save()
 
-        atualizar_ranking()
+        atualizar_ranking_equipe(proposta.equipe_id)
+        publicar_evento_gestor(f'proposta_{proposta.status}', proposta)
 
         
 
@@ -2402,7 +2341,7 @@ def reenviar_proposta(request, proposta_id):
 
         proposta = Proposta.objects.get(id=proposta_id)
 
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
 
         
 
@@ -2458,7 +2397,8 @@ def reenviar_proposta(request, proposta_id):
 
         calcular_pontos_proposta(proposta)
 
-        atualizar_ranking()
+        atualizar_ranking_equipe(proposta.equipe_id)
+        publicar_evento_gestor('proposta_enviada', proposta)
 
         
 
@@ -2492,7 +2432,7 @@ def apagar_proposta(request, proposta_id):
 
         proposta = Proposta.objects.get(id=proposta_id)
 
-        perfil = request.user.perfil_acesso
+        perfil = obter_perfil(request)
 
         
 
@@ -2510,9 +2450,12 @@ def apagar_proposta(request, proposta_id):
 
         
 
+        equipe_id = proposta.equipe_id
+
         proposta.delete()
 
-        atualizar_ranking()
+        atualizar_ranking_equipe(equipe_id)
+        publicar_evento_gestor('proposta_removida', proposta_id=proposta_id)
 
         
 
@@ -2530,20 +2473,20 @@ def apagar_proposta(request, proposta_id):
 
 @permission_classes([IsAuthenticated])
 
+@resposta_condicional
 def dashboard_gestor(request):
 
     """Dashboard específico para o gestor"""
 
     
 
-    perfil = request.user.perfil_acesso
+    perfil = obter_perfil(request)
 
     
 
     if perfil.nivel == 'gestor':
         # Gestor tem visão global
         equipes = Equipe.objects.all()
-        propostas = Proposta.objects.all()
 
     elif perfil.nivel == 'administrador':
 
@@ -2551,54 +2494,29 @@ def dashboard_gestor(request):
 
         equipes = Equipe.objects.all()
 
-        propostas = Proposta.objects.all()
-
     else:
 
         return Response({'error': 'Acesso negado'}, status=403)
 
     
 
-    # Métricas
-
-    total_equipes = equipes.count()
-
-    total_propostas = propostas.count()
-
-    propostas_pendentes = propostas.filter(status='enviada').count()
-
-    propostas_validadas = propostas.filter(status='validada').count()
-
-    propostas_rejeitadas = propostas.filter(status='rejeitada').count()
-
-    
-
-    # Dados por equipe
-
-    equipes_data = []
+    # Uma consulta agrupada por equipe; os totais gerais são a soma das linhas
+    # (toda proposta pertence a uma equipe)
+    linhas = equipes.annotate(
+        total_propostas=Count('propostas'),
+        propostas_pendentes=Count('propostas', filter=Q(propostas__status='enviada')),
+        propostas_validadas=Count('propostas', filter=Q(propostas__status='validada')),
+        propostas_rejeitadas=Count('propostas', filter=Q(propostas__status='rejeitada')),
+    ).values('nome', 'total_propostas', 'propostas_pendentes', 'propostas_validadas', 'propostas_rejeitadas')
+    equipes_data = [{'equipe': linha.pop('nome'), **linha} for linha in linhas]
 
+    total_equipes = len(equipes_data)
+    total_propostas = sum(linha['total_propostas'] for linha in equipes_data)
+    propostas_pendentes = sum(linha['propostas_pendentes'] for linha in equipes_data)
+    propostas_validadas = sum(linha['propostas_validadas'] for linha in equipes_data)
+    propostas_rejeitadas = sum(linha['propostas_rejeitadas'] for linha in equipes_data)
     status_atual = StatusSistema.get_status_atual()
 
-    for equipe in equipes:
-
-        propostas_equipe = propostas.filter(equipe=equipe)
-
-        equipes_data.append({
-
-            'equipe': equipe.nome,
-
-            'total_propostas': propostas_equipe.count(),
-
-            'propostas_pendentes': propostas_equipe.filter(status='enviada').count(),
-
-            'propostas_validadas': propostas_equipe.filter(status='validada').count(),
-
-            'propostas_rejeitadas': propostas_equipe.filter(status='rejeitada').count(),
-
-        })
-
-    
-
     return Response({
         'total_equipes': total_equipes,
 
@@ -2626,6 +2544,7 @@ def dashboard_gestor(request):
 
 @verificar_permissao('pode_ver_ranking_tempo_real')
 
+@resposta_condicional
 def ranking_banca(request):
 
     """Ranking em tempo real para a banca"""
@@ -2674,311 +2593,50 @@ def ranking_banca(request):
 
 @verificar_permissao('pode_ver_dashboard_geral')
 
+@resposta_condicional
 def dashboard_banca(request):
+    """Dashboard específico para a banca com dados em tempo real
 
-    """Dashboard específico para a banca com dados em tempo real"""
-
-
-
-    # Dados gerais
+    Os totais vêm da tabela materializada `EstatisticaEquipe`; com `?ao_vivo=1`
+    são agregados direto das propostas. Duas consultas em qualquer caso
+    (ver `estatisticas.dados_dashboard_banca`).
+    """
     status_atual = StatusSistema.get_status_atual()
+    ao_vivo = request.GET.get('ao_vivo') in ('1', 'true')
+    totais, equipes_data = dados_dashboard_banca(status_atual, ao_vivo=ao_vivo)
+
+    equipes_data = [
+        {
+            'equipe': linha.pop('nome'),
+            **linha,
+            'faturamento_previsto': float(linha['faturamento_previsto']),
+            'faturamento_realizado': float(linha['faturamento_realizado']),
+        }
+        for linha in equipes_data
+    ]
 
-    if status_atual == 'pos_workshop':
-        # No Pós-Workshop, o foco é em vendas validadas pelo gestor
-        total_propostas = Proposta.objects.filter(status='vendida', venda_validada=True).count()
-        propostas_validadas = total_propostas
-    else:
-        # Outros estados (Workshop), o foco é em propostas validadas
-        total_propostas = Proposta.objects.filter(status='validada').count()
-        propostas_validadas = total_propostas
-        
+    total_propostas = totais['total_propostas']
+    propostas_validadas = total_propostas
     propostas_enviadas = 0  # Não mostrar enviadas na dashboard da banca
-    propostas_rejeitadas = Proposta.objects.filter(status='rejeitada').count()
-    vendas_concretizadas = Proposta.objects.filter(status='vendida', venda_validada=True).count()
-
-
-
-    # Faturamento previsto: propostas validadas + vendidas aguardando validação do gestor
-    # Só sai do previsto quando o gestor validar a venda (venda_validada=True)
-    faturamento_previsto = Proposta.objects.filter(
-        Q(status='validada') | Q(status='vendida', venda_validada=False)
-    ).aggregate(
-        total=Coalesce(Sum('valor_proposta'), Value(0), output_field=FloatField())
-    )['total'] or 0
-
-
-
-    # Pós-workshop: faturamento realizado (soma das vendas validadas pelo gestor)
-    faturamento_realizado = Proposta.objects.filter(
-        status='vendida',
-        venda_validada=True
-    ).aggregate(
-        total=Coalesce(Sum('valor_venda'), Value(0), output_field=FloatField())
-    )['total'] or 0
-
-    
-
-    # Mix de produtos - apenas propostas validadas
-    # No pós-workshop: apenas vendas validadas
-    # Fora do pós-workshop: apenas propostas validadas
-    if status_atual == 'pos_workshop':
-        mix_produtos = Proposta.objects.filter(
-            status='vendida',
-            venda_validada=True
-        ).aggregate(
-            total_produtos=Coalesce(Sum('quantidade_produtos'), 0)
-        )['total_produtos'] or 0
-    else:
-        mix_produtos = Proposta.objects.filter(
-            status='validada'
-        ).aggregate(
-            total_produtos=Coalesce(Sum('quantidade_produtos'), 0)
-        )['total_produtos'] or 0
-
-    
-
-    # Dados por equipe
-
-    equipes_data = []
-
-    equipes = Equipe.objects.filter(ativo=True)
-
-    
-
-    for equipe in equipes:
-
-        # Dados por equipe - buscar TODAS as propostas da equipe primeiro
-        propostas_equipe = Proposta.objects.filter(equipe=equipe)
-        
-        propostas_enviadas_equipe = propostas_equipe.filter(status='enviada').count()
-        propostas_validadas_equipe = propostas_equipe.filter(status='validada').count()
-        vendas_equipe = propostas_equipe.filter(status='vendida', venda_validada=True).count()
-
-        if status_atual == 'pos_workshop':
-            # Pós-Workshop: considerar apenas vendas validadas pelo gestor como "validadas"
-            propostas_validadas_equipe = vendas_equipe
-
-        # No Pós-Workshop, a banca quer ver propostas/produtos vendidos (somente após validação do gestor)
-        produtos_vendidos_equipe = propostas_equipe.filter(
-            status='vendida',
-            venda_validada=True
-        ).aggregate(
-            total=Coalesce(Sum('quantidade_produtos_venda'), 0)
-        )['total'] or 0
-
-        
-
-        # Faturamento previsto por equipe: validadas + vendidas aguardando validação
-        faturamento_previsto_equipe = propostas_equipe.filter(
-            Q(status='validada') | Q(status='vendida', venda_validada=False)
-        ).aggregate(
-            total=Coalesce(Sum('valor_proposta'), Value(0), output_field=FloatField())
-        )['total'] or 0
-
-        # Faturamento realizado por equipe: soma das vendas validadas
-        faturamento_realizado_equipe = propostas_equipe.filter(
-            status='vendida',
-            venda_validada=True
-        ).aggregate(
-            total=Coalesce(Sum('valor_venda'), Value(0), output_field=FloatField())
-        )['total'] or 0
-
-        # Quantidade de produtos por equipe
-        # IMPORTANTE: Dashboard banca mostra APENAS propostas validadas
-        # - No pós-workshop: somatório apenas das vendas validadas
-        # - Fora do pós-workshop: somatório apenas das propostas validadas
-        if status_atual == 'pos_workshop':
-            quantidade_produtos_equipe = produtos_vendidos_equipe
-        else:
-            # Mostrar apenas produtos de propostas validadas
-            quantidade_produtos_equipe = propostas_equipe.filter(
-                status='validada'
-            ).aggregate(
-                total=Coalesce(Sum('quantidade_produtos'), 0)
-            )['total'] or 0
-
-        
-
-        pontos_equipe = propostas_equipe.filter(
-
-            status__in=['validada', 'vendida']
-
-        ).aggregate(
-
-            total=Coalesce(Sum('pontos'), 0)
-
-        )['total'] or 0
-
-        
-
-        equipes_data.append({
-
-            'equipe': equipe.nome,
-
-            'propostas_enviadas': propostas_enviadas_equipe,
-
-            'propostas_validadas': propostas_validadas_equipe,
-
-            'vendas_concretizadas': vendas_equipe,
-
-            'quantidade_produtos': quantidade_produtos_equipe,
-            'produtos_vendidos': produtos_vendidos_equipe,
-            'propostas_vendidas_validada': vendas_equipe,
-
-            'faturamento_previsto': faturamento_previsto_equipe,
-
-            'faturamento_realizado': faturamento_realizado_equipe,
-
-            'pontos': pontos_equipe
-
-        })
-
-    
+    vendas_concretizadas = totais['vendas_concretizadas']
 
     return Response({
-
         'total_propostas': total_propostas,
-
         'propostas_enviadas': propostas_enviadas,
-
         'propostas_validadas': propostas_validadas,
-
-        'propostas_rejeitadas': propostas_rejeitadas,
-
+        'propostas_rejeitadas': totais['propostas_rejeitadas'],
         'vendas_concretizadas': vendas_concretizadas,
-
-        'faturamento_previsto': faturamento_previsto,
-
-        'faturamento_realizado': faturamento_realizado,
-
-        'mix_produtos': mix_produtos,
-
+        'faturamento_previsto': float(totais['faturamento_previsto']),
+        'faturamento_realizado': float(totais['faturamento_realizado']),
+        'mix_produtos': totais['mix_produtos'],
         'taxa_validacao': round((propostas_validadas / propostas_enviadas * 100) if propostas_enviadas > 0 else 0, 2),
-
         'taxa_conversao': round((vendas_concretizadas / propostas_validadas * 100) if propostas_validadas > 0 else 0, 2),
-
         'equipes': equipes_data,
-
         'status_sistema': status_atual
-
     })
 
 
 
-def recalcular_todos_pontos():
-
-    """Recalcular pontos de todas as propostas para todos os estados"""
-
-    propostas = Proposta.objects.all()
-
-    
-
-    for proposta in propostas:
-
-        proposta.pontos = 0
-
-        
-
-        # Recalcular pontos para cada estado
-
-        for estado, _ in StatusSistema.STATUS_CHOICES:
-
-            # Pontos por envio
-
-            regras_envio = RegraPontuacao.objects.filter(
-
-                ativa=True, 
-
-                tipo='proposta_enviada',
-
-                estado_sistema=estado
-
-            )
-
-            pontos_envio = sum(regra.pontos for regra in regras_envio)
-
-            
-
-            # Pontos por validação
-
-            pontos_validacao = 0
-
-            pontos_produtos = 0
-
-            if proposta.status == 'validada':
-
-                # Usar configuração da banca
-
-                from .models import ConfiguracaoPontuacao
-
-                config = ConfiguracaoPontuacao.get_configuracao()
-
-                
-
-                # Pontos fixos por proposta validada
-
-                pontos_validacao = config.pontos_proposta_validada
-
-                
-
-                # Pontos por quantidade de produtos
-
-                pontos_produtos = config.pontos_por_produto * proposta.quantidade_produtos
-
-            
-
-            # Pontos por venda
-
-            pontos_venda = 0
-
-            if proposta.status == 'vendida' and proposta.venda_validada:
-
-                regras_venda = RegraPontuacao.objects.filter(
-
-                    ativa=True, 
-
-                    tipo='venda_concretizada',
-
-                    estado_sistema=estado
-
-                )
-
-                pontos_venda = sum(regra.pontos for regra in regras_venda)
-
-            
-
-            # Total de pontos para este estado
-
-            pontos_estado = pontos_envio + pontos_validacao + pontos_produtos + pontos_venda
-
-            
-
-            # Atualizar ranking para este estado
-
-            Ranking.objects.update_or_create(
-
-                equipe=proposta.equipe,
-
-                estado_sistema=estado,
-
-                defaults={
-
-                    'pontos': pontos_estado
-
-                }
-
-            )
-
-    
-
-    # Atualizar ranking atual
-
-    atualizar_ranking()
-
-
-
-
-
 # === APIs PARA BANCA - REGRAS DE PONTUAÇÃO ===
 
 
@@ -3005,14 +2663,8 @@ def configuracao_pontuacao_api(request):
         config.atualizado_por = request.user
         config.save()
         
-        # Recalcular pontos de todas as propostas validadas
-        from .models import Proposta
-        propostas_validadas = Proposta.objects.filter(status__in=['validada', 'vendida'])
-        for proposta in propostas_validadas:
-            calcular_pontos_proposta(proposta)
-        
-        # Atualizar ranking
-        atualizar_ranking()
+        # Recalcular pontos de todas as propostas em massa (inclui reconstrução do ranking)
+        recalcular_todos_pontos()
         
         serializer = ConfiguracaoPontuacaoSerializer(config)
         return Response(serializer.data)
@@ -3048,14 +2700,8 @@ def regra_proposta_validada_api(request):
 
         config.save()
 
-        # Recalcular pontos de todas as propostas validadas com as novas regras
-        from .models import Proposta
-        propostas_validadas = Proposta.objects.filter(status__in=['validada', 'vendida'])
-        for proposta in propostas_validadas:
-            calcular_pontos_proposta(proposta)
-        
-        # Atualizar ranking
-        atualizar_ranking()
+        # Recalcular pontos de todas as propostas no próprio banco (inclui reconstrução do ranking)
+        recalcular_pontos_no_banco(criar_snapshot(config, StatusSistema.get_status_atual()))
 
         serializer = ConfiguracaoPontuacaoSerializer(config)
 
@@ -3095,14 +2741,8 @@ def regra_venda_produto_api(request):
 
             config.save()
 
-            # Recalcular pontos de todas as propostas validadas com as novas regras
-            from .models import Proposta
-            propostas_validadas = Proposta.objects.filter(status__in=['validada', 'vendida'])
-            for proposta in propostas_validadas:
-                calcular_pontos_proposta(proposta)
-            
-            # Atualizar ranking
-            atualizar_ranking()
+            # Recalcular pontos de todas as propostas no próprio banco (inclui reconstrução do ranking)
+            recalcular_pontos_no_banco(criar_snapshot(config, StatusSistema.get_status_atual()))
 
             serializer = ConfiguracaoPontuacaoSerializer(config)
 
@@ -3146,7 +2786,7 @@ def vendas_api(request):
 
     if request.method == 'GET':
 
-        vendas = Venda.objects.all()
+        vendas = vendas_listagem()
 
         if perfil and perfil.nivel == 'equipe' and perfil.equipe:
 
@@ -3154,9 +2794,8 @@ def vendas_api(request):
 
         
 
-        serializer = VendaSerializer(vendas, many=True)
 
-        return Response(serializer.data)
+        return paginar(request, vendas, VendaSerializer, campo='data_criacao')
 
     
 
@@ -3274,13 +2913,13 @@ def propostas_validadas_api(request):
 
         if perfil and perfil.nivel == 'equipe':
 
-            propostas = Proposta.objects.filter(status='validada')
+            propostas = propostas_listagem(status='validada')
 
             print(f"DEBUG: Propostas para venda - Equipe: propostas enviadas")
 
         else:
 
-            propostas = Proposta.objects.filter(status='validada')
+            propostas = propostas_listagem(status='validada')
 
             print(f"DEBUG: Propostas para venda - Gestor/Admin: propostas validadas")
 
@@ -3310,11 +2949,10 @@ def propostas_validadas_api(request):
 
         
 
-        serializer = PropostaSerializer(propostas, many=True)
 
         print(f"DEBUG: Propostas para venda - Serializer OK")
 
-        return Response(serializer.data)
+        return paginar_propostas(request, propostas)
 
         
 
@@ -3330,16 +2968,15 @@ def propostas_validadas_api(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@resposta_condicional
 def dashboard_equipe(request):
     """Dashboard específico para a equipe - usuário tratado diretamente como entidade"""
     try:
         print(f"DEBUG dashboard_equipe: Usuário autenticado: {request.user.username}")
         
-        # Forçar refresh do perfil do banco de dados
+        # Perfil e equipe carregados em uma única query (ver middleware.carregar_perfil)
         try:
-            perfil = request.user.perfil_acesso
-            # Recarregar do banco para garantir que temos os dados mais recentes
-            perfil.refresh_from_db()
+            perfil = obter_perfil(request)
             print(f"DEBUG dashboard_equipe: Perfil encontrado - Nível: {perfil.nivel}")
         except PerfilAcesso.DoesNotExist:
             logger.error(f'Perfil não encontrado para usuário: {request.user.username}')
@@ -3365,18 +3002,10 @@ def dashboard_equipe(request):
         logger.info(f'Usuário {request.user.username} acessando dashboard como entidade direta')
         print(f"DEBUG dashboard_equipe: Usuário {request.user.username} tratado como entidade direta")
         
-        # Obter status atual do sistema (sempre atualizado)
-        try:
-            status_obj = StatusSistema.objects.first()
-            if status_obj:
-                status_atual = status_obj.status_atual
-                status_display = status_obj.get_status_atual_display()
-            else:
-                status_atual = 'pre_workshop'
-                status_display = 'Pré-Workshop'
-        except Exception:
-            status_atual = 'pre_workshop'
-            status_display = 'Pré-Workshop'
+        # Obter status atual do sistema (cache invalidado a cada troca de fase)
+        status_atual = StatusSistema.get_status_atual()
+        status_display = dict(StatusSistema.STATUS_CHOICES).get(status_atual, status_atual)
+        linha_permissoes = permissoes(perfil.nivel, status_atual)
         
         # Buscar dados da equipe do perfil
         equipe = perfil.equipe
@@ -3449,9 +3078,8 @@ def dashboard_equipe(request):
                 'valor_previsto': float(valor_previsto)
             },
             'permissoes': {
-                'pode_enviar_propostas': perfil.pode_enviar_propostas(),
-                'pode_marcar_vendas': perfil.pode_marcar_vendas(),
-                'pode_ver_ranking': perfil.pode_ver_ranking()
+                acao: linha_permissoes[acao]
+                for acao in ['pode_enviar_propostas', 'pode_marcar_vendas', 'pode_ver_ranking']
             }
         }
         
@@ -3478,18 +3106,17 @@ def dashboard_equipe(request):
 @verificar_permissao('pode_marcar_vendas')
 def vendas_concretizadas(request):
     """Gerenciar vendas concretizadas pela equipe"""
-    perfil = request.user.perfil_acesso
+    perfil = obter_perfil(request)
     
     if request.method == 'GET':
         # Listar propostas da equipe para marcar como vendidas
         # Permite 'validada' (nova venda) ou 'nao_vendida' (venda rejeitada que precisa ser corrigida/reenviada)
-        propostas = Proposta.objects.filter(
+        propostas = propostas_listagem(
             equipe=perfil.equipe,
             status__in=['validada', 'nao_vendida']
         ).order_by('-data_envio')
         
-        serializer = PropostaSerializer(propostas, many=True)
-        return Response(serializer.data)
+        return paginar_propostas(request, propostas)
     
     elif request.method == 'POST':
         # Marcar proposta como vendida
@@ -3547,6 +3174,7 @@ def vendas_concretizadas(request):
             proposta.motivo_rejeicao_venda = None
             proposta.data_rejeicao_venda = None
             proposta.save()
+            publicar_evento_gestor('venda_marcada', proposta)
             
             return Response({
                 'message': 'Venda registrada com sucesso e enviada para validação do gestor',
@@ -3564,24 +3192,23 @@ def vendas_concretizadas(request):
 @verificar_permissao('pode_validar_vendas')
 def validar_vendas(request):
     """Validar vendas marcadas pelas equipes (gestor/admin)"""
-    perfil = request.user.perfil_acesso
+    perfil = obter_perfil(request)
     
     if request.method == 'GET':
         # Listar vendas aguardando validação
         if perfil.nivel == 'administrador':
-            propostas = Proposta.objects.filter(
+            propostas = propostas_listagem(
                 status='vendida',
                 venda_validada=False
             )
         else:  # gestor
             # Gestor vê todas as propostas
-            propostas = Proposta.objects.filter(
+            propostas = propostas_listagem(
                 status='vendida',
                 venda_validada=False
             )
         
-        serializer = PropostaSerializer(propostas, many=True)
-        return Response(serializer.data)
+        return paginar_propostas(request, propostas)
     
     elif request.method == 'POST':
         # Validar/rejeitar venda
@@ -3632,7 +3259,8 @@ def validar_vendas(request):
             # Recalcular pontos e ranking
             # Importante: se rejeitada, os pontos devem ser zerados/recalculados
             calcular_pontos_proposta(proposta)
-            atualizar_ranking()
+            atualizar_ranking_equipe(proposta.equipe_id)
+            publicar_evento_gestor('venda_validada' if acao == 'validar' else 'venda_rejeitada', proposta)
             
             return Response({
                 'message': message,
@@ -3650,13 +3278,12 @@ def validar_vendas(request):
 @verificar_permissao('pode_marcar_vendas')
 def todas_propostas_equipe(request):
     """Listar todas as propostas da equipe com status"""
-    perfil = request.user.perfil_acesso
+    perfil = obter_perfil(request)
     
     # Todas as propostas da equipe
-    propostas = Proposta.objects.filter(equipe=perfil.equipe).order_by('-data_envio')
+    propostas = propostas_listagem(equipe=perfil.equipe).order_by('-data_envio')
     
-    serializer = PropostaSerializer(propostas, many=True)
-    return Response(serializer.data)
+    return paginar_propostas(request, propostas)
 
 
 @api_view(['GET'])
@@ -3664,10 +3291,10 @@ def todas_propostas_equipe(request):
 @verificar_permissao('pode_marcar_vendas')
 def minhas_vendas_concretizadas(request):
     """Listar vendas da equipe (vendidas e validadas)"""
-    perfil = request.user.perfil_acesso
+    perfil = obter_perfil(request)
     
     # Propostas vendidas pela equipe
-    propostas_vendidas = Proposta.objects.filter(
+    propostas_vendidas = propostas_listagem(
         equipe=perfil.equipe,
         status='vendida'
     )
@@ -3677,18 +3304,26 @@ def minhas_vendas_concretizadas(request):
     vendas_validadas = propostas_vendidas.filter(venda_validada=True)
 
     # Vendas rejeitadas (mantém histórico no status nao_vendida)
-    vendas_rejeitadas = Proposta.objects.filter(
+    vendas_rejeitadas = propostas_listagem(
         equipe=perfil.equipe,
         status='nao_vendida'
     )
 
+    try:
+        listagem = ListagemPropostas.da_requisicao(request)
+    except CamposInvalidos as erro:
+        return Response({'error': str(erro)}, status=400)
+    aguardando_validacao = listagem(listagem.consulta(aguardando_validacao))
+    vendas_validadas = listagem(listagem.consulta(vendas_validadas))
+    vendas_rejeitadas = listagem(listagem.consulta(vendas_rejeitadas))
+
     return Response({
-        'aguardando_validacao': PropostaSerializer(aguardando_validacao, many=True).data,
-        'vendas_validadas': PropostaSerializer(vendas_validadas, many=True).data,
-        'vendas_rejeitadas': PropostaSerializer(vendas_rejeitadas, many=True).data,
-        'total_aguardando': aguardando_validacao.count(),
-        'total_validadas': vendas_validadas.count(),
-        'total_rejeitadas': vendas_rejeitadas.count(),
+        'aguardando_validacao': aguardando_validacao,
+        'vendas_validadas': vendas_validadas,
+        'vendas_rejeitadas': vendas_rejeitadas,
+        'total_aguardando': len(aguardando_validacao),
+        'total_validadas': len(vendas_validadas),
+        'total_rejeitadas': len(vendas_rejeitadas),
     })
 
 
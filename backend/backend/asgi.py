@@ -1,8 +1,25 @@
-
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importado após o setup do Django (usa models e cache)
+from api.tempo_real import fila_gestor_websocket  # noqa: E402
+
+ROTAS_WEBSOCKET = {
+    '/ws/gestor/': fila_gestor_websocket,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        rota = ROTAS_WEBSOCKET.get(scope['path'].rstrip('/') + '/')
+        if rota is None:
+            await receive()
+            await send({'type': 'websocket.close', 'code': 4404})
+            return
+        return await rota(scope, receive, send)
+    return await django_application(scope, receive, send)
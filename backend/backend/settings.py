@@ -1,7 +1,9 @@
 
 
+from datetime import timedelta
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -101,8 +103,23 @@ else:
         }
     }
 
+# Cache compartilhado entre os workers (carimbos de versão de api/versoes.py).
+# Por padrão usa arquivos locais; em produção com vários hosts, apontar para Redis/Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'acelerador_vendas_cache')),
+        'KEY_PREFIX': 'acelerador',
+    }
+}
+
+# Paginação por cursor das listagens de propostas/vendas (api/listagem.py)
+PAGINACAO_LIMITE_PADRAO = int(os.environ.get('PAGINACAO_LIMITE_PADRAO', 50))
+PAGINACAO_LIMITE_MAXIMO = int(os.environ.get('PAGINACAO_LIMITE_MAXIMO', 500))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'api.autenticacao.JWTPerfilAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ),
@@ -111,6 +128,14 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Tokens de acesso curtos e sem consulta ao banco (ver api/autenticacao.py)
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.environ.get('JWT_ACCESS_MINUTOS', '15'))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(hours=int(os.environ.get('JWT_REFRESH_HORAS', '12'))),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'UPDATE_LAST_LOGIN': False,
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
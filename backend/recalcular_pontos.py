@@ -5,8 +5,8 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
-from api.models import Proposta, ConfiguracaoPontuacao, Equipe, StatusSistema, Ranking
-from django.db.models import Sum
+from api.models import Proposta, ConfiguracaoPontuacao, StatusSistema, Ranking
+from api.ranking import atualizar_ranking
 
 def recalcular_pontos():
     """Recalcular pontos de todas as propostas"""
@@ -47,46 +47,12 @@ def recalcular_pontos():
     print()
     print("🏆 Recalculando ranking...")
     
-    status_atual = StatusSistema.get_status_atual()
-    equipes = Equipe.objects.all()
+    # Reconstrução completa em uma única consulta agrupada por equipe
+    atualizar_ranking()
     
-    for equipe in equipes:
-        propostas_equipe = Proposta.objects.filter(equipe=equipe)
-        
-        # Calcular total de pontos
-        pontos_totais = propostas_equipe.filter(
-            status__in=['validada', 'vendida']
-        ).aggregate(total=Sum('pontos'))['total'] or 0
-        
-        # Estatísticas
-        propostas_enviadas = propostas_equipe.count()
-        propostas_validadas = propostas_equipe.filter(status='validada').count()
-        vendas_concretizadas = propostas_equipe.filter(status='vendida', venda_validada=True).count()
-        valor_total_vendas = propostas_equipe.filter(
-            status='vendida',
-            venda_validada=True
-        ).aggregate(total=Sum('valor_venda'))['total'] or 0
-        
-        # Atualizar ranking
-        Ranking.objects.update_or_create(
-            equipe=equipe,
-            estado_sistema=status_atual,
-            defaults={
-                'pontos': int(pontos_totais),
-                'propostas_enviadas': propostas_enviadas,
-                'propostas_validadas': propostas_validadas,
-                'vendas_concretizadas': vendas_concretizadas,
-                'valor_total_vendas': valor_total_vendas,
-            }
-        )
-        
-        print(f"   {equipe.nome}: {pontos_totais} pontos ({propostas_validadas} propostas validadas)")
-    
-    # Atualizar posições
-    rankings = Ranking.objects.filter(estado_sistema=status_atual).order_by('-pontos', '-valor_total_vendas')
-    for i, ranking in enumerate(rankings, 1):
-        ranking.posicao = i
-        ranking.save(update_fields=['posicao'])
+    status_atual = StatusSistema.get_status_atual()
+    for ranking in Ranking.objects.filter(estado_sistema=status_atual).select_related('equipe').order_by('posicao'):
+        print(f"   {ranking.equipe.nome}: {ranking.pontos} pontos ({ranking.propostas_validadas} propostas validadas)")
     
     print()
     print("✨ Recálculo concluído!")
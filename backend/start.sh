@@ -6,6 +6,9 @@ set -e
 # Run migrations
 python manage.py migrate --noinput
 
+# Alinhar a tabela de estatísticas por equipe com as propostas
+python manage.py reconstruir_estatisticas
+
 # Collect static files
 python manage.py collectstatic --noinput
 